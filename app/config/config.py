@@ -44,6 +44,47 @@ MBB_DOC_ROOT = os.getenv("MBB_DOC_ROOT")
 
 MBB_OLLAMA_MODEL_NAME = os.getenv("MBB_OLLAMA_MODEL_NAME")
 
+# Малая быстрая модель для каскада; если задана, большая модель
+# вызывается только для развёрнутых вопросов и неуверенных ответов
+MBB_OLLAMA_SMALL_MODEL_NAME = os.getenv("MBB_OLLAMA_SMALL_MODEL_NAME")
+
+# Сколько Ollama держит модель (и кэш префикса промпта) в памяти между запросами
+MBB_OLLAMA_KEEP_ALIVE = os.getenv("MBB_OLLAMA_KEEP_ALIVE") or "30m"
+
+# Размер контекста модели; фиксированное значение не даёт Ollama перезагружать модель
+MBB_OLLAMA_NUM_CTX = os.getenv("MBB_OLLAMA_NUM_CTX")
+if MBB_OLLAMA_NUM_CTX:
+    MBB_OLLAMA_NUM_CTX = int(MBB_OLLAMA_NUM_CTX)
+
+# Бюджет токенов промпта на один вызов LLM (0 — без ограничения);
+# при превышении схемы инструментов сокращаются (см. MBB_COMPACT_TOOL_SCHEMAS)
+MBB_PROMPT_TOKEN_BUDGET = int(os.getenv("MBB_PROMPT_TOKEN_BUDGET") or 0)
+
+# Список серверов Ollama через запятую
+MBB_OLLAMA_URLS = [
+    url.strip()
+    for url in (os.getenv("MBB_OLLAMA_URLS") or "http://localhost:11434").split(",")
+    if url.strip()
+]
+
+# Сколько запросов к LLM может выполняться одновременно на одном сервере Ollama
+# (на все рабочие процессы вместе, см. per_worker)
+MBB_LLM_MAX_CONCURRENCY = int(os.getenv("MBB_LLM_MAX_CONCURRENCY") or 1)
+
+# Таймаут одного запроса агента к серверу Ollama, секунды
+# (после него — следующий сервер)
+MBB_OLLAMA_TIMEOUT = float(os.getenv("MBB_OLLAMA_TIMEOUT") or 120)
+
+# Интервал проверки доступности серверов Ollama, секунды
+MBB_OLLAMA_HEALTH_INTERVAL = float(os.getenv("MBB_OLLAMA_HEALTH_INTERVAL") or 10)
+
+# Компактные описания инструментов вместо полных docstring-ов
+MBB_COMPACT_TOOL_SCHEMAS = os.getenv("MBB_COMPACT_TOOL_SCHEMAS")
+if not MBB_COMPACT_TOOL_SCHEMAS:
+    MBB_COMPACT_TOOL_SCHEMAS = False
+else:
+    MBB_COMPACT_TOOL_SCHEMAS = bool(strtobool(MBB_COMPACT_TOOL_SCHEMAS))
+
 MBB_PRINT_THINKING_LOG = os.environ.get('MBB_PRINT_THINKING_LOG')
 if not MBB_PRINT_THINKING_LOG:
     MBB_PRINT_THINKING_LOG = False
@@ -52,4 +93,207 @@ else:
 
 TTS_URL = os.getenv("TTS_URL")
 if not TTS_URL:
-    raise ValueError("Не задан TTS_URL в .env")
\ No newline at end of file
+    raise ValueError("Не задан TTS_URL в .env")
+
+# Очередь отправки в TTS: размер, число попыток и таймаут одного запроса (секунды)
+MBB_TTS_QUEUE_SIZE = int(os.getenv("MBB_TTS_QUEUE_SIZE") or 64)
+MBB_TTS_MAX_ATTEMPTS = int(os.getenv("MBB_TTS_MAX_ATTEMPTS") or 4)
+MBB_TTS_TIMEOUT = float(os.getenv("MBB_TTS_TIMEOUT") or 5)
+
+# Circuit breaker TTS: ошибок подряд до размыкания и пауза до пробной отправки (секунды)
+MBB_TTS_BREAKER_THRESHOLD = int(os.getenv("MBB_TTS_BREAKER_THRESHOLD") or 5)
+MBB_TTS_BREAKER_RESET = float(os.getenv("MBB_TTS_BREAKER_RESET") or 10)
+
+# Маршруты TTS по сессиям (источникам): "сова1=URL;зал=URL1,URL2@2.5".
+# Ответ сессии уходит на все URL её группы; "@секунды" в конце URL задаёт
+# таймаут запроса к этому TTS. Сессии без маршрута озвучиваются через TTS_URL
+MBB_TTS_ROUTES = {
+    session.strip(): [url.strip() for url in urls.split(",") if url.strip()]
+    for session, _, urls in (
+        route.partition("=")
+        for route in (os.getenv("MBB_TTS_ROUTES") or "").split(";")
+        if route.strip()
+    )
+}
+
+# Локальная база знаний (индекс SQLite FTS5, см. python -m app.tools.knowledge)
+MBB_KNOWLEDGE_DB = os.getenv("MBB_KNOWLEDGE_DB")
+
+# Сколько фрагментов базы знаний возвращать агенту
+MBB_KNOWLEDGE_TOP_K = int(os.getenv("MBB_KNOWLEDGE_TOP_K") or 3)
+
+# Подставлять найденные фрагменты в промпт развёрнутых вопросов заранее
+MBB_KNOWLEDGE_INJECT = os.getenv("MBB_KNOWLEDGE_INJECT")
+if not MBB_KNOWLEDGE_INJECT:
+    MBB_KNOWLEDGE_INJECT = False
+else:
+    MBB_KNOWLEDGE_INJECT = bool(strtobool(MBB_KNOWLEDGE_INJECT))
+
+# Пул для вычислительных инструментов: thread или process
+MBB_TOOL_EXECUTOR = (os.getenv("MBB_TOOL_EXECUTOR") or "thread").lower()
+if MBB_TOOL_EXECUTOR not in ("thread", "process"):
+    raise ValueError("MBB_TOOL_EXECUTOR должен быть thread или process")
+
+# Размер пула инструментов и таймаут одного вызова инструмента, секунды
+MBB_TOOL_WORKERS = int(os.getenv("MBB_TOOL_WORKERS") or 4)
+MBB_TOOL_TIMEOUT = float(os.getenv("MBB_TOOL_TIMEOUT") or 5)
+
+# Раздача статических файлов: memory — из памяти со сжатием и ETag,
+# disk — StaticFiles с диска
+MBB_STATIC_MODE = (os.getenv("MBB_STATIC_MODE") or "memory").lower()
+if MBB_STATIC_MODE not in ("memory", "disk"):
+    raise ValueError("MBB_STATIC_MODE должен быть memory или disk")
+
+# Время кэширования статики в браузере, секунды
+# (0 — проверка по ETag при каждом запросе)
+MBB_STATIC_MAX_AGE = int(os.getenv("MBB_STATIC_MAX_AGE") or 0)
+
+# Помечать статику как immutable (только для файлов с версией в имени)
+MBB_STATIC_IMMUTABLE = os.getenv("MBB_STATIC_IMMUTABLE")
+if not MBB_STATIC_IMMUTABLE:
+    MBB_STATIC_IMMUTABLE = False
+else:
+    MBB_STATIC_IMMUTABLE = bool(strtobool(MBB_STATIC_IMMUTABLE))
+
+# Файлы крупнее этого размера (байт) отображаются в память через mmap и не сжимаются
+MBB_STATIC_MMAP_THRESHOLD = int(os.getenv("MBB_STATIC_MMAP_THRESHOLD") or 1024 * 1024)
+
+# Интервал проверки изменений в MBB_DOC_ROOT, секунды (0 — не следить)
+MBB_STATIC_WATCH_INTERVAL = float(os.getenv("MBB_STATIC_WATCH_INTERVAL") or 0)
+
+# Число рабочих процессов сервера (см. python -m app.main --workers)
+MBB_WORKERS = int(os.getenv("MBB_WORKERS") or 1)
+
+
+def per_worker(limit: int) -> int:
+    """
+    Доля общего лимита на один рабочий процесс.
+
+    Лимиты параллелизма и очереди задаются на весь сервер, а соблюдает их
+    каждый процесс сам по себе. Доля не меньше единицы, поэтому при лимите
+    меньше числа процессов фактический предел равен числу процессов.
+
+    Args:
+        limit: Лимит на все процессы (0 — без лимита, возвращается как есть).
+
+    Returns:
+        Лимит для одного процесса.
+    """
+    if limit <= 0:
+        return limit
+    return max(1, limit // MBB_WORKERS)
+
+
+# Цикл событий (auto|asyncio|uvloop) и реализация HTTP (auto|h11|httptools) для uvicorn
+MBB_LOOP = os.getenv("MBB_LOOP") or "auto"
+MBB_HTTP = os.getenv("MBB_HTTP") or "auto"
+
+# Сколько секунд при остановке ждать завершения начатых запросов
+MBB_GRACEFUL_TIMEOUT = int(os.getenv("MBB_GRACEFUL_TIMEOUT") or 30)
+
+# Файл SQLite с общим состоянием процессов (сессии, кэш ответов, история для эха);
+# если не задан, состояние хранится в памяти процесса
+# (при --workers > 1 файл создаётся сам)
+MBB_SHARED_STATE_DB = os.getenv("MBB_SHARED_STATE_DB")
+
+# Сколько секунд готовый ответ отдаётся повторному такому же вопросу без вычисления
+# (0 — не кэшировать). Ответ из кэша озвучивается, но может устареть (время),
+# поэтому кэш включается явно; одновременные дубликаты схлопываются и без него
+MBB_ANSWER_CACHE_TTL = float(os.getenv("MBB_ANSWER_CACHE_TTL") or 0)
+
+# Файл трассы фраз (JSON Lines) для воспроизведения, см. python -m app.core.trace;
+# не задан — не писать
+MBB_TRACE_FILE = os.getenv("MBB_TRACE_FILE")
+
+# Через сколько миллисекунд без ответа сова произносит фразу-заполнитель
+# (0 — не произносить)
+MBB_FILLER_DELAY_MS = float(os.getenv("MBB_FILLER_DELAY_MS") or 0)
+
+# Фразы-заполнители через "|"
+MBB_FILLER_PHRASES = [
+    phrase.strip()
+    for phrase in (
+        os.getenv("MBB_FILLER_PHRASES")
+        or "Сейчас подумаю…|Минутку…|Так-так, секунду…|"
+        "Хм, дай сообразить…|Уже ищу ответ…"
+    ).split("|")
+    if phrase.strip()
+]
+
+# Бюджет времени на одну фразу, секунды (0 — без ограничения); по его истечении
+# сова отвечает результатом инструмента или заготовленной фразой
+MBB_REQUEST_BUDGET = float(os.getenv("MBB_REQUEST_BUDGET") or 20)
+
+# Максимум шагов агента (вызовов модели) на один вопрос
+MBB_AGENT_MAX_ITERATIONS = int(os.getenv("MBB_AGENT_MAX_ITERATIONS") or 4)
+
+# Таймаут ожидания данных от Ollama в одном вызове модели, секунды
+MBB_LLM_CALL_TIMEOUT = float(os.getenv("MBB_LLM_CALL_TIMEOUT") or 30)
+
+# Ответ, если агент не уложился в бюджет и результатов инструментов нет
+MBB_FALLBACK_ANSWER = (
+    os.getenv("MBB_FALLBACK_ANSWER") or "Прости, я не успела подумать. Спроси ещё раз."
+)
+
+# Каталог для профилей запросов (семплирующий профилировщик);
+# не задан — профилирование выключено
+MBB_PROFILE_DIR = os.getenv("MBB_PROFILE_DIR")
+
+# Интервал семплирования профилировщика, миллисекунды
+MBB_PROFILE_INTERVAL_MS = float(os.getenv("MBB_PROFILE_INTERVAL_MS") or 5)
+
+# Тихий период стабилизации промежуточных расшифровок STT, миллисекунды (0 — выключена)
+MBB_STABILIZER_QUIET_MS = float(os.getenv("MBB_STABILIZER_QUIET_MS") or 0)
+
+# Максимальное ожидание стабилизации с первого варианта фразы, миллисекунды
+MBB_STABILIZER_MAX_WAIT_MS = float(os.getenv("MBB_STABILIZER_MAX_WAIT_MS") or 3000)
+
+# Сколько ответов вычисляется одновременно на все рабочие процессы
+# (0 — по числу слотов LLM на всех бэкендах)
+MBB_ADMISSION_MAX_IN_FLIGHT = int(os.getenv("MBB_ADMISSION_MAX_IN_FLIGHT") or 0)
+
+# Максимальная длина очереди вопросов к LLM на все рабочие процессы;
+# сверх неё вопросы отклоняются с 429
+MBB_ADMISSION_MAX_QUEUE = int(os.getenv("MBB_ADMISSION_MAX_QUEUE") or 16)
+
+# Допустимое ожидание в очереди, миллисекунды;
+# если ответ придёт позже, вопрос отклоняется с 429
+MBB_ADMISSION_LATENCY_TARGET_MS = float(
+    os.getenv("MBB_ADMISSION_LATENCY_TARGET_MS") or 10000
+)
+
+# Успешный результат времени и вычислений сразу становится ответом,
+# без второго вызова модели (ошибка инструмента всё равно уходит модели)
+MBB_DIRECT_TOOL_ANSWERS = os.getenv("MBB_DIRECT_TOOL_ANSWERS")
+if not MBB_DIRECT_TOOL_ANSWERS:
+    MBB_DIRECT_TOOL_ANSWERS = False
+else:
+    MBB_DIRECT_TOOL_ANSWERS = bool(strtobool(MBB_DIRECT_TOOL_ANSWERS))
+
+# Спекулятивный запуск агента по промежуточной расшифровке,
+# которая выглядит законченной.
+# Работает только вместе со стабилизацией (MBB_STABILIZER_QUIET_MS > 0): без неё
+# промежуточная фраза сразу обрабатывается как окончательная и выигрывать нечего
+MBB_SPECULATIVE = os.getenv("MBB_SPECULATIVE")
+if not MBB_SPECULATIVE:
+    MBB_SPECULATIVE = False
+else:
+    MBB_SPECULATIVE = bool(strtobool(MBB_SPECULATIVE))
+
+# Минимальное сходство окончательного вопроса с промежуточным,
+# чтобы принять спекулятивный ответ
+MBB_SPECULATIVE_SIMILARITY = float(os.getenv("MBB_SPECULATIVE_SIMILARITY") or 0.9)
+
+# Сколько спекулятивных запусков агента может выполняться одновременно
+MBB_SPECULATIVE_MAX_RUNS = int(os.getenv("MBB_SPECULATIVE_MAX_RUNS") or 1)
+
+# Путь к Unix-сокету сервера; если задан, сервер слушает его вместо MBB_HOST:MBB_PORT
+MBB_UDS = os.getenv("MBB_UDS")
+
+# Минимальная оценка качества фразы (0..1) для вызова LLM; ниже — фраза отбрасывается
+# или, если оборвана на полуслове, откладывается до следующей (0 — фильтр выключен;
+# разумное значение для включения — 0.35)
+MBB_UTTERANCE_MIN_QUALITY = float(os.getenv("MBB_UTTERANCE_MIN_QUALITY") or 0)
+
+# Сколько миллисекунд отложенный обрывок фразы ждёт продолжения
+MBB_UTTERANCE_DEFER_MS = float(os.getenv("MBB_UTTERANCE_DEFER_MS") or 5000)
@@ -0,0 +1,241 @@
+"""
+Управление допуском вопросов к LLM при перегрузке.
+
+Одновременно вычисляется не больше max_in_flight ответов, остальные ждут
+в очереди. Быстрые вопросы (время, вычисления, короткие) обслуживаются
+раньше развёрнутых, а внутри одного класса источники чередуются по кругу,
+чтобы один говорливый микрофон не занял всю очередь. Если ожидаемое время
+в очереди превышает целевую задержку, вопрос сразу отклоняется (HTTP 429
+с Retry-After): такой ответ всё равно пришёл бы слишком поздно.
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, List
+
+from app.config.config import (
+    MBB_ADMISSION_LATENCY_TARGET_MS,
+    MBB_ADMISSION_MAX_IN_FLIGHT,
+    MBB_ADMISSION_MAX_QUEUE,
+    MBB_LLM_MAX_CONCURRENCY,
+    MBB_OLLAMA_URLS,
+    per_worker,
+)
+from app.core.logger import get_logger
+from app.core.metrics import metrics
+from app.utils.intent_classifier import OPEN, classify_question
+
+log = get_logger(__name__)
+
+# Классы приоритета: меньше — раньше
+FAST = 0
+CHAT = 1
+_PRIORITY_NAMES = ("fast", "chat")
+
+
+def question_priority(question: str) -> int:
+    """
+    Класс приоритета вопроса.
+
+    Args:
+        question: Текст вопроса.
+
+    Returns:
+        CHAT для развёрнутых вопросов, FAST для остальных.
+    """
+    return CHAT if classify_question(question) == OPEN else FAST
+
+
+class AdmissionRejectedError(Exception):
+    """Вопрос отклонён: очередь переполнена или ответ был бы слишком поздним."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """Вопрос, ожидающий допуска."""
+
+    def __init__(self, owner: str, priority: int):
+        self.owner = owner
+        self.priority = priority
+        self.future: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.perf_counter()
+
+
+class AdmissionController:
+    """
+    Ограниченное окно вычислений с очередью по приоритетам
+    и справедливостью по источникам.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue: int = 16,
+        latency_target_ms: float = 10000,
+        initial_service_ms: float = 2000,
+    ):
+        """
+        Args:
+            max_in_flight: Сколько ответов вычисляется одновременно.
+            max_queue: Максимальная длина очереди.
+            latency_target_ms: Допустимое ожидание в очереди, миллисекунды.
+            initial_service_ms: Начальная оценка времени ответа, пока нет замеров.
+        """
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.latency_target_ms = latency_target_ms
+        self.in_flight = 0
+        # Сглаженное время вычисления ответа по классам, миллисекунды
+        self._service_ms = [initial_service_ms] * len(_PRIORITY_NAMES)
+        # Очереди классов: источник → ожидающие вопросы (источники чередуются по кругу)
+        self._queues: List["OrderedDict[str, Deque[_Waiter]]"] = [
+            OrderedDict() for _ in _PRIORITY_NAMES
+        ]
+
+    @property
+    def queued(self) -> int:
+        return sum(len(waiters) for queue in self._queues for waiters in queue.values())
+
+    def estimate_wait_ms(self, priority: int) -> float:
+        """
+        Оценка ожидания нового вопроса класса priority в очереди.
+
+        Учитываются вопросы того же и более приоритетных классов и занятость окна.
+        """
+        if self.in_flight < self.max_in_flight and not self.queued:
+            return 0.0
+        ahead = sum(
+            len(waiters) * self._service_ms[level]
+            for level in range(priority + 1)
+            for waiters in self._queues[level].values()
+        )
+        return (ahead + self._service_ms[priority]) / self.max_in_flight
+
+    def try_admit(self) -> bool:
+        """
+        Занимает слот без ожидания, если окно свободно и очереди нет.
+
+        Так допускаются спекулятивные запуски: они получают слот с низшим
+        приоритетом, только когда он никому больше не нужен. Занятый слот
+        возвращается вызовом release().
+
+        Returns:
+            True, если слот занят.
+        """
+        if self.in_flight >= self.max_in_flight or self.queued:
+            return False
+        self.in_flight += 1
+        self._update_gauges()
+        metrics.inc("admission.admitted_idle")
+        return True
+
+    def release(self) -> None:
+        """Возвращает слот, занятый try_admit()."""
+        self._release()
+
+    @asynccontextmanager
+    async def admit(self, owner: str, priority: int = FAST) -> AsyncIterator[None]:
+        """
+        Допускает вопрос к вычислению или отклоняет его.
+
+        Args:
+            owner: Источник вопроса.
+            priority: Класс приоритета (FAST или CHAT).
+
+        Raises:
+            AdmissionRejectedError: Очередь переполнена или ожидание превысит
+                целевую задержку.
+        """
+        if self.in_flight < self.max_in_flight and not self.queued:
+            self.in_flight += 1
+        else:
+            await self._wait(owner, priority)
+        self._update_gauges()
+        metrics.inc("admission.admitted")
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._service_ms[priority] += 0.2 * (
+                elapsed_ms - self._service_ms[priority]
+            )
+            self._release()
+
+    async def _wait(self, owner: str, priority: int) -> None:
+        """Ставит вопрос в очередь и ждёт передачи слота."""
+        estimate_ms = self.estimate_wait_ms(priority)
+        if self.queued >= self.max_queue or estimate_ms > self.latency_target_ms:
+            retry_after = max(
+                1, math.ceil((estimate_ms - self.latency_target_ms) / 1000)
+            )
+            metrics.inc(f"admission.rejected.{_PRIORITY_NAMES[priority]}")
+            log.warning(
+                f"Вопрос от '{owner}' отклонён: в очереди {self.queued}, "
+                f"ожидание ~{estimate_ms:.0f} мс, повтор через {retry_after} с"
+            )
+            raise AdmissionRejectedError("Сервер перегружен", retry_after)
+
+        waiter = _Waiter(owner, priority)
+        self._queues[priority].setdefault(owner, deque()).append(waiter)
+        self._update_gauges()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Слот уже передан этому вопросу — возвращаем его
+                self._release()
+            else:
+                self._forget(waiter)
+            self._update_gauges()
+            raise
+        metrics.observe(
+            "admission.queue_wait_ms", (time.perf_counter() - waiter.enqueued_at) * 1000
+        )
+
+    def _forget(self, waiter: _Waiter) -> None:
+        queue = self._queues[waiter.priority]
+        waiters = queue.get(waiter.owner)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del queue[waiter.owner]
+
+    def _release(self) -> None:
+        """Передаёт освободившийся слот следующему вопросу или закрывает его."""
+        for queue in self._queues:
+            while queue:
+                owner, waiters = next(iter(queue.items()))
+                waiter = waiters.popleft()
+                if waiters:
+                    # Следующий вопрос этого источника — после остальных источников
+                    queue.move_to_end(owner)
+                else:
+                    del queue[owner]
+                if not waiter.future.done():
+                    waiter.future.set_result(None)
+                    self._update_gauges()
+                    return
+        self.in_flight -= 1
+        self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        metrics.set_gauge("admission.in_flight", self.in_flight)
+        metrics.set_gauge("admission.queued", self.queued)
+
+
+# Общий контроль допуска; по умолчанию окно равно числу слотов LLM на всех бэкендах.
+# Лимиты заданы на весь сервер, каждый рабочий процесс получает свою долю
+admission = AdmissionController(
+    max_in_flight=per_worker(
+        MBB_ADMISSION_MAX_IN_FLIGHT or len(MBB_OLLAMA_URLS) * MBB_LLM_MAX_CONCURRENCY
+    ),
+    max_queue=per_worker(MBB_ADMISSION_MAX_QUEUE),
+    latency_target_ms=MBB_ADMISSION_LATENCY_TARGET_MS,
+)
@@ -0,0 +1,378 @@
+"""
+Пул бэкендов Ollama: маршрутизация по наименьшему числу активных запросов,
+ограничение параллелизма на каждый бэкенд, health-check и переключение
+на другой бэкенд при сетевых ошибках, ошибках сервера (5xx) и таймаутах.
+
+Ошибки самого запроса (инструмента, разбора ответа модели) бэкенд не
+компрометируют: они пробрасываются вызывающему без переключения.
+"""
+
+import asyncio
+import contextlib
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar
+
+import aiohttp
+
+try:
+    import httpx  # транспорт клиента ollama (langchain-ollama)
+except ImportError:
+    httpx = None
+
+from app.core import deadline
+from app.core.deadline import DeadlineExceededError
+from app.core.logger import get_logger
+from app.core.metrics import metrics
+
+log = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class BackendUnavailableError(Exception):
+    """Ни один бэкенд Ollama не смог обработать запрос."""
+
+
+def is_backend_failure(error: BaseException) -> bool:
+    """
+    Говорит ли ошибка о неисправности бэкенда, а не самого запроса.
+
+    Args:
+        error: Исключение, выброшенное вызовом к бэкенду.
+
+    Returns:
+        True для сетевых ошибок, таймаутов и ответов 5xx.
+    """
+    if isinstance(error, (OSError, asyncio.TimeoutError, aiohttp.ClientError)):
+        return True
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return True
+    # ollama.ResponseError и подобные несут код ответа сервера
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    return isinstance(status, int) and status >= 500
+
+
+class OllamaBackend:
+    """
+    Состояние одного бэкенда Ollama.
+    """
+
+    def __init__(self, url: str, max_concurrency: int):
+        """
+        Args:
+            url: Базовый URL сервера Ollama.
+            max_concurrency: Максимум одновременных запросов к бэкенду.
+        """
+        self.url = url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.outstanding = 0
+        self.served = 0
+        self.healthy = True
+        self.last_error: Optional[str] = None
+
+    @property
+    def has_capacity(self) -> bool:
+        """Есть ли свободный слот для нового запроса."""
+        return self.outstanding < self.max_concurrency
+
+    def to_dict(self) -> dict:
+        """Состояние бэкенда для логов и метрик."""
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "served": self.served,
+            "last_error": self.last_error,
+        }
+
+
+class OllamaBackendPool:
+    """
+    Пул бэкендов Ollama.
+
+    Запрос уходит на здоровый бэкенд с наименьшим числом активных запросов.
+    Если все слоты заняты — запрос ждёт освобождения. При неисправности бэкенда
+    (is_backend_failure) или таймауте он помечается нездоровым, а запрос
+    повторяется на следующем; прочие ошибки пробрасываются сразу.
+    """
+
+    def __init__(
+        self,
+        urls: Iterable[str],
+        max_concurrency: int = 1,
+        probe_interval: float = 10.0,
+        probe_timeout: float = 2.0,
+    ):
+        """
+        Args:
+            urls: Список базовых URL серверов Ollama.
+            max_concurrency: Максимум одновременных запросов на один бэкенд.
+            probe_interval: Интервал health-check в секундах.
+            probe_timeout: Таймаут одного health-check в секундах.
+        """
+        self.backends: List[OllamaBackend] = [
+            OllamaBackend(url, max_concurrency) for url in urls
+        ]
+        if not self.backends:
+            raise ValueError("Нужен хотя бы один URL Ollama")
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self._condition: Optional[asyncio.Condition] = None
+        self._probe_task: Optional["asyncio.Task"] = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        """Условие ожидания свободного слота (создаётся в рабочем цикле событий)."""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _pick(self, exclude: Iterable[str]) -> Optional[OllamaBackend]:
+        """
+        Выбирает бэкенд с наименьшей загрузкой.
+
+        Returns:
+            Бэкенд или None, если все подходящие бэкенды заняты.
+
+        Raises:
+            BackendUnavailableError: Если все бэкенды исключены.
+        """
+        candidates = [b for b in self.backends if b.url not in exclude]
+        if not candidates:
+            raise BackendUnavailableError("Все бэкенды Ollama уже опробованы")
+        # Если health-check считает больными все бэкенды — пробуем их всё равно
+        healthy = [b for b in candidates if b.healthy] or candidates
+        free = [b for b in healthy if b.has_capacity]
+        if not free:
+            return None
+        return min(free, key=lambda b: (b.outstanding / b.max_concurrency, b.served))
+
+    async def acquire(self, exclude: Iterable[str] = ()) -> OllamaBackend:
+        """
+        Занимает слот на наименее загруженном бэкенде, при необходимости ждёт.
+
+        Args:
+            exclude: URL бэкендов, которые уже опробованы для этого запроса.
+
+        Returns:
+            Бэкенд с занятым слотом (освободить через release).
+
+        Raises:
+            DeadlineExceededError: Бюджет времени фразы исчерпан в ожидании слота.
+        """
+        condition = self._get_condition()
+        async with condition:
+            while True:
+                backend = self._pick(exclude)
+                if backend is not None:
+                    backend.outstanding += 1
+                    backend.served += 1
+                    self._update_gauges()
+                    return backend
+                try:
+                    # Ждать свободный слот дольше бюджета фразы бессмысленно
+                    await asyncio.wait_for(condition.wait(), deadline.remaining())
+                except asyncio.TimeoutError:
+                    metrics.inc("backends.acquire_expired")
+                    raise DeadlineExceededError(
+                        "Бюджет времени исчерпан в ожидании бэкенда Ollama"
+                    ) from None
+
+    async def release(self, backend: OllamaBackend) -> None:
+        """Освобождает слот бэкенда и будит ожидающие запросы."""
+        condition = self._get_condition()
+        async with condition:
+            backend.outstanding -= 1
+            self._update_gauges()
+            condition.notify_all()
+
+    async def run(
+        self,
+        call: Callable[[OllamaBackend], Awaitable[T]],
+        timeout: Optional[float] = None,
+    ) -> T:
+        """
+        Выполняет вызов на бэкенде пула с переключением при ошибках.
+
+        Args:
+            call: Функция, выполняющая запрос к переданному бэкенду.
+            timeout: Таймаут одной попытки в секундах.
+
+        Returns:
+            Результат первого успешного вызова.
+
+        Raises:
+            BackendUnavailableError: Если вызов не удался ни на одном бэкенде.
+            DeadlineExceededError: Если исчерпан бюджет времени фразы.
+            Exception: Ошибка самого запроса (не бэкенда) — без переключения.
+        """
+        tried: List[str] = []
+        last_error: Optional[BaseException] = None
+        while len(tried) < len(self.backends):
+            if deadline.expired():
+                raise DeadlineExceededError("Бюджет времени исчерпан до вызова модели")
+            try:
+                backend = await self.acquire(exclude=tried)
+            except BackendUnavailableError:
+                break
+            tried.append(backend.url)
+            started = time.perf_counter()
+            # Попытка не может длиться дольше оставшегося бюджета фразы
+            attempt_timeout = deadline.clamp(timeout)
+            try:
+                result = await asyncio.wait_for(call(backend), timeout=attempt_timeout)
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                if deadline.expired():
+                    # Бэкенд исправен, просто закончилось время фразы
+                    raise DeadlineExceededError(
+                        f"Бюджет времени исчерпан на {backend.url}"
+                    ) from None
+                waited = (
+                    "истёк таймаут"
+                    if attempt_timeout is None
+                    else f"нет ответа за {attempt_timeout:.1f} с"
+                )
+                last_error = asyncio.TimeoutError(waited)
+                self._mark(backend, healthy=False, error=repr(last_error))
+                metrics.inc("backends.failover")
+                log.warning(f"Бэкенд {backend.url}: {waited}, пробуем следующий")
+                continue
+            except Exception as e:
+                if not is_backend_failure(e):
+                    raise
+                last_error = e
+                self._mark(backend, healthy=False, error=repr(e))
+                metrics.inc("backends.failover")
+                log.warning(
+                    f"Бэкенд {backend.url} не ответил ({e!r}), пробуем следующий"
+                )
+                continue
+            finally:
+                await self.release(backend)
+            metrics.observe(
+                f"backends.latency_ms[{backend.url}]",
+                (time.perf_counter() - started) * 1000,
+            )
+            return result
+        raise BackendUnavailableError(f"Нет доступных бэкендов Ollama: {last_error!r}")
+
+    def _mark(
+        self, backend: OllamaBackend, healthy: bool, error: Optional[str] = None
+    ) -> None:
+        """Обновляет здоровье бэкенда и будит ожидающих при его восстановлении."""
+        recovered = healthy and not backend.healthy
+        if backend.healthy != healthy:
+            log.info(f"Бэкенд {backend.url}: {'здоров' if healthy else 'недоступен'}")
+        backend.healthy = healthy
+        backend.last_error = error
+        self._update_gauges()
+        if recovered and self._condition is not None:
+            asyncio.ensure_future(self._notify())
+
+    async def _notify(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            condition.notify_all()
+
+    def _update_gauges(self) -> None:
+        metrics.set_gauge("backends.healthy", sum(b.healthy for b in self.backends))
+        metrics.set_gauge(
+            "backends.outstanding", sum(b.outstanding for b in self.backends)
+        )
+
+    async def probe_once(self, session: aiohttp.ClientSession) -> None:
+        """Проверяет доступность всех бэкендов запросом GET /api/tags."""
+
+        async def probe(backend: OllamaBackend) -> None:
+            try:
+                async with session.get(
+                    f"{backend.url}/api/tags",
+                    timeout=aiohttp.ClientTimeout(total=self.probe_timeout),
+                ) as resp:
+                    ok = resp.status == 200
+                    self._mark(
+                        backend, healthy=ok, error=None if ok else f"HTTP {resp.status}"
+                    )
+            except Exception as e:
+                self._mark(backend, healthy=False, error=repr(e))
+
+        await asyncio.gather(*(probe(b) for b in self.backends))
+
+    async def _probe_loop(self) -> None:
+        async with aiohttp.ClientSession() as session:
+            while True:
+                await self.probe_once(session)
+                await asyncio.sleep(self.probe_interval)
+
+    def start(self) -> None:
+        """Запускает фоновый health-check."""
+        if self._probe_task is None:
+            self._probe_task = asyncio.ensure_future(self._probe_loop())
+
+    async def stop(self) -> None:
+        """Останавливает фоновый health-check."""
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._probe_task
+            self._probe_task = None
+
+    def status(self) -> List[Dict]:
+        """Состояние всех бэкендов."""
+        return [b.to_dict() for b in self.backends]
+
+
+# --- Пример использования: несколько локальных «заглушек» Ollama ---
+async def main():
+    from aiohttp import web
+
+    async def start_stub(port: int, delay: float) -> web.AppRunner:
+        async def handle(_request: web.Request) -> web.Response:
+            await asyncio.sleep(delay)
+            return web.json_response({"models": []})
+
+        stub = web.Application()
+        stub.router.add_get("/api/tags", handle)
+        runner = web.AppRunner(stub)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        return runner
+
+    ports = [18431, 18432, 18433]
+    runners = [await start_stub(port, delay=0.2) for port in ports]
+    urls = [f"http://127.0.0.1:{port}" for port in ports]
+
+    async with aiohttp.ClientSession() as session:
+
+        async def call(backend: OllamaBackend) -> str:
+            async with session.get(f"{backend.url}/api/tags") as resp:
+                resp.raise_for_status()
+                return backend.url
+
+        # Во втором пуле последний URL никто не слушает — на нём видно переключение
+        for pool in (
+            OllamaBackendPool(urls[:1], max_concurrency=2),
+            OllamaBackendPool(urls + ["http://127.0.0.1:18434"], max_concurrency=2),
+        ):
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                *(pool.run(call, timeout=5) for _ in range(24))
+            )
+            elapsed = time.perf_counter() - started
+            print(
+                f"🧪 {len(pool.backends)} бэкенд(а): "
+                f"{len(results)} запросов за {elapsed:.2f} с"
+            )
+            for url in sorted(set(results)):
+                print(f"   {url}: {results.count(url)}")
+            for state in pool.status():
+                print(f"   {state}")
+            print()
+
+    for runner in runners:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
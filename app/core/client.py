@@ -1,11 +1,39 @@
 """
 Клиент для взаимодействия с STT-сервером.
 Отправляет запросы на распознавание и получает результаты.
+
+Кроме обычных http(s)-адресов поддерживается схема http+unix для серверов
+на той же машине: путь к сокету записывается в адрес в URL-кодировке,
+например http+unix://%2Frun%2Ftts.sock/api/tts/json.
 """
 
 import asyncio
 import aiohttp
-from typing import Optional
+from typing import Optional, Tuple
+from urllib.parse import unquote, urlsplit, urlunsplit
+
+from app.core.logger import get_logger
+
+log = get_logger(__name__)
+
+# Схема адресов серверов на Unix-сокете
+UNIX_SCHEME = "http+unix"
+
+
+def split_unix_url(url: str) -> Tuple[Optional[str], str]:
+    """
+    Выделяет путь к Unix-сокету из адреса со схемой http+unix.
+
+    :param url: адрес сервера.
+    :return: (путь к сокету или None, http-адрес для запросов через этот сокет).
+    """
+    parts = urlsplit(url)
+    if parts.scheme != UNIX_SCHEME:
+        return None, url
+    # Имя хоста в запросах через сокет ни на что не влияет
+    return unquote(parts.netloc), urlunsplit(
+        ("http", "localhost", parts.path, parts.query, "")
+    )
 
 
 class PostClient:
@@ -13,28 +41,53 @@ class PostClient:
     Асинхронный post-клиент для работы с API.
     """
 
-    def __init__(self, url: str):
+    def __init__(self, url: str, timeout: Optional[float] = None):
         """
         Инициализация клиента.
 
-        :param url: URL сервера.
+        :param url: URL сервера (http, https или http+unix).
+        :param timeout: общий таймаут запроса в секундах (None — по умолчанию aiohttp).
         """
         self.url = url
+        self.socket_path, self._http_url = split_unix_url(url)
+        self.timeout = timeout
         self.session: Optional[aiohttp.ClientSession] = None
 
     async def __aenter__(self) -> "PostClient":
         """
         Контекстный менеджер: открывает сессию.
         """
-        self.session = aiohttp.ClientSession()
+        await self.open()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
         """
         Контекстный менеджер: закрывает сессию.
         """
+        await self.close()
+
+    async def open(self) -> None:
+        """
+        Открывает сессию (соединения переиспользуются между запросами).
+        """
+        if self.session is None or self.session.closed:
+            timeout = (
+                aiohttp.ClientTimeout(total=self.timeout) if self.timeout else None
+            )
+            connector = (
+                aiohttp.UnixConnector(path=self.socket_path)
+                if self.socket_path
+                else None
+            )
+            self.session = aiohttp.ClientSession(timeout=timeout, connector=connector)
+
+    async def close(self) -> None:
+        """
+        Закрывает сессию.
+        """
         if self.session:
             await self.session.close()
+            self.session = None
 
     async def post(self, text: str) -> bool:
         """
@@ -44,17 +97,19 @@ class PostClient:
         :return: True, если запрос успешен.
         """
         if not self.session:
-            print("❌ Сессия не открыта. Используйте контекстный менеджер.")
+            log.error("❌ Сессия не открыта. Используйте контекстный менеджер.")
             return False
 
         try:
             async with self.session.post(
-                f"{self.url}",
+                self._http_url,
                 json={"text": text}
             ) as resp:
+                if resp.status != 200:
+                    log.warning(f"❌ Сервер {self.url} ответил HTTP {resp.status}")
                 return resp.status == 200
         except Exception as e:
-            print(f"❌ Ошибка при отправке текста: {e}")
+            log.error(f"❌ Ошибка при отправке текста на {self.url}: {e!r}")
             return False
 
     async def get_latest_transcript(self) -> str:
@@ -68,7 +123,7 @@ class PostClient:
             return ""
 
         try:
-            async with self.session.get(f"{self.url}/latest") as resp:
+            async with self.session.get(f"{self._http_url}/latest") as resp:
                 if resp.status == 200:
                     data = await resp.json()
                     return data.get("transcript", "").strip()
@@ -2,3 +2,9 @@ COM_ID = "id"
 INC_TEXT = "INC_TEXT"
 TEXT = "text"
 OWNER = "owner"
+
+# Сессия для запросов без указания источника
+DEFAULT_SESSION = "default"
+
+# Слова, после которых начинается вопрос к сове
+WAKE_WORDS = ["сова", "чучело"]
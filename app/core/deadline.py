@@ -0,0 +1,101 @@
+"""
+Бюджет времени на обработку одной фразы.
+
+Крайний срок задаётся при получении фразы и хранится в контекстной
+переменной, поэтому его видят все этапы, включая дочерние задачи asyncio:
+пул бэкендов Ollama и инструменты урезают свои таймауты до оставшегося
+времени. Если бюджет исчерпан, агент не дожидается модели, а ответ
+собирается из уже полученных результатов инструментов или заменяется
+заготовленной фразой.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.agents import AgentAction
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Крайний срок текущей фразы по time.monotonic() (None — без ограничения)
+_deadline: ContextVar[Optional[float]] = ContextVar("mbb_deadline", default=None)
+
+
+class DeadlineExceededError(Exception):
+    """Бюджет времени на обработку фразы исчерпан."""
+
+
+@contextmanager
+def budget(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Устанавливает бюджет времени на блок.
+
+    Вложенный бюджет не может быть больше внешнего.
+
+    Args:
+        seconds: Бюджет в секундах (None или 0 — без ограничения).
+    """
+    if not seconds:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Сколько секунд бюджета осталось (None — без ограничения)."""
+    deadline = _deadline.get()
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+def expired() -> bool:
+    """Исчерпан ли бюджет."""
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def clamp(timeout: Optional[float]) -> Optional[float]:
+    """
+    Урезает таймаут этапа до оставшегося бюджета.
+
+    Args:
+        timeout: Собственный таймаут этапа в секундах (None — без ограничения).
+
+    Returns:
+        Меньшее из таймаута и остатка бюджета.
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    return left if timeout is None else min(timeout, left)
+
+
+class ToolResultsCallback(BaseCallbackHandler):
+    """
+    Callback LangChain, запоминающий результаты инструментов по мере их получения.
+
+    Если агент не уложился в бюджет, ответом становится результат
+    последнего инструмента (например, уже посчитанное время).
+    """
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        self.steps: List[Tuple[AgentAction, Any]] = []
+        self._running: Dict[UUID, AgentAction] = {}
+
+    def on_tool_start(
+        self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._running[run_id] = AgentAction(serialized.get("name", ""), input_str, "")
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        action = self._running.pop(run_id, None)
+        if action is not None:
+            self.steps.append((action, getattr(output, "content", output)))
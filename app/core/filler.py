@@ -0,0 +1,100 @@
+"""
+Фразы-заполнители, пока агент думает.
+
+Если ответ не готов за заданное время, сова произносит короткую фразу
+("Сейчас подумаю…"), чтобы пользователь не повторял вопрос. Фразы берутся
+из ShuffleBag и не повторяются подряд; если ответ успел раньше, таймер
+отменяется и заполнитель не отправляется.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+from app.config.config import MBB_FILLER_DELAY_MS, MBB_FILLER_PHRASES
+from app.core.logger import get_logger
+from app.core.metrics import metrics
+from app.core.outbox import TTSRouter, tts_outbox
+from app.utils.shuffle_bag import ShuffleBag
+from app.utils.speech_normalizer import normalize_for_speech
+
+log = get_logger(__name__)
+
+
+class FillerMasker:
+    """
+    Отправляет в TTS фразу-заполнитель, если ответ задерживается.
+    """
+
+    def __init__(self, outbox: TTSRouter, phrases: List[str], delay_ms: float):
+        """
+        Args:
+            outbox: Очередь отправки в TTS.
+            phrases: Фразы-заполнители.
+            delay_ms: Через сколько миллисекунд без ответа произносить фразу
+                (0 — заполнители выключены).
+        """
+        self.outbox = outbox
+        self.delay = delay_ms / 1000
+        # SSML фраз готовится один раз
+        self._bag: Optional[ShuffleBag[str]] = (
+            ShuffleBag([normalize_for_speech(phrase)[1] for phrase in phrases])
+            if phrases and delay_ms > 0
+            else None
+        )
+
+    async def _send_after_delay(self, session: str) -> bool:
+        """Отправляет заполнитель после задержки; False, если TTS его не принял."""
+        if self._bag is None:
+            return False
+        await asyncio.sleep(self.delay)
+        if not self.outbox.enqueue(session, self._bag.pick()):
+            return False
+        metrics.inc("filler.sent")
+        log.info(f"Сессия '{session}': ответ задерживается, отправлен заполнитель")
+        return True
+
+    @asynccontextmanager
+    async def mask(self, session: str) -> AsyncIterator[None]:
+        """
+        Контекст ожидания и вычисления ответа.
+
+        По истечении задержки отправляет заполнитель.
+
+        Контекст открывается до очереди допуска к LLM, чтобы заполнитель
+        прикрывал и ожидание в ней. Заполнитель встаёт в очередь сессии раньше
+        ответа, поэтому порядок озвучивания сохраняется. Для полученных ответов
+        замеряется воспринимаемая задержка — время до первой фразы совы
+        (принятого TTS заполнителя или ответа).
+
+        Args:
+            session: Сессия, в которую отправляется заполнитель.
+        """
+        if self._bag is None:
+            yield
+            return
+        started = time.perf_counter()
+        timer = asyncio.ensure_future(self._send_after_delay(session))
+        try:
+            yield
+        except BaseException:
+            # Ответа не будет (отклонён, устарел, отменён) — задержку не мерим
+            timer.cancel()
+            raise
+        answered_ms = (time.perf_counter() - started) * 1000
+        if not timer.done():
+            timer.cancel()
+            metrics.inc("filler.skipped")
+            perceived_ms = answered_ms
+        elif not timer.cancelled() and timer.exception() is None and timer.result():
+            perceived_ms = min(answered_ms, self.delay * 1000)
+        else:
+            # Заполнитель сброшен TTS — пользователь его не слышал
+            perceived_ms = answered_ms
+        metrics.observe("filler.perceived_ms", perceived_ms)
+        metrics.observe("filler.answer_ms", answered_ms)
+
+
+# Заполнители для ответов, которые задерживаются
+fillers = FillerMasker(tts_outbox, MBB_FILLER_PHRASES, MBB_FILLER_DELAY_MS)
@@ -4,65 +4,151 @@ HTTP-сервер на FastAPI для STT с поддержкой GET и POST.
 """
 from __future__ import annotations
 
-from fastapi import FastAPI, HTTPException
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import Optional
 
-from app.config.config import MBB_DOC_ROOT
-from app.core.llm import process_request_with_llm
-from app.utils.basic_text_utils import find_and_crop_by_keywords
-from app.utils.levenstein_text_utils import similarity_ratio
+from app.config.config import (
+    MBB_DOC_ROOT,
+    MBB_STATIC_IMMUTABLE,
+    MBB_STATIC_MAX_AGE,
+    MBB_STATIC_MMAP_THRESHOLD,
+    MBB_STATIC_MODE,
+    MBB_STATIC_WATCH_INTERVAL,
+)
+from app.core.llm import ollama_pool
+from app.core.metrics import metrics
+from app.core.outbox import tts_outbox
+from app.core.pipeline import handle_utterance
+from app.core.profiler import profiler
+from app.core.shared_state import shared_state
+from app.core.static_files import InMemoryStaticFiles
+from app.core.tool_runner import shutdown_executors
+from app.core.trace import tracer
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """
+    Запуск и остановка фоновых задач сервера.
+    """
+    ollama_pool.start()
+    profiler.install_signal_handler()
+    if isinstance(static_files, InMemoryStaticFiles):
+        static_files.start()
+    yield
+    if isinstance(static_files, InMemoryStaticFiles):
+        await static_files.stop()
+    await ollama_pool.stop()
+    await tts_outbox.close()
+    shutdown_executors()
+    shared_state.close()
+    tracer.close()
 
-app = FastAPI(title="STT API Server")
 
 # Подключаем статические файлы
 print(f"MBB_DOC_ROOT={MBB_DOC_ROOT}")
-app.mount("/static", StaticFiles(directory=MBB_DOC_ROOT), name="static")
+# Без MBB_DOC_ROOT раздавать из памяти нечего — остаётся раздача с диска, как раньше
+if MBB_STATIC_MODE == "memory" and MBB_DOC_ROOT:
+    static_files = InMemoryStaticFiles(
+        MBB_DOC_ROOT,
+        max_age=MBB_STATIC_MAX_AGE,
+        immutable=MBB_STATIC_IMMUTABLE,
+        mmap_threshold=MBB_STATIC_MMAP_THRESHOLD,
+        watch_interval=MBB_STATIC_WATCH_INTERVAL,
+    )
+else:
+    static_files = StaticFiles(directory=MBB_DOC_ROOT)
+
+app = FastAPI(title="STT API Server", lifespan=lifespan)
+app.mount("/static", static_files, name="static")
 
 
 # Модель для входных данных
 class TextRequest(BaseModel):
     text: str
-
-
-# Глобальная переменная для хранения последнего вопроса
-latest_question: Optional[str] = None
-# Глобальная переменная для хранения последнего ответа
-latest_response: Optional[str] = None
+    # Источник фразы (устройство/пользователь); определяет сессию
+    owner: Optional[str] = None
+    # STT пометил текст как окончательный (иначе — промежуточный вариант)
+    final: bool = False
 
 
 @app.post("/json")
-async def receive_text(request: TextRequest) -> dict:
+async def receive_text(
+    request: TextRequest,
+    x_mbb_profile: Optional[str] = Header(default=None),
+):
     """
     Принимает текст через POST-запрос и сохраняет его.
 
     Args:
         request: Объект с полем `text`.
+        x_mbb_profile: Заголовок X-MBB-Profile — профилировать этот запрос.
 
     Returns:
-        JSON с подтверждением.
+        JSON с подтверждением; при перегрузке — 429 с заголовком Retry-After.
     """
-    global latest_question
-    global latest_response
-    question = request.text.strip()
-    question = find_and_crop_by_keywords(["сова", "чучело"], question)
-    if question:
-        latest_question = question
-        # проверяем, что нам на вход не приехал наш же ответ
-        similarity_score = similarity_ratio(latest_question, latest_response)
-        if similarity_score < 0.5:
-            latest_response = await process_request_with_llm(latest_question)
-    return {"status": "success", "received_text": latest_question}
+    with profiler.profile(request.owner or "request", force=bool(x_mbb_profile)):
+        result = await handle_utterance(request.text, request.owner, request.final)
+    if result["status"] == "rejected":
+        return JSONResponse(
+            result,
+            status_code=429,
+            headers={"Retry-After": str(result["retry_after"])},
+        )
+    return result
 
 
 @app.get("/latest")
 async def get_latest_transcript() -> dict:
-    global latest_question
     """
-    Возвращает последний полученный текст.
+    Возвращает последний полученный текст (общий для всех рабочих процессов).
 
     Returns:
         JSON с полем `transcript` (или пустой строкой, если текста нет).
     """
-    return {"transcript": latest_question or ""}
\ No newline at end of file
+    return {"transcript": shared_state.latest()["question"] or ""}
+
+
+@app.get("/metrics")
+async def get_metrics() -> dict:
+    """
+    Возвращает метрики процесса: счётчики, текущие значения и тайминги.
+
+    Returns:
+        JSON со снимком метрик и состоянием бэкендов Ollama
+        (метрики — только ответившего рабочего процесса).
+    """
+    return {
+        **metrics.snapshot(),
+        "backends": ollama_pool.status(),
+        "worker": os.getpid(),
+    }
+
+
+@app.post("/admin/profile")
+async def arm_profiler(requests: int = 1) -> dict:
+    """
+    Включает семплирующий профилировщик для следующих запросов этого процесса.
+
+    Args:
+        requests: Сколько запросов профилировать.
+
+    Returns:
+        JSON с числом запросов, которые будут профилированы, и каталогом профилей.
+    """
+    if not profiler.available:
+        raise HTTPException(
+            status_code=404,
+            detail="Профилирование выключено (не задан MBB_PROFILE_DIR)",
+        )
+    return {
+        "armed": profiler.arm(requests),
+        "profile_dir": profiler.out_dir,
+        "worker": os.getpid(),
+    }
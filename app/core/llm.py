@@ -2,31 +2,68 @@
 Модуль инициализации LLM-агента с инструментами и системным промптом.
 """
 import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
 from langchain.tools import tool
 from langchain.agents import create_tool_calling_agent, AgentExecutor  # Исправлено: langchain, а не langchain_classic
+from langchain_core.agents import AgentFinish
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.messages import SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from langchain_ollama import ChatOllama
 
-from app.config.config import MBB_OLLAMA_MODEL_NAME, MBB_PRINT_THINKING_LOG, TTS_URL
-from app.core.client import PostClient
+from app.config.config import (
+    MBB_AGENT_MAX_ITERATIONS,
+    MBB_COMPACT_TOOL_SCHEMAS,
+    MBB_DIRECT_TOOL_ANSWERS,
+    MBB_FALLBACK_ANSWER,
+    MBB_KNOWLEDGE_DB,
+    MBB_KNOWLEDGE_INJECT,
+    MBB_KNOWLEDGE_TOP_K,
+    MBB_LLM_CALL_TIMEOUT,
+    MBB_LLM_MAX_CONCURRENCY,
+    MBB_OLLAMA_HEALTH_INTERVAL,
+    MBB_OLLAMA_KEEP_ALIVE,
+    MBB_OLLAMA_MODEL_NAME,
+    MBB_OLLAMA_NUM_CTX,
+    MBB_OLLAMA_SMALL_MODEL_NAME,
+    MBB_OLLAMA_TIMEOUT,
+    MBB_OLLAMA_URLS,
+    MBB_PRINT_THINKING_LOG,
+    MBB_PROMPT_TOKEN_BUDGET,
+    per_worker,
+)
+from app.core import trace
+from app.core.backends import BackendUnavailableError, OllamaBackend, OllamaBackendPool
+from app.core.constants import DEFAULT_SESSION
+from app.core.deadline import DeadlineExceededError, ToolResultsCallback
 from app.core.logger import get_logger
+from app.core.metrics import metrics
+from app.core.outbox import tts_outbox
+from app.core.scheduler import RequestSupersededError
+from app.core.tool_runner import TOOL_TIMEOUT_MESSAGE, run_sync_tool
+from app.core.usage import PromptUsageCallback
+from app.tools.knowledge import format_snippets, open_index
 from app.tools.math import calculator
 from app.tools.time import get_time
-from app.utils.basic_text_utils import filter_text_math, process_time_answers, wrap_answer_with_ssml
-from app.utils.number_to_words_ru import float_to_text_russian
+from app.utils.basic_text_utils import filter_text_math
+from app.utils.intent_classifier import OPEN, classify_question
+from app.utils.speech_normalizer import normalize_for_speech
 
 # --- Настройка логирования ---
 log = get_logger(__name__)
 
-was_math_tool_used = False
-was_time_tool_used = False
-
 
 # --- Определение инструментов ---
+# Инструменты асинхронные: AgentExecutor выполняет вызовы одного шага
+# одновременно, а синхронная работа уходит в пул (app.core.tool_runner).
 @tool
-def get_current_time() -> str:
+async def get_current_time() -> str:
     """Возвращает текущее время.
 
     Возможные примеры запросов:
@@ -38,15 +75,13 @@ def get_current_time() -> str:
     Returns:
         Текущее время в формате ЧЧ:ММ.
     """
-    global was_time_tool_used
-    was_time_tool_used = True
     current_time = get_time()
     log.info(f"Инструмент вызван: get_current_time -> {current_time}")
     return f"{current_time}"
 
 
 @tool
-def calculate_math_expression(expression: str) -> str:
+async def calculate_math_expression(expression: str) -> str:
     """Выполняет математические вычисления с поддержкой дробей, корней, тригонометрии и pi.
 
     Работает в градусах. 'pi', 'π' интерпретируются как 180.
@@ -62,25 +97,152 @@ def calculate_math_expression(expression: str) -> str:
     Returns:
         Результат в формате: "Результат: {символьный} ≈ {численный}".
     """
-    global was_math_tool_used
     log.info(f"Инструмент вызван: calculate_math_expression с выражением '{expression}'")
-    was_math_tool_used = True
-    return calculator(expression)
+    return await run_sync_tool(
+        "calculate_math_expression", calculator, expression, cpu_bound=True
+    )
+
+
+knowledge_index = open_index(MBB_KNOWLEDGE_DB)
+
+
+@tool
+async def search_knowledge(query: str) -> str:
+    """Ищет справку в локальной энциклопедии.
+
+    Используй для вопросов о понятиях, людях, местах и событиях:
+    - Что такое магнетар
+    - Кто такой Гагарин
+    - Расскажи о Париже
+
+    Args:
+        query: Вопрос или ключевые слова для поиска.
 
+    Returns:
+        Найденные фрагменты статей или "Ничего не найдено".
+    """
+    log.info(f"Инструмент вызван: search_knowledge с запросом '{query}'")
+    snippets = await run_sync_tool(
+        "search_knowledge", knowledge_index.search, query, MBB_KNOWLEDGE_TOP_K
+    )
+    if isinstance(snippets, str):
+        return snippets  # таймаут
+    return format_snippets(snippets) or "Ничего не найдено"
+
+
+# Короткие описания инструментов для компактного режима схем:
+# полные docstring-и попадают в каждый промпт и заметно его раздувают
+COMPACT_TOOL_DESCRIPTIONS = {
+    "get_current_time": "Текущее время ЧЧ:ММ (который час, сколько времени).",
+    "calculate_math_expression": (
+        "Вычисляет математическое выражение в градусах: "
+        "+ - * / ^, sqrt, sin, cos, tan, ctg, pi."
+    ),
+    "search_knowledge": "Справка из локальной энциклопедии о понятиях, людях, местах.",
+}
+
+
+def compact_tool(tool_):
+    """
+    Возвращает копию инструмента с коротким описанием.
+
+    Args:
+        tool_: Инструмент LangChain.
 
-# Список инструментов
+    Returns:
+        Инструмент с описанием из COMPACT_TOOL_DESCRIPTIONS (если оно задано).
+    """
+    description = COMPACT_TOOL_DESCRIPTIONS.get(tool_.name)
+    if not description:
+        return tool_
+    return tool_.model_copy(update={"description": description})
+
+
+# Список инструментов (порядок фиксирован — от него зависит префикс промпта)
 tools = [
     get_current_time,
     calculate_math_expression,
 ]
+if knowledge_index is not None:
+    tools.append(search_knowledge)
+if MBB_COMPACT_TOOL_SCHEMAS:
+    tools = [compact_tool(t) for t in tools]
+
+# Результат времени и вычислений уже готовый ответ: агент не просит модель
+# переформулировать его (постобработка всё равно оставила бы от фразы только
+# число или время), и ответ приходит на вызов модели раньше. Ошибку или таймаут
+# инструмента агент по-прежнему отдаёт модели, чтобы она могла исправиться.
+DIRECT_ANSWER_PATTERNS = {
+    "get_current_time": re.compile(r"\d{1,2}:\d{2}"),
+    "calculate_math_expression": re.compile(r"Result: .+ ~ -?\d+\.\d+"),
+}
+# Инструменты, результат которых может стать ответом без второго вызова модели
+DIRECT_TOOLS = set(DIRECT_ANSWER_PATTERNS) if MBB_DIRECT_TOOL_ANSWERS else set()
+
+
+def is_direct_answer(tool_name: str, observation: str) -> bool:
+    """
+    Проверяет, что результат инструмента можно сразу отдать как ответ.
+
+    Args:
+        tool_name: Имя инструмента.
+        observation: Результат инструмента.
+
+    Returns:
+        True для успешного результата инструмента из DIRECT_TOOLS.
+    """
+    if tool_name not in DIRECT_TOOLS:
+        return False
+    return bool(DIRECT_ANSWER_PATTERNS[tool_name].fullmatch(str(observation).strip()))
+
+
+class DirectAnswerAgentExecutor(AgentExecutor):
+    """
+    Исполнитель агента, который завершает работу на успешном результате
+    инструмента из DIRECT_TOOLS, не вызывая модель второй раз.
+    """
+
+    def _get_tool_return(self, next_step_output):
+        """Завершает агента на готовом ответе инструмента."""
+        agent_action, observation = next_step_output
+        if is_direct_answer(agent_action.tool, observation):
+            return AgentFinish({"output": observation}, "")
+        return super()._get_tool_return(next_step_output)
 
-# --- Настройка модели Ollama ---
-llm = ChatOllama(
-    model=MBB_OLLAMA_MODEL_NAME,
-    temperature=0.7,
-    base_url="http://localhost:11434",  # стандартный URL Ollama
+# --- Настройка бэкендов Ollama ---
+# Запросы распределяются по серверам из MBB_OLLAMA_URLS с учётом их загрузки;
+# слоты каждого сервера делятся между рабочими процессами
+ollama_pool = OllamaBackendPool(
+    MBB_OLLAMA_URLS,
+    max_concurrency=per_worker(MBB_LLM_MAX_CONCURRENCY),
+    probe_interval=MBB_OLLAMA_HEALTH_INTERVAL,
 )
-log.info("Модель LLM инициализирована: %s", llm.model)
+log.info(f"Бэкенды Ollama: {', '.join(b.url for b in ollama_pool.backends)}")
+
+
+def build_llm(base_url: str, model: str) -> ChatOllama:
+    """
+    Создаёт клиента модели Ollama для конкретного бэкенда.
+
+    Параметры модели не меняются между запросами: любое изменение опций
+    заставляет Ollama перезагрузить модель и заново вычислять префикс промпта.
+
+    Args:
+        base_url: URL сервера Ollama.
+        model: Имя модели.
+
+    Returns:
+        Экземпляр ChatOllama.
+    """
+    return ChatOllama(
+        model=model,
+        temperature=0.7,
+        base_url=base_url,
+        keep_alive=MBB_OLLAMA_KEEP_ALIVE,
+        num_ctx=MBB_OLLAMA_NUM_CTX or None,
+        # Зависший вызов обрывается, не дожидаясь общего таймаута
+        client_kwargs={"timeout": MBB_LLM_CALL_TIMEOUT},
+    )
 
 # --- Системный промпт ---
 system_prompt = (
@@ -101,49 +263,334 @@ prompt = ChatPromptTemplate.from_messages(
 )
 log.info("Системный промпт и шаблон загружены.")
 
-# --- Создание агента ---
-agent = create_tool_calling_agent(
-    llm=llm,
-    tools=tools,
-    prompt=prompt,
-)
 
-agent_executor = AgentExecutor(
-    agent=agent,
-    tools=tools,
-    verbose=MBB_PRINT_THINKING_LOG,
-    handle_parsing_errors=True,
+def prompt_prefix_fingerprint() -> str:
+    """
+    Считает отпечаток неизменной части промпта: системного промпта и схем инструментов.
+
+    Если отпечаток меняется между запусками, Ollama не сможет
+    переиспользовать кэш префикса.
+
+    Returns:
+        Строка вида "<sha256[:12]> (<размер> байт)".
+    """
+    prefix = json.dumps(
+        {
+            "system": system_prompt,
+            "tools": [convert_to_openai_tool(t) for t in tools],
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    ).encode("utf-8")
+    return f"{hashlib.sha256(prefix).hexdigest()[:12]} ({len(prefix)} байт)"
+
+
+log.info(
+    f"Префикс промпта: {prompt_prefix_fingerprint()}, "
+    f"компактные схемы инструментов: {MBB_COMPACT_TOOL_SCHEMAS}"
 )
-log.info("Агент и исполнитель инициализированы.")
 
-async def process_request_with_llm(user_message: str):
-    global was_math_tool_used
-    global was_time_tool_used
+# --- Создание агентов ---
+# Исполнитель агента создаётся один раз на пару (бэкенд, модель)
+_agent_executors: Dict[Tuple[str, str], AgentExecutor] = {}
+
+
+def get_agent_executor(
+    base_url: str, model: str = MBB_OLLAMA_MODEL_NAME
+) -> AgentExecutor:
+    """
+    Возвращает исполнитель агента для бэкенда и модели.
+
+    Args:
+        base_url: URL сервера Ollama.
+        model: Имя модели.
+
+    Returns:
+        Закэшированный AgentExecutor.
+    """
+    key = (base_url, model)
+    executor = _agent_executors.get(key)
+    if executor is None:
+        agent = create_tool_calling_agent(
+            llm=build_llm(base_url, model),
+            tools=tools,
+            prompt=prompt,
+        )
+        executor = DirectAnswerAgentExecutor(
+            agent=agent,
+            tools=tools,
+            verbose=MBB_PRINT_THINKING_LOG,
+            handle_parsing_errors=True,
+            return_intermediate_steps=True,
+            max_iterations=MBB_AGENT_MAX_ITERATIONS,
+        )
+        _agent_executors[key] = executor
+        log.info(f"Агент инициализирован: модель {model} на {base_url}")
+    return executor
+
+
+def enforce_prompt_budget(usage: PromptUsageCallback) -> bool:
+    """
+    Сокращает префикс промпта, если запрос не уложился в бюджет токенов.
+
+    Полные схемы инструментов заменяются компактными, а исполнители агентов
+    пересоздаются. Префикс меняется один раз и дальше снова неизменен.
+
+    Args:
+        usage: Статистика промпта завершённого запроса.
+
+    Returns:
+        True, если схемы инструментов были сокращены.
+    """
+    global tools
+    if not usage.over_budget:
+        return False
+    compact = [compact_tool(t) for t in tools]
+    if [t.description for t in compact] == [t.description for t in tools]:
+        return False  # сокращать уже нечего
+    tools = compact
+    _agent_executors.clear()
+    metrics.inc("llm.prompt_compacted")
+    log.warning(
+        f"Промпт превысил бюджет {usage.budget} токенов, схемы инструментов "
+        f"сокращены. Префикс промпта: {prompt_prefix_fingerprint()}"
+    )
+    return True
+
+
+# Фразы, по которым ответ малой модели считается неуверенным
+LOW_CONFIDENCE_MARKERS = ("без малейшего понятия", "не знаю", "не могу ответить")
+
+
+def is_low_confidence(answer: str) -> bool:
+    """
+    Проверяет, что модель не справилась с вопросом.
+
+    Args:
+        answer: Ответ агента.
+
+    Returns:
+        True для пустого ответа или ответа с фразой неуверенности.
+    """
+    text = answer.strip().lower()
+    return not text or any(marker in text for marker in LOW_CONFIDENCE_MARKERS)
+
+
+async def run_agent(
+    user_message: str, model: str, callbacks: List[BaseCallbackHandler]
+) -> dict:
+    """
+    Выполняет агента с указанной моделью на наименее загруженном бэкенде.
+
+    Слот бэкенда освобождается сразу при отмене задачи: ainvoke прерывает
+    HTTP-запрос к Ollama, и генерация ответа останавливается.
+
+    Args:
+        user_message: Вопрос пользователя.
+        model: Имя модели Ollama.
+        callbacks: Callback-и запроса (учёт промпта, результаты инструментов).
+
+    Returns:
+        Ответ AgentExecutor (output и intermediate_steps).
+    """
+
+    async def call(backend: OllamaBackend) -> dict:
+        return await get_agent_executor(backend.url, model).ainvoke(
+            {"input": user_message},
+            config={"callbacks": [*callbacks, *trace.callbacks()]},
+        )
+
+    return await ollama_pool.run(call, timeout=MBB_OLLAMA_TIMEOUT)
+
+
+async def run_cascade(user_message: str, callbacks: List[BaseCallbackHandler]) -> dict:
+    """
+    Каскад моделей: сначала малая модель, большая — только при необходимости.
+
+    Развёрнутые вопросы сразу уходят большой модели. Остальные обрабатывает
+    малая модель (выбор инструментов, короткие ответы); если она не уверена
+    в ответе, вопрос передаётся большой модели.
+    Без MBB_OLLAMA_SMALL_MODEL_NAME все вопросы обрабатывает основная модель.
+
+    Args:
+        user_message: Вопрос пользователя.
+        callbacks: Callback-и запроса.
+
+    Returns:
+        Ответ AgentExecutor.
+    """
+    if not MBB_OLLAMA_SMALL_MODEL_NAME:
+        return await run_agent(user_message, MBB_OLLAMA_MODEL_NAME, callbacks)
+
+    kind = classify_question(user_message)
+    if kind != OPEN:
+        started = time.perf_counter()
+        response = await run_agent(user_message, MBB_OLLAMA_SMALL_MODEL_NAME, callbacks)
+        small_ms = (time.perf_counter() - started) * 1000
+        metrics.observe("cascade.small_ms", small_ms)
+        if not is_low_confidence(response.get("output", "")):
+            metrics.inc("cascade.small")
+            log.info(f"Каскад: вопрос '{kind}' → малая модель, {small_ms:.0f} мс")
+            return response
+        metrics.inc("cascade.escalated")
+        log.info(f"Каскад: малая модель не уверена ({small_ms:.0f} мс), эскалация")
+
+    started = time.perf_counter()
+    response = await run_agent(user_message, MBB_OLLAMA_MODEL_NAME, callbacks)
+    big_ms = (time.perf_counter() - started) * 1000
+    metrics.observe("cascade.big_ms", big_ms)
+    metrics.inc("cascade.big")
+    log.info(f"Каскад: вопрос '{kind}' → большая модель, {big_ms:.0f} мс")
+    return response
+
+
+def with_knowledge(user_message: str) -> str:
+    """
+    Дополняет развёрнутый вопрос фрагментами из локальной базы знаний.
+
+    Справка добавляется в сообщение пользователя, а не в системный промпт,
+    чтобы неизменный префикс промпта оставался закэшированным в Ollama.
+
+    Args:
+        user_message: Вопрос пользователя.
+
+    Returns:
+        Вопрос со справкой или исходный вопрос.
+    """
+    if not (MBB_KNOWLEDGE_INJECT and knowledge_index is not None):
+        return user_message
+    if classify_question(user_message) != OPEN:
+        return user_message
+    with metrics.timer("knowledge.search_ms"):
+        snippets = knowledge_index.search(user_message, MBB_KNOWLEDGE_TOP_K)
+    if not snippets:
+        return user_message
+    metrics.inc("knowledge.injected")
+    return f"{user_message}\n\nСправка:\n{format_snippets(snippets)}"
+
+
+# Начало ответа AgentExecutor при исчерпании max_iterations
+AGENT_STOPPED_PREFIX = "Agent stopped due to"
+
+
+def degraded_answer(steps: list) -> str:
+    """
+    Ответ, когда агент не успел: результат последнего инструмента или заготовка.
+
+    Args:
+        steps: Выполненные шаги агента (действие, результат инструмента).
+
+    Returns:
+        Текст ответа.
+    """
+    metrics.inc("deadline.degraded")
+    for _action, observation in reversed(steps):
+        observation = str(observation).strip()
+        if observation and observation != TOOL_TIMEOUT_MESSAGE:
+            log.info("Ответ по результату инструмента (агент не успел)")
+            return observation
+    metrics.inc("deadline.fallback")
+    return MBB_FALLBACK_ANSWER
+
+
+async def answer_question(user_message: str) -> Tuple[str, str]:
+    """
+    Вычисляет ответ на вопрос без отправки в TTS.
+
+    Args:
+        user_message: Вопрос пользователя.
+
+    Returns:
+        Кортеж (текст ответа, SSML для TTS).
+    """
     log.info(f"Вопрос: {user_message}")
     log.info(f"Обработка вопроса: {user_message}")
-    response = agent_executor.invoke({"input": user_message})
+    usage = PromptUsageCallback(budget=MBB_PROMPT_TOKEN_BUDGET)
+    tool_results = ToolResultsCallback()
+    degraded = False
+    try:
+        with metrics.timer("llm.agent_ms"):
+            response = await run_cascade(
+                with_knowledge(user_message), [usage, tool_results]
+            )
+    except DeadlineExceededError:
+        metrics.inc("deadline.exceeded")
+        log.warning("Агент не уложился в бюджет времени")
+        response = {"output": "", "intermediate_steps": tool_results.steps}
+        degraded = True
+    log.info(f"Статистика промпта: {usage.report()}")
+    enforce_prompt_budget(usage)
+    steps = response.get("intermediate_steps", [])
+    used_tools = {action.tool for action, _ in steps}
     res = f"{response.get('output').strip()}"
-    if was_math_tool_used:
-        was_math_tool_used = False
+    trace.note("agent_output", res)
+    if steps and is_direct_answer(steps[-1][0].tool, res):
+        metrics.inc("llm.direct_tool_answers")
+    if degraded or res.startswith(AGENT_STOPPED_PREFIX):
+        res = degraded_answer(steps)
+    if "calculate_math_expression" in used_tools:
+        # Из фразы модели оставляем только число
         res = filter_text_math(res)
-        try:
-            res = float_to_text_russian(float(res))
-        except ValueError:
-            pass  # Если не число — оставляем как есть
-    if was_time_tool_used:
-        was_time_tool_used = False
-        time_text = process_time_answers(res)
-        if time_text:
-            res = time_text
+    # Числа, время и даты в любом месте ответа — прописью, сразу в SSML
+    with metrics.timer("normalize_ms"):
+        res, wrapped_res = normalize_for_speech(res)
     log.info(f"--> Ответ: {res}\n")
+    return res, wrapped_res
+
+
+async def compute_answer(
+    user_message: str, precomputed: Optional[Awaitable[Tuple[str, str]]] = None
+) -> Tuple[str, str]:
+    """
+    Вычисляет ответ; если ни один бэкенд Ollama недоступен — заготовку.
+
+    Args:
+        user_message: Вопрос пользователя.
+        precomputed: Уже запущенное вычисление ответа (спекулятивный запуск по
+            промежуточной расшифровке) вместо нового вызова агента.
+
+    Returns:
+        Кортеж (текст ответа, SSML для TTS).
+    """
+    try:
+        return await (precomputed or answer_question(user_message))
+    except BackendUnavailableError as e:
+        metrics.inc("backends.unavailable")
+        log.error(f"Ответ заготовкой: {e}")
+        return normalize_for_speech(MBB_FALLBACK_ANSWER)
+
+
+async def process_request_with_llm(
+    user_message: str,
+    session: str = DEFAULT_SESSION,
+    is_current: Optional[Callable[[], bool]] = None,
+    precomputed: Optional[Awaitable[Tuple[str, str]]] = None,
+) -> str:
+    """
+    Отвечает на вопрос и ставит ответ в очередь отправки в TTS.
+
+    Отправка выполняется в фоне: ответ возвращается, не дожидаясь TTS.
+
+    Args:
+        user_message: Вопрос пользователя.
+        session: Сессия, в порядке которой ответ будет озвучен.
+        is_current: Проверка, что вопрос ещё актуален (в сессию не пришёл
+            более новый вопрос, в том числе в другой рабочий процесс).
+        precomputed: Уже запущенное вычисление ответа (спекулятивный запуск по
+            промежуточной расшифровке) вместо нового вызова агента.
+
+    Returns:
+        Текст ответа.
+
+    Raises:
+        RequestSupersededError: Пока вычислялся ответ, пришёл более новый вопрос.
+    """
+    res, wrapped_res = await compute_answer(user_message, precomputed)
+    if is_current is not None and not is_current():
+        metrics.inc("shared.superseded")
+        raise RequestSupersededError(f"Вопрос сессии '{session}' устарел")
     if res:
-        try:
-            wrapped_res = str(wrap_answer_with_ssml(res))
-            async with PostClient(TTS_URL) as client:
-                post_result = await client.post(text=wrapped_res)
-            log.info(f"Результат отправки в TTS: {post_result}")
-        except Exception as e:
-            log.error(f"Ошибка при отправке в TTS: {e}")
+        tts_outbox.enqueue(session, wrapped_res)
     return res
 
 
@@ -164,6 +611,7 @@ async def main():
     ]
     for q in questions:
         await process_request_with_llm(q)
+    await tts_outbox.close()
 
 
 if __name__ == "__main__":
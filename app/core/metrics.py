@@ -0,0 +1,112 @@
+"""
+Модуль сбора метрик процесса: счётчики, текущие значения и тайминги.
+Метрики хранятся в памяти и отдаются через HTTP-эндпоинт /metrics.
+"""
+
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterator, List
+
+
+class Metrics:
+    """
+    Потокобезопасное хранилище метрик.
+
+    - счётчики (inc) — монотонно растущие значения;
+    - gauge (set_gauge) — текущее значение (например, глубина очереди);
+    - наблюдения (observe) — скользящее окно значений, по которому
+      считаются count/avg/p50/p95/max.
+    """
+
+    def __init__(self, window: int = 512):
+        """
+        Args:
+            window: Размер скользящего окна для наблюдений.
+        """
+        self._lock = threading.Lock()
+        self._window = window
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._observations: Dict[str, Deque[float]] = {}
+        self._totals: Dict[str, int] = defaultdict(int)
+        # Подписчики на наблюдения (например, запись трасс)
+        self._observers: List[Callable[[str, float], None]] = []
+
+    def inc(self, name: str, value: float = 1) -> None:
+        """Увеличивает счётчик name на value."""
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Устанавливает текущее значение gauge."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """Добавляет наблюдение (например, длительность в мс)."""
+        with self._lock:
+            window = self._observations.get(name)
+            if window is None:
+                window = self._observations[name] = deque(maxlen=self._window)
+            window.append(value)
+            self._totals[name] += 1
+        for observer in self._observers:
+            observer(name, value)
+
+    def add_observer(self, observer: Callable[[str, float], None]) -> None:
+        """
+        Подписывает функцию на все наблюдения.
+
+        Args:
+            observer: Функция (имя метрики, значение); вызывается синхронно.
+        """
+        self._observers.append(observer)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """
+        Контекстный менеджер: замеряет длительность блока в миллисекундах.
+
+        Args:
+            name: Имя метрики.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - started) * 1000)
+
+    def snapshot(self) -> dict:
+        """
+        Возвращает снимок всех метрик.
+
+        Returns:
+            Словарь с ключами counters, gauges и summaries.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            observations = {k: list(v) for k, v in self._observations.items()}
+            totals = dict(self._totals)
+
+        summaries = {}
+        for name, values in observations.items():
+            if not values:
+                continue
+            ordered = sorted(values)
+            summaries[name] = {
+                "count": totals[name],
+                "avg": round(sum(ordered) / len(ordered), 3),
+                "p50": round(ordered[len(ordered) // 2], 3),
+                "p95": round(
+                    ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3
+                ),
+                "max": round(ordered[-1], 3),
+            }
+        return {"counters": counters, "gauges": gauges, "summaries": summaries}
+
+
+# Общий экземпляр метрик процесса
+metrics = Metrics()
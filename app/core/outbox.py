@@ -0,0 +1,466 @@
+"""
+Исходящая очередь доставки ответов в TTS.
+
+Ответ кладётся в ограниченную очередь и отправляется фоновым отправителем,
+поэтому вычисление ответа никогда не ждёт TTS. Доставка упорядочена внутри
+сессии, неудачные отправки повторяются с экспоненциальной задержкой и джиттером,
+а автоматический выключатель (circuit breaker) сбрасывает нагрузку, пока TTS
+недоступен.
+
+Сессии (устройства) можно направить на разные TTS или на группу TTS
+(MBB_TTS_ROUTES): у каждого TTS своя очередь, свой клиент с пулом соединений,
+свой выключатель и таймаут, поэтому медленное устройство не задерживает
+остальные.
+"""
+
+import asyncio
+import random
+import re
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.config.config import (
+    MBB_TTS_BREAKER_RESET,
+    MBB_TTS_BREAKER_THRESHOLD,
+    MBB_TTS_MAX_ATTEMPTS,
+    MBB_TTS_QUEUE_SIZE,
+    MBB_TTS_ROUTES,
+    MBB_TTS_TIMEOUT,
+    TTS_URL,
+)
+from app.core.client import PostClient
+from app.core.logger import get_logger
+from app.core.metrics import metrics
+
+log = get_logger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель.
+
+    closed — запросы идут; после failure_threshold ошибок подряд — open:
+    запросы отклоняются reset_timeout секунд; затем half_open — пропускается
+    ровно одна пробная отправка (остальные отклоняются, пока она идёт),
+    её успех закрывает выключатель, ошибка снова размыкает.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 10.0,
+        name: Optional[str] = None,
+    ):
+        """
+        Args:
+            failure_threshold: Число ошибок подряд до размыкания.
+            reset_timeout: Время в секундах до пробной отправки.
+            name: Имя TTS для журнала и метрик (при нескольких TTS).
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        # Идёт пробная отправка в состоянии half_open
+        self._probing = False
+
+    def rejects(self) -> bool:
+        """Отклоняет ли выключатель запросы (не занимая пробную отправку)."""
+        return (
+            self.state == self.OPEN
+            and time.monotonic() - self.opened_at < self.reset_timeout
+        )
+
+    def allow(self) -> bool:
+        """
+        Можно ли выполнить запрос сейчас.
+
+        В состоянии half_open разрешение занимает пробную отправку: её итог
+        нужно сообщить через record_success/record_failure или release.
+        """
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def release(self) -> None:
+        """Пробная отправка прервана без результата — следующую можно начать."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        """Успешный запрос закрывает выключатель."""
+        self._probing = False
+        self.failures = 0
+        if self.state != self.CLOSED:
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        """Ошибка запроса; при превышении порога выключатель размыкается."""
+        self._probing = False
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            if self.state != self.OPEN:
+                self._set_state(self.OPEN)
+
+    def _set_state(self, state: str) -> None:
+        target = f" {self.name}" if self.name else ""
+        log.info(f"Circuit breaker TTS{target}: {self.state} → {state}")
+        self.state = state
+        metrics.set_gauge(
+            _metric_name("tts.breaker_open", self.name), int(state == self.OPEN)
+        )
+
+
+def _metric_name(base: str, name: Optional[str]) -> str:
+    return f"{base}.{name}" if name else base
+
+
+class _Delivery:
+    """Один ответ, ожидающий отправки."""
+
+    def __init__(self, session: str, payload: str):
+        self.session = session
+        self.payload = payload
+        self.enqueued_at = time.perf_counter()
+
+
+class TTSOutbox:
+    """
+    Ограниченная очередь отправки в TTS с фоновыми отправителями по сессиям.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        max_queue: int = 64,
+        max_attempts: int = 4,
+        base_delay: float = 0.2,
+        max_delay: float = 5.0,
+        request_timeout: float = 5.0,
+        breaker: Optional[CircuitBreaker] = None,
+        name: Optional[str] = None,
+    ):
+        """
+        Args:
+            url: URL TTS-сервера.
+            max_queue: Максимум ответов в очереди по всем сессиям.
+            max_attempts: Число попыток отправки одного ответа.
+            base_delay: Начальная задержка между попытками, секунды.
+            max_delay: Максимальная задержка между попытками, секунды.
+            request_timeout: Таймаут одного POST-запроса, секунды.
+            breaker: Автоматический выключатель (по умолчанию — новый).
+            name: Имя TTS для метрики длины очереди (при нескольких TTS).
+        """
+        self.url = url
+        self.name = name
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self._client = PostClient(url, timeout=request_timeout)
+        self._queues: Dict[str, Deque[_Delivery]] = {}
+        self._workers: Dict[str, "asyncio.Task"] = {}
+
+    @property
+    def depth(self) -> int:
+        """Число ответов, ожидающих отправки."""
+        return sum(len(queue) for queue in self._queues.values())
+
+    def enqueue(self, session: str, payload: str) -> bool:
+        """
+        Ставит ответ в очередь сессии, не дожидаясь отправки.
+
+        Args:
+            session: Идентификатор сессии (порядок доставки сохраняется внутри неё).
+            payload: SSML-текст для TTS.
+
+        Returns:
+            False, если ответ сброшен (TTS недоступен или очередь переполнена).
+        """
+        if self.breaker.rejects():
+            metrics.inc("tts.shed")
+            log.warning("TTS недоступен (circuit breaker разомкнут), ответ сброшен")
+            return False
+
+        queue = self._queues.setdefault(session, deque())
+        if self.depth >= self.max_queue:
+            if not queue:
+                metrics.inc("tts.dropped")
+                log.warning("Очередь TTS переполнена, ответ сброшен")
+                return False
+            # Самый старый ответ этой сессии уже неактуален
+            queue.popleft()
+            metrics.inc("tts.dropped")
+
+        queue.append(_Delivery(session, payload))
+        metrics.inc("tts.enqueued")
+        self._update_depth()
+        worker = self._workers.get(session)
+        if worker is None or worker.done():
+            self._workers[session] = asyncio.ensure_future(self._worker(session))
+        return True
+
+    def discard(self, session: str) -> int:
+        """
+        Отменяет неотправленные ответы сессии и текущую отправку (barge-in).
+
+        Args:
+            session: Идентификатор сессии.
+
+        Returns:
+            Число отменённых ответов.
+        """
+        # Отправляемый сейчас ответ тоже лежит в очереди (первым)
+        queue = self._queues.pop(session, None)
+        dropped = len(queue) if queue else 0
+        worker = self._workers.pop(session, None)
+        if worker is not None and not worker.done():
+            worker.cancel()
+        if dropped:
+            metrics.inc("tts.discarded", dropped)
+            log.info(f"Сессия '{session}': отменено ответов в очереди TTS: {dropped}")
+        self._update_depth()
+        return dropped
+
+    async def _worker(self, session: str) -> None:
+        """Отправляет ответы сессии по порядку, пока очередь не опустеет."""
+        await self._client.open()
+        while True:
+            queue = self._queues.get(session)
+            if not queue:
+                self._queues.pop(session, None)
+                break
+            delivery = queue[0]
+            await self._deliver(delivery)
+            if queue and queue[0] is delivery:
+                queue.popleft()
+            self._update_depth()
+        if self._workers.get(session) is asyncio.current_task():
+            del self._workers[session]
+
+    async def _deliver(self, delivery: _Delivery) -> bool:
+        """Отправляет один ответ с повторами; True при успехе."""
+        for attempt in range(self.max_attempts):
+            if not self.breaker.allow():
+                metrics.inc("tts.shed")
+                log.warning("TTS недоступен (circuit breaker разомкнут), ответ сброшен")
+                return False
+            try:
+                delivered = await self._client.post(text=delivery.payload)
+            except BaseException:
+                # Отправка отменена (barge-in, остановка) — пробу выполнит следующая
+                self.breaker.release()
+                raise
+            if delivered:
+                self.breaker.record_success()
+                metrics.inc("tts.delivered")
+                metrics.observe(
+                    "tts.delivery_ms",
+                    (time.perf_counter() - delivery.enqueued_at) * 1000,
+                )
+                return True
+            self.breaker.record_failure()
+            if attempt + 1 < self.max_attempts:
+                metrics.inc("tts.retries")
+                # Экспоненциальная задержка с полным джиттером
+                cap = min(self.max_delay, self.base_delay * 2**attempt)
+                await asyncio.sleep(random.uniform(0, cap))
+        metrics.inc("tts.failed")
+        log.error(f"Не удалось отправить ответ в TTS за {self.max_attempts} попыток")
+        return False
+
+    def _update_depth(self) -> None:
+        metrics.set_gauge(_metric_name("tts.queue_depth", self.name), self.depth)
+
+    async def close(self, drain_timeout: float = 5.0) -> None:
+        """
+        Дожидается отправки очереди (не дольше drain_timeout) и закрывает клиента.
+
+        Args:
+            drain_timeout: Максимальное время ожидания, секунды.
+        """
+        workers = [w for w in self._workers.values() if not w.done()]
+        if workers:
+            _, pending = await asyncio.wait(workers, timeout=drain_timeout)
+            for worker in pending:
+                worker.cancel()
+        await self._client.close()
+
+
+# Таймаут запроса к отдельному TTS в конце адреса маршрута: "http://сова/api/tts/json@2.5"
+_TARGET_TIMEOUT_RE = re.compile(r"@(\d+(?:\.\d+)?)$")
+
+
+def parse_target(spec: str, default_timeout: float) -> Tuple[str, float]:
+    """
+    Разбирает адрес TTS из маршрута.
+
+    Args:
+        spec: Адрес, возможно с суффиксом "@секунды".
+        default_timeout: Таймаут запроса, если суффикса нет.
+
+    Returns:
+        Кортеж (URL, таймаут запроса в секундах).
+    """
+    match = _TARGET_TIMEOUT_RE.search(spec)
+    if match is None:
+        return spec, default_timeout
+    return spec[: match.start()], float(match.group(1))
+
+
+class TTSRouter:
+    """
+    Доставка ответов сессий на их TTS: одно устройство или рассылка на группу.
+
+    Интерфейс совпадает с TTSOutbox; у каждого TTS своя очередь отправки.
+    """
+
+    def __init__(
+        self,
+        default_url: str,
+        routes: Dict[str, List[str]],
+        max_queue: int = 64,
+        max_attempts: int = 4,
+        request_timeout: float = 5.0,
+        breaker_threshold: int = 5,
+        breaker_reset: float = 10.0,
+    ):
+        """
+        Args:
+            default_url: TTS для сессий без маршрута.
+            routes: Сессия → адреса TTS (возможно, с суффиксом "@секунды").
+            max_queue: Максимум ответов в очереди каждого TTS.
+            max_attempts: Число попыток отправки одного ответа.
+            request_timeout: Таймаут POST-запроса по умолчанию, секунды.
+            breaker_threshold: Ошибок подряд до размыкания выключателя TTS.
+            breaker_reset: Пауза до пробной отправки, секунды.
+        """
+        targets: Dict[str, float] = {}
+        for spec in [
+            default_url,
+            *(spec for group in routes.values() for spec in group),
+        ]:
+            # Одинаковые адреса в разных маршрутах используют одну очередь и один клиент
+            url, timeout = parse_target(spec, request_timeout)
+            targets.setdefault(url, timeout)
+        # Имя TTS в журнале и метриках — полный адрес: у нескольких TTS на одном
+        # хосте (или на Unix-сокетах) различаются только пути
+        named = len(targets) > 1
+        self._outboxes: Dict[str, TTSOutbox] = {}
+        for url, timeout in targets.items():
+            name = url if named else None
+            self._outboxes[url] = TTSOutbox(
+                url,
+                max_queue=max_queue,
+                max_attempts=max_attempts,
+                request_timeout=timeout,
+                breaker=CircuitBreaker(breaker_threshold, breaker_reset, name=name),
+                name=name,
+            )
+            if named:
+                log.info(f"TTS {url}: таймаут {timeout} с")
+        self._default = self._resolve([default_url], request_timeout)
+        self._routes: Dict[str, List[TTSOutbox]] = {
+            session: self._resolve(group, request_timeout)
+            for session, group in routes.items()
+            if group
+        }
+        for session, group_outboxes in self._routes.items():
+            log.info(
+                f"Маршрут TTS '{session}': "
+                f"{', '.join(outbox.url for outbox in group_outboxes)}"
+            )
+
+    def _resolve(self, specs: List[str], request_timeout: float) -> List[TTSOutbox]:
+        targets: List[TTSOutbox] = []
+        for spec in specs:
+            outbox = self._outboxes[parse_target(spec, request_timeout)[0]]
+            if outbox not in targets:
+                targets.append(outbox)
+        return targets
+
+    @property
+    def depth(self) -> int:
+        """Число ответов, ожидающих отправки, по всем TTS."""
+        return sum(outbox.depth for outbox in self._outboxes.values())
+
+    def targets(self, session: str) -> List[TTSOutbox]:
+        """Очереди TTS, на которые озвучивается сессия."""
+        return self._routes.get(session, self._default)
+
+    def route_key(self, session: str) -> str:
+        """
+        Ключ набора TTS сессии.
+
+        Одинаковые вопросы схлопываются в один ответ только внутри одного набора
+        TTS: ответ озвучивается на TTS сессии, которая его вычислила.
+        """
+        return ",".join(outbox.url for outbox in self.targets(session))
+
+    def enqueue(self, session: str, payload: str) -> bool:
+        """
+        Ставит ответ в очереди всех TTS сессии, не дожидаясь отправки.
+
+        Args:
+            session: Идентификатор сессии.
+            payload: SSML-текст для TTS.
+
+        Returns:
+            False, если ответ не принят ни одним TTS.
+        """
+        targets = self.targets(session)
+        if len(targets) > 1:
+            metrics.inc("tts.fanout")
+        # Сначала ставим ответ в очередь каждого TTS, потом проверяем: any()
+        # по генератору остановился бы на первом принявшем
+        accepted = [outbox.enqueue(session, payload) for outbox in targets]
+        return any(accepted)
+
+    def discard(self, session: str) -> int:
+        """
+        Отменяет неотправленные ответы сессии на всех её TTS (barge-in).
+
+        Args:
+            session: Идентификатор сессии.
+
+        Returns:
+            Число отменённых ответов.
+        """
+        return sum(outbox.discard(session) for outbox in self.targets(session))
+
+    async def close(self, drain_timeout: float = 5.0) -> None:
+        """
+        Дожидается отправки очередей всех TTS (одновременно) и закрывает клиентов.
+
+        Args:
+            drain_timeout: Максимальное время ожидания, секунды.
+        """
+        await asyncio.gather(
+            *(outbox.close(drain_timeout) for outbox in self._outboxes.values())
+        )
+
+
+# Общая очередь отправки ответов в TTS
+tts_outbox = TTSRouter(
+    TTS_URL,
+    MBB_TTS_ROUTES,
+    max_queue=MBB_TTS_QUEUE_SIZE,
+    max_attempts=MBB_TTS_MAX_ATTEMPTS,
+    request_timeout=MBB_TTS_TIMEOUT,
+    breaker_threshold=MBB_TTS_BREAKER_THRESHOLD,
+    breaker_reset=MBB_TTS_BREAKER_RESET,
+)
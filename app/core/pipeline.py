@@ -0,0 +1,184 @@
+"""
+Обработка одной фразы от STT: от сырого текста до ответа в очереди TTS.
+
+Используется HTTP-сервером (POST /json) и проигрывателем трасс
+(python -m app.core.trace replay).
+"""
+
+from typing import Optional
+
+from app.config.config import MBB_REQUEST_BUDGET
+from app.core import deadline, trace
+from app.core.admission import AdmissionRejectedError, admission, question_priority
+from app.core.constants import DEFAULT_SESSION, WAKE_WORDS
+from app.core.deadline import DeadlineExceededError
+from app.core.filler import fillers
+from app.core.llm import compute_answer
+from app.core.metrics import metrics
+from app.core.outbox import tts_outbox
+from app.core.scheduler import RequestSupersededError, scheduler
+from app.core.shared_state import shared_state
+from app.core.singleflight import SingleFlight, coalescer
+from app.core.speculation import speculator
+from app.core.stabilizer import stabilizer
+from app.core.utterance_gate import PASSED, utterance_gate
+from app.utils.basic_text_utils import find_and_crop_by_keywords, normalize_question
+from app.utils.levenstein_text_utils import similarity_ratio
+from app.utils.speech_normalizer import normalize_for_speech
+
+# Со сколькими последними ответами сравнивать вопрос при проверке эха
+ECHO_HISTORY_SIZE = 3
+
+# Обработки вопросов сессий: повтор вопроса той же сессии присоединяется к ней
+_session_flights = SingleFlight()
+
+
+class _SharedAnswer:
+    """Ответ, общий для дубликатов вопроса: озвучивается один раз."""
+
+    def __init__(self, text: str, ssml: Optional[str]):
+        self.text = text
+        self._ssml = ssml
+
+    def take_ssml(self) -> Optional[str]:
+        """Забирает SSML для отправки в TTS (следующим дубликатам — None)."""
+        ssml, self._ssml = self._ssml, None
+        return ssml
+
+
+async def handle_utterance(
+    text: str, owner: Optional[str] = None, final: bool = False
+) -> dict:
+    """
+    Обрабатывает фразу: дожидается её стабилизации, выделяет вопрос,
+    отсеивает эхо и отвечает.
+
+    Обработка после стабилизации укладывается в бюджет времени MBB_REQUEST_BUDGET.
+
+    Args:
+        text: Текст, распознанный STT (возможно, промежуточный).
+        owner: Источник фразы (устройство/пользователь); определяет сессию.
+        final: STT пометил текст как окончательный.
+
+    Returns:
+        Словарь со статусом и текстом вопроса (ответ для POST /json).
+    """
+    with trace.tracer.record(text, owner):
+        trace.note("final", final)
+        if not final:
+            # Пока STT дописывает фразу, законченный на вид вопрос уже считается
+            speculator.consider(owner or DEFAULT_SESSION, text)
+        settled = await stabilizer.settle(owner or DEFAULT_SESSION, text, final)
+        if settled is None:
+            # Промежуточный вариант поглощён более полным
+            trace.note("status", "merged")
+            return {"status": "merged", "received_text": text.strip()}
+        with deadline.budget(MBB_REQUEST_BUDGET):
+            result = await _handle_utterance(settled, owner)
+        trace.note("status", result["status"])
+        return result
+
+
+async def _handle_utterance(text: str, owner: Optional[str]) -> dict:
+    question = text.strip()
+    question = find_and_crop_by_keywords(WAKE_WORDS, question)
+    trace.note("question", question)
+    session = owner or DEFAULT_SESSION
+    speculation = speculator.take(session, question)
+    cropped = question
+    trace.note("speculative", speculation is not None)
+    if question:
+        # проверяем, что нам на вход не приехал наш же ответ
+        is_echo = any(
+            similarity_ratio(question, response) >= 0.5
+            for response in shared_state.recent_responses(ECHO_HISTORY_SIZE)
+        )
+        trace.note("echo", is_echo)
+        verdict = PASSED
+        if not is_echo:
+            # Мусор STT и обрывки фраз не стоят вызова LLM
+            question, verdict = utterance_gate.check(session, question)
+            trace.note("quality", verdict)
+        if speculation is not None and (
+            is_echo or verdict != PASSED or question != cropped
+        ):
+            speculation.cancel()
+        if verdict != PASSED:
+            return {"status": verdict, "received_text": question}
+        if not is_echo:
+            generation = shared_state.begin_question(session, question)
+            # Ответ озвучивается только на TTS вычислившей его сессии, поэтому
+            # дубликаты схлопываются (и берутся из кэша) в пределах одного набора TTS
+            key = f"{tts_outbox.route_key(session)}|{normalize_question(question)}"
+            priority = question_priority(question)
+            # Спекуляцию, взятую общим вычислением, отменяет только оно само
+            adopted = False
+
+            async def compute() -> _SharedAnswer:
+                # Общее для всех дубликатов вычисление не зависит от актуальности
+                # вопроса одной сессии: её новый вопрос отменяет только её ожидание
+                ssml = None
+
+                async def compute_text() -> str:
+                    nonlocal adopted, ssml
+                    adopted = speculation is not None
+                    # Если ответ задерживается (в том числе в очереди к LLM), сова
+                    # успеет сказать "Сейчас подумаю…". Под перегрузкой вопрос
+                    # ждёт своей очереди к LLM или сразу отклоняется
+                    async with fillers.mask(session):
+                        if speculation is not None:
+                            # Слот LLM уже занят спекулятивным запуском
+                            text, ssml = await compute_answer(question, speculation)
+                            return text
+                        async with admission.admit(session, priority):
+                            text, ssml = await compute_answer(question)
+                    return text
+
+                text, voiced = await shared_state.answer_once(key, compute_text)
+                if ssml is None and not voiced:
+                    # Повтор недавнего вопроса: ответ из кэша озвучивается снова
+                    ssml = normalize_for_speech(text)[1]
+                # Ответ, которого дождались из другого процесса, озвучивает он сам
+                return _SharedAnswer(text, ssml)
+
+            async def answer() -> str:
+                # Новый вопрос перебивает ещё не озвученный ответ сессии
+                tts_outbox.discard(session)
+                # Одинаковые вопросы с разных микрофонов (и из разных рабочих
+                # процессов) получают один ответ и одну отправку в TTS
+                shared = await coalescer.do(key, compute)
+                if not shared_state.is_current(session, generation):
+                    # Новый вопрос мог прийти и в другой рабочий процесс
+                    metrics.inc("shared.superseded")
+                    raise RequestSupersededError(f"Вопрос сессии '{session}' устарел")
+                ssml = shared.take_ssml()
+                if shared.text and ssml:
+                    tts_outbox.enqueue(session, ssml)
+                return shared.text
+
+            try:
+                # Повтор вопроса сессии (поколение не сменилось) присоединяется
+                # к его обработке, а не перебивает её
+                response = await _session_flights.do(
+                    f"{session}#{generation}", lambda: scheduler.run(session, answer)
+                )
+            except RequestSupersededError:
+                return {"status": "superseded", "received_text": question}
+            except AdmissionRejectedError as e:
+                trace.note("retry_after", e.retry_after)
+                return {
+                    "status": "rejected",
+                    "received_text": question,
+                    "retry_after": e.retry_after,
+                }
+            except DeadlineExceededError:
+                # Ответ вычисляет и озвучит другой рабочий процесс,
+                # дождаться его не успели
+                return {"status": "timeout", "received_text": question}
+            finally:
+                if speculation is not None and not adopted:
+                    # Ответ дал другой запрос (дубликат, кэш) — спекуляция не нужна
+                    speculation.cancel()
+            trace.note("answer", response)
+            shared_state.finish_question(session, response)
+    return {"status": "success", "received_text": shared_state.latest()["question"]}
@@ -0,0 +1,239 @@
+"""
+Семплирующий профилировщик живых запросов по требованию.
+
+Пока профилируется хотя бы один запрос, фоновый поток каждые несколько
+миллисекунд снимает стеки потока цикла событий и потоков инструментов
+(sys._current_frames) и считает одинаковые стеки. По завершении запроса
+в MBB_PROFILE_DIR пишутся два файла:
+
+- <имя>.folded — стеки в свёрнутом формате ("a;b;c N"), который понимают
+  flamegraph.pl, speedscope и inferno;
+- <имя>.json — тайминги этапов запроса (наблюдения metrics) и сведения о семплах.
+
+Профилирование включается на следующие N запросов (POST /admin/profile,
+сигнал SIGUSR2) или для одного запроса с заголовком X-MBB-Profile.
+Когда профилирование не запрошено, запрос проходит одну проверку счётчика.
+
+Сэмплы потока цикла событий приписываются всем профилируемым в этот момент
+запросам, поэтому точнее всего профиль одиночного запроса. Пул процессов
+инструментов (MBB_TOOL_EXECUTOR=process) не профилируется.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.config.config import MBB_PROFILE_DIR, MBB_PROFILE_INTERVAL_MS
+from app.core.logger import get_logger
+from app.core.metrics import metrics
+
+log = get_logger(__name__)
+
+# Сколько запросов профилировать по сигналу SIGUSR2
+SIGNAL_REQUESTS = 10
+
+# Потоки, стеки которых снимаются помимо потока цикла событий
+_THREAD_PREFIXES = ("mbb-tool",)
+
+# Путь до пакетов и стандартной библиотеки в именах файлов не нужен
+_LIB_PREFIX_RE = re.compile(r"^.*/(?:site-packages|lib/python\d+\.\d+)/")
+
+_current: ContextVar[Optional["_Profile"]] = ContextVar("mbb_profile", default=None)
+
+
+class _Profile:
+    """Семплы и тайминги одного профилируемого запроса."""
+
+    def __init__(self, name: str, loop_thread: int):
+        self.name = name
+        self.loop_thread = loop_thread
+        self.started = time.perf_counter()
+        self.samples: Counter = Counter()
+        self.stages: Dict[str, float] = {}
+
+
+def _frame_label(frame: Any) -> str:
+    code = frame.f_code
+    filename = _LIB_PREFIX_RE.sub("", code.co_filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _fold(thread_name: str, frame: Any) -> str:
+    """Стек потока в свёрнутом формате: от корня к текущей функции."""
+    labels: List[str] = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+class SamplingProfiler:
+    """
+    Профилировщик запросов с записью свёрнутых стеков для flame graph.
+    """
+
+    def __init__(self, out_dir: Optional[str], interval_ms: float = 5.0):
+        """
+        Args:
+            out_dir: Каталог для профилей (None — профилирование недоступно).
+            interval_ms: Интервал между семплами, миллисекунды.
+        """
+        self.out_dir = out_dir
+        self.interval = interval_ms / 1000
+        self._armed = 0
+        self._active: List[_Profile] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._sequence = itertools.count(1)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+            metrics.add_observer(self._on_observe)
+
+    @property
+    def available(self) -> bool:
+        return bool(self.out_dir)
+
+    def arm(self, requests: int) -> int:
+        """
+        Включает профилирование следующих запросов.
+
+        Args:
+            requests: Сколько запросов профилировать.
+
+        Returns:
+            Сколько запросов осталось профилировать.
+        """
+        if not self.available:
+            return 0
+        with self._lock:
+            self._armed += max(0, requests)
+            log.info(f"Профилирование следующих запросов: {self._armed}")
+            return self._armed
+
+    @contextmanager
+    def profile(self, label: str, force: bool = False) -> Iterator[Optional[_Profile]]:
+        """
+        Профилирует блок, если профилирование запрошено.
+
+        Args:
+            label: Метка запроса (попадает в имя файла).
+            force: Профилировать независимо от счётчика (заголовок X-MBB-Profile).
+
+        Yields:
+            Профиль или None, если блок не профилируется.
+        """
+        if not (self._armed or force) or not self.available:
+            yield None
+            return
+        with self._lock:
+            if not force:
+                self._armed = max(0, self._armed - 1)
+            label = re.sub(r"[^\w-]", "_", label)[:32]
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            name = f"{stamp}-{os.getpid()}-{next(self._sequence)}-{label}"
+            profile = _Profile(name, threading.get_ident())
+            self._active.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._sample_loop, name="mbb-profiler", daemon=True
+                )
+                self._thread.start()
+        token = _current.set(profile)
+        try:
+            yield profile
+        finally:
+            _current.reset(token)
+            with self._lock:
+                self._active.remove(profile)
+            self._write(profile, (time.perf_counter() - profile.started) * 1000)
+
+    def install_signal_handler(self) -> None:
+        """
+        По сигналу SIGUSR2 профилировать следующие SIGNAL_REQUESTS запросов.
+
+        Только POSIX.
+        """
+        if not self.available:
+            return
+        try:
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGUSR2, self.arm, SIGNAL_REQUESTS
+            )
+        except (NotImplementedError, AttributeError):
+            log.warning(
+                "Сигналы недоступны: профилирование включается "
+                "только через /admin/profile"
+            )
+
+    def _on_observe(self, name: str, value: float) -> None:
+        profile = _current.get()
+        if profile is not None:
+            profile.stages[name] = round(value, 2)
+
+    def _sample_loop(self) -> None:
+        """Снимает стеки, пока есть профилируемые запросы."""
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                active = list(self._active)
+                if not active:
+                    # Под блокировкой: новый запрос либо попадёт в этот проход,
+                    # либо запустит поток заново
+                    self._thread = None
+                    break
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            loop_threads = {profile.loop_thread for profile in active}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                name = names.get(ident, str(ident))
+                # Кроме потоков цикла событий снимаются только рабочие потоки пулов;
+                # простаивающий поток пула ждёт задачу внутри _worker
+                if ident not in loop_threads and (
+                    not name.startswith(_THREAD_PREFIXES)
+                    or frame.f_code.co_name == "_worker"
+                ):
+                    continue
+                stack = _fold(name, frame)
+                for profile in active:
+                    profile.samples[stack] += 1
+            time.sleep(self.interval)
+
+    def _write(self, profile: _Profile, total_ms: float) -> None:
+        """Пишет свёрнутые стеки и тайминги запроса."""
+        base = os.path.join(self.out_dir, profile.name)
+        try:
+            with open(f"{base}.folded", "w", encoding="utf-8") as f:
+                for stack, count in profile.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+            with open(f"{base}.json", "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "total_ms": round(total_ms, 2),
+                        "interval_ms": self.interval * 1000,
+                        "samples": sum(profile.samples.values()),
+                        "stages": profile.stages,
+                    },
+                    f,
+                    ensure_ascii=False,
+                    indent=2,
+                )
+            metrics.inc("profiler.profiles")
+            log.info(f"Профиль запроса записан: {base}.folded")
+        except OSError as e:
+            log.error(f"Не удалось записать профиль {base}: {e!r}")
+
+
+# Общий профилировщик (доступен, если задан MBB_PROFILE_DIR)
+profiler = SamplingProfiler(MBB_PROFILE_DIR, MBB_PROFILE_INTERVAL_MS)
@@ -0,0 +1,84 @@
+"""
+Планировщик запросов «последний побеждает» (barge-in).
+
+Для каждой сессии выполняется не более одной задачи: новый принятый вопрос
+отменяет ещё не завершённую обработку предыдущего вместе с отправкой в TTS.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+from app.core.logger import get_logger
+from app.core.metrics import metrics
+
+log = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class RequestSupersededError(Exception):
+    """Обработка вопроса отменена, так как в сессию пришёл более новый вопрос."""
+
+
+class LatestWinsScheduler:
+    """
+    Планировщик задач по сессиям: новая задача отменяет предыдущую.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: Dict[str, "asyncio.Task"] = {}
+
+    def cancel(self, session: str) -> bool:
+        """
+        Отменяет выполняющуюся задачу сессии.
+
+        Args:
+            session: Идентификатор сессии.
+
+        Returns:
+            True, если задача была отменена.
+        """
+        task = self._tasks.get(session)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        metrics.inc("scheduler.cancelled")
+        log.info(f"Сессия '{session}': предыдущий запрос отменён новым вопросом")
+        return True
+
+    async def run(self, session: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        Запускает задачу в сессии, отменяя предыдущую незавершённую.
+
+        Args:
+            session: Идентификатор сессии.
+            factory: Функция, создающая корутину обработки.
+
+        Returns:
+            Результат корутины.
+
+        Raises:
+            RequestSupersededError: Если задачу отменил более новый вопрос.
+        """
+        self.cancel(session)
+        task = asyncio.ensure_future(factory())
+        self._tasks[session] = task
+        metrics.set_gauge("scheduler.in_flight", len(self._tasks))
+        try:
+            try:
+                await asyncio.wait({task})
+            except asyncio.CancelledError:
+                # Отменили вызывающего (например, клиент разорвал соединение)
+                task.cancel()
+                raise
+            if task.cancelled():
+                raise RequestSupersededError(session)
+            return task.result()
+        finally:
+            if self._tasks.get(session) is task:
+                del self._tasks[session]
+            metrics.set_gauge("scheduler.in_flight", len(self._tasks))
+
+
+# Общий планировщик процесса
+scheduler = LatestWinsScheduler()
@@ -0,0 +1,374 @@
+"""
+Общее состояние рабочих процессов сервера.
+
+При запуске с несколькими процессами (python -m app.main --workers N) каждый
+процесс принимает свою часть запросов. Последний вопрос и ответ сессий,
+недавние ответы для проверки эха и кэш готовых ответов хранятся в локальной
+базе SQLite (режим WAL), поэтому любой процесс отвечает на /latest одинаково,
+а один и тот же вопрос, пришедший в разные процессы, вычисляется один раз.
+В однопроцессном режиме база по умолчанию живёт в памяти.
+
+Захват вычисления помечается PID процесса: захваты упавшего процесса
+снимаются сразу (при старте и при встрече с ними), а не через claim_timeout.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config.config import (
+    MBB_ANSWER_CACHE_TTL,
+    MBB_OLLAMA_TIMEOUT,
+    MBB_SHARED_STATE_DB,
+)
+from app.core import deadline
+from app.core.deadline import DeadlineExceededError
+from app.core.logger import get_logger
+from app.core.metrics import metrics
+from app.utils.basic_text_utils import normalize_question
+
+log = get_logger(__name__)
+
+# Сколько ответов хранить для проверки эха
+ECHO_HISTORY_LIMIT = 100
+
+# Интервал опроса чужого вычисления того же вопроса, секунды
+_POLL_INTERVAL = 0.05
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL DEFAULT 0,
+    question TEXT,
+    response TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS responses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS answers (
+    key TEXT PRIMARY KEY,
+    answer TEXT,
+    updated_at REAL NOT NULL,
+    owner INTEGER
+);
+"""
+
+
+def _is_alive(pid: Optional[int]) -> bool:
+    """Жив ли процесс с данным PID."""
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedState:
+    """
+    Состояние сессий, история ответов и кэш ответов в SQLite.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        answer_ttl: float = 0.0,
+        claim_timeout: float = 120.0,
+    ):
+        """
+        Args:
+            db_path: Путь к файлу базы (None — база в памяти процесса).
+            answer_ttl: Сколько секунд готовый ответ отдаётся повторному вопросу
+                без нового вычисления (0 — не кэшировать).
+            claim_timeout: Через сколько секунд незавершённое вычисление другого
+                процесса считается брошенным.
+        """
+        self.db_path = db_path or ":memory:"
+        self.answer_ttl = answer_ttl
+        self.claim_timeout = claim_timeout
+        self._db = sqlite3.connect(
+            self.db_path, timeout=5.0, isolation_level=None, check_same_thread=False
+        )
+        if db_path:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(answers)")}
+        if "owner" not in columns:
+            # База от прежней версии без владельца захвата
+            self._db.execute("ALTER TABLE answers ADD COLUMN owner INTEGER")
+        # Запросы выполняются и из цикла событий, и из пула потоков
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._release_stale_claims()
+
+    # --- Сессии ---------------------------------------------------------------
+    def begin_question(self, session: str, question: str) -> int:
+        """
+        Запоминает новый вопрос сессии.
+
+        Args:
+            session: Идентификатор сессии.
+            question: Текст вопроса.
+
+        Повтор текущего вопроса сессии (тот же вопрос ещё раз прислал STT)
+        не меняет поколение: иначе он отменил бы ответ, к которому присоединился.
+
+        Returns:
+            Номер поколения сессии; ответ актуален, пока номер не сменился.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT generation, question FROM sessions WHERE session = ?",
+                    (session,),
+                ).fetchone()
+                if (
+                    row
+                    and row[1]
+                    and normalize_question(row[1]) == normalize_question(question)
+                ):
+                    self._db.execute("COMMIT")
+                    return row[0]
+                self._db.execute(
+                    "INSERT INTO sessions(session, generation, question, updated_at) "
+                    "VALUES (?, 1, ?, ?) "
+                    "ON CONFLICT(session) DO UPDATE SET generation = generation + 1, "
+                    "question = excluded.question, updated_at = excluded.updated_at",
+                    (session, question, time.time()),
+                )
+                generation = self._db.execute(
+                    "SELECT generation FROM sessions WHERE session = ?", (session,)
+                ).fetchone()[0]
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return generation
+
+    def is_current(self, session: str, generation: int) -> bool:
+        """Не пришёл ли в сессию (в любой процесс) более новый вопрос."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT generation FROM sessions WHERE session = ?", (session,)
+            ).fetchone()
+        return row is None or row[0] == generation
+
+    def finish_question(self, session: str, response: str) -> None:
+        """
+        Запоминает ответ сессии и добавляет его в историю для проверки эха.
+
+        Args:
+            session: Идентификатор сессии.
+            response: Текст ответа.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE sessions SET response = ?, updated_at = ? WHERE session = ?",
+                (response, now, session),
+            )
+            cursor = self._db.execute(
+                "INSERT INTO responses(text, created_at) VALUES (?, ?)", (response, now)
+            )
+            self._db.execute(
+                "DELETE FROM responses WHERE id <= ?",
+                (cursor.lastrowid - ECHO_HISTORY_LIMIT,),
+            )
+
+    def latest(self) -> Dict[str, Optional[str]]:
+        """
+        Возвращает последний вопрос и ответ по всем сессиям.
+
+        Returns:
+            Словарь с ключами session, question, response.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT session, question, response FROM sessions "
+                "ORDER BY updated_at DESC LIMIT 1"
+            ).fetchone()
+        if row is None:
+            return {"session": None, "question": None, "response": None}
+        return {"session": row[0], "question": row[1], "response": row[2]}
+
+    def recent_responses(self, limit: int = 1) -> List[str]:
+        """
+        Последние ответы (новые первыми) для проверки эха.
+
+        Args:
+            limit: Сколько ответов вернуть.
+
+        Returns:
+            Список текстов ответов.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT text FROM responses ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    # --- Кэш ответов ----------------------------------------------------------
+    def _release_stale_claims(self) -> None:
+        """
+        Снимает захваты упавших процессов.
+
+        Захваты с PID этого процесса тоже снимаются: процесс только что
+        запущен, а PID достался ему от упавшего предшественника.
+        """
+        with self._lock:
+            owners = [
+                row[0]
+                for row in self._db.execute(
+                    "SELECT DISTINCT owner FROM answers WHERE answer IS NULL"
+                )
+            ]
+            for owner in owners:
+                if owner == self._pid or not _is_alive(owner):
+                    self._db.execute(
+                        "DELETE FROM answers WHERE answer IS NULL AND owner IS ?",
+                        (owner,),
+                    )
+                    log.warning(f"Сняты захваты вычислений процесса {owner}")
+
+    def _claim(self, key: str, fresh_since: float) -> Tuple[bool, Optional[str]]:
+        """
+        Пытается занять вычисление по ключу.
+
+        Args:
+            key: Нормализованный вопрос.
+            fresh_since: Ответы, готовые раньше этого времени, вычисляются заново.
+
+        Returns:
+            (True, None) — вычисление занято этим запросом;
+            (False, текст) — есть свежий готовый ответ;
+            (False, None) — вычисление идёт в другом запросе.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO answers(key, answer, updated_at, owner) "
+                "VALUES (?, NULL, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET answer = NULL, "
+                "updated_at = excluded.updated_at, owner = excluded.owner "
+                "WHERE (answers.answer IS NULL AND answers.updated_at < ?) "
+                "OR (answers.answer IS NOT NULL AND answers.updated_at < ?)",
+                (key, now, self._pid, now - self.claim_timeout, fresh_since),
+            )
+            if cursor.rowcount == 1:
+                return True, None
+            row = self._db.execute(
+                "SELECT answer, owner FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[0] is not None or _is_alive(row[1]):
+                return False, row[0] if row else None
+            # Захват остался от упавшего процесса — снимаем и занимаем вычисление сами
+            cursor = self._db.execute(
+                "UPDATE answers SET updated_at = ?, owner = ? "
+                "WHERE key = ? AND answer IS NULL AND owner IS ?",
+                (now, self._pid, key, row[1]),
+            )
+            if cursor.rowcount != 1:
+                return False, None
+        metrics.inc("shared.stale_claims")
+        log.warning(f"Вопрос '{key}' занимал упавший процесс {row[1]}, вычисляем сами")
+        return True, None
+
+    def _complete(self, key: str, answer: Optional[str]) -> None:
+        """Сохраняет ответ по ключу или снимает захват (answer=None)."""
+        with self._lock:
+            if answer is None:
+                self._db.execute(
+                    "DELETE FROM answers WHERE key = ? AND answer IS NULL", (key,)
+                )
+            else:
+                self._db.execute(
+                    "UPDATE answers SET answer = ?, updated_at = ? WHERE key = ?",
+                    (answer, time.time(), key),
+                )
+                self._db.execute(
+                    "DELETE FROM answers WHERE updated_at < ?",
+                    (time.time() - max(self.answer_ttl, self.claim_timeout),),
+                )
+
+    async def answer_once(
+        self, key: str, factory: Callable[[], Awaitable[str]]
+    ) -> Tuple[str, bool]:
+        """
+        Вычисляет ответ по ключу один раз на все процессы.
+
+        Если тот же вопрос уже вычисляется в другом процессе, ждёт его ответа
+        (не дольше бюджета времени фразы); если свежий ответ уже есть (не старше
+        answer_ttl), возвращает его без вычисления.
+
+        Запросы к базе выполняются в пуле потоков, чтобы не задерживать
+        цикл событий.
+
+        Args:
+            key: Нормализованный вопрос.
+            factory: Функция, создающая корутину вычисления.
+
+        Returns:
+            Кортеж (ответ, ответ озвучен другим запросом): ответ, которого
+            дождались, озвучивает вычисливший его процесс, а ответ из кэша
+            на повторный вопрос — запрос, который его получил.
+
+        Raises:
+            DeadlineExceededError: Бюджет фразы исчерпан в ожидании чужого ответа.
+        """
+        if self.answer_ttl <= 0 and self.db_path == ":memory:":
+            # Один процесс без кэша: одновременные дубликаты схлопывает coalescer
+            return await factory(), False
+        # Ответ, готовый после начала ожидания, подходит и без кэша
+        fresh_since = time.time() - self.answer_ttl
+        waited = False
+        while True:
+            owned, ready = await asyncio.to_thread(self._claim, key, fresh_since)
+            if owned:
+                break
+            if ready is not None:
+                if not waited:
+                    metrics.inc("shared.answer_cache_hits")
+                log.info(f"Вопрос '{key}' уже получил ответ в другом запросе")
+                return ready, waited
+            if not waited:
+                metrics.inc("shared.answer_waits")
+                waited = True
+            if deadline.expired():
+                # Ответ озвучит процесс, который его вычисляет
+                metrics.inc("shared.answer_wait_expired")
+                raise DeadlineExceededError(
+                    f"Бюджет времени исчерпан в ожидании ответа на '{key}'"
+                )
+            await asyncio.sleep(_POLL_INTERVAL)
+
+        answer = None
+        try:
+            answer = await factory()
+        finally:
+            # shield: захват должен сняться, даже если запрос отменят повторно
+            await asyncio.shield(asyncio.to_thread(self._complete, key, answer))
+        return answer, False
+
+    def close(self) -> None:
+        """Закрывает базу."""
+        with self._lock:
+            self._db.close()
+
+
+# Общее состояние (одно на процесс, данные — общие для всех процессов)
+shared_state = SharedState(
+    MBB_SHARED_STATE_DB,
+    answer_ttl=MBB_ANSWER_CACHE_TTL,
+    claim_timeout=MBB_OLLAMA_TIMEOUT,
+)
@@ -0,0 +1,74 @@
+"""
+Схлопывание одинаковых одновременных запросов (singleflight).
+
+Одна и та же фраза часто приходит от нескольких микрофонов/STT почти
+одновременно. Пока вычисление по ключу выполняется, дубликаты
+присоединяются к нему и получают тот же результат.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+from app.core.logger import get_logger
+from app.core.metrics import metrics
+
+log = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class _Flight:
+    """Выполняющееся вычисление и число ожидающих его запросов."""
+
+    def __init__(self, task: "asyncio.Future"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Группа вычислений, в которой на каждый ключ выполняется не более одного.
+    """
+
+    def __init__(self) -> None:
+        self._flights: Dict[str, _Flight] = {}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        Выполняет вычисление по ключу или присоединяется к уже идущему.
+
+        Args:
+            key: Ключ схлопывания (нормализованный вопрос).
+            factory: Функция, создающая корутину вычисления.
+
+        Returns:
+            Результат вычисления (общий для всех дубликатов).
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            metrics.inc("singleflight.coalesced")
+            log.info(f"Дубликат вопроса '{key}' присоединён к выполняющемуся запросу")
+
+        flight.waiters += 1
+        try:
+            # shield: отмена одного ожидающего не должна прерывать общее вычисление
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        """Удаляет завершённое вычисление из группы."""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+
+# Общая группа схлопывания вопросов
+coalescer = SingleFlight()
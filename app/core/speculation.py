@@ -0,0 +1,176 @@
+"""
+Спекулятивный запуск агента по промежуточной расшифровке.
+
+Между концом фразы и окончательной расшифровкой STT проходит заметное время.
+Если промежуточный вариант после слова-активатора выглядит законченным
+вопросом, агент запускается в фоне сразу. Когда приходит окончательный
+вопрос, похожий на промежуточный (similarity_ratio не ниже порога), берётся
+уже (почти) готовый ответ; иначе спекулятивный запуск отменяется.
+
+Спекуляция не занимает LLM под нагрузкой: она запускается, только когда
+в контроле допуска есть свободный слот и нет очереди, и держит этот слот до
+конца запуска (вопрос, забравший её ответ, второго слота не занимает).
+Число одновременных запусков тоже ограничено.
+
+Выигрыш есть, только пока промежуточная фраза ждёт стабилизации
+(MBB_STABILIZER_QUIET_MS > 0) или окончательной расшифровки: без этого
+тот же запрос сразу забирает собственную спекуляцию. Поэтому при
+выключенной стабилизации спекуляция не включается, а ответ, забранный
+запросом, который его и запустил, попаданием не считается.
+"""
+
+import asyncio
+import contextvars
+import time
+from typing import Dict, Optional, Tuple
+
+from app.config.config import (
+    MBB_REQUEST_BUDGET,
+    MBB_SPECULATIVE,
+    MBB_SPECULATIVE_MAX_RUNS,
+    MBB_SPECULATIVE_SIMILARITY,
+    MBB_STABILIZER_QUIET_MS,
+)
+from app.core import deadline
+from app.core.admission import admission
+from app.core.constants import WAKE_WORDS
+from app.core.llm import answer_question
+from app.core.logger import get_logger
+from app.core.metrics import metrics
+from app.utils.basic_text_utils import find_and_crop_by_keywords, normalize_question
+from app.utils.levenstein_text_utils import similarity_ratio
+from app.utils.utterance_quality import looks_complete
+
+log = get_logger(__name__)
+
+
+class _Speculation:
+    """Спекулятивный запуск агента для одного источника."""
+
+    def __init__(self, question: str, task: "asyncio.Task[Tuple[str, str]]"):
+        self.question = question
+        self.task = task
+        # Запрос, запустивший спекуляцию
+        self.origin = asyncio.current_task()
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self.finished = time.perf_counter()
+        if not task.cancelled():
+            # Ошибку заберёт тот, кто примет ответ; у отменённых её никто не ждёт
+            task.exception()
+
+
+class Speculator:
+    """
+    Спекулятивные ответы на промежуточные расшифровки, по одному на источник.
+    """
+
+    def __init__(
+        self, enabled: bool = False, similarity: float = 0.9, max_runs: int = 1
+    ):
+        """
+        Args:
+            enabled: Включить спекулятивный запуск.
+            similarity: Минимальное сходство окончательного вопроса с промежуточным.
+            max_runs: Сколько спекулятивных запусков может выполняться одновременно.
+        """
+        self.enabled = enabled
+        self.similarity = similarity
+        self.max_runs = max_runs
+        self._runs: Dict[str, _Speculation] = {}
+
+    @property
+    def running(self) -> int:
+        return sum(not speculation.task.done() for speculation in self._runs.values())
+
+    def consider(self, source: str, text: str) -> None:
+        """
+        Запускает агента по промежуточной расшифровке, если она выглядит законченной.
+
+        Args:
+            source: Источник фразы.
+            text: Промежуточный вариант фразы.
+        """
+        if not self.enabled:
+            return
+        question = find_and_crop_by_keywords(WAKE_WORDS, text.strip())
+        if not question or not looks_complete(question):
+            return
+        current = self._runs.get(source)
+        if current is not None:
+            if normalize_question(current.question) == normalize_question(question):
+                return
+            self._cancel(source)
+        if self.running >= self.max_runs or not admission.try_admit():
+            metrics.inc("speculative.skipped")
+            return
+        # Пустой контекст: запуск не принадлежит ни трассе, ни профилю,
+        # ни бюджету запроса
+        task = contextvars.Context().run(asyncio.create_task, self._answer(question))
+        task.add_done_callback(lambda _task: admission.release())
+        self._runs[source] = _Speculation(question, task)
+        metrics.inc("speculative.started")
+        log.info(f"Спекулятивный запуск для '{source}': {question}")
+
+    def take(
+        self, source: str, question: str
+    ) -> Optional["asyncio.Task[Tuple[str, str]]"]:
+        """
+        Забирает спекулятивный ответ для окончательного вопроса источника.
+
+        Args:
+            source: Источник фразы.
+            question: Окончательный вопрос без слова-активатора.
+
+        Returns:
+            Задача с ответом агента (возможно, ещё выполняется) или None, если
+            спекуляции не было или она не совпала с вопросом (тогда она отменяется).
+        """
+        speculation = self._runs.pop(source, None)
+        if speculation is None:
+            return None
+        score = similarity_ratio(
+            normalize_question(speculation.question), normalize_question(question)
+        )
+        if not question or score < self.similarity:
+            speculation.task.cancel()
+            metrics.inc("speculative.misses")
+            log.info(
+                f"Спекуляция '{speculation.question}' не совпала "
+                f"с '{question}' ({score:.2f})"
+            )
+            return None
+        if speculation.origin is asyncio.current_task():
+            # Фраза не менялась: спекуляция ничего не сэкономила
+            metrics.inc("speculative.own")
+            return speculation.task
+        saved = (speculation.finished or time.perf_counter()) - speculation.started
+        metrics.inc("speculative.hits")
+        metrics.observe("speculative.saved_ms", saved * 1000)
+        return speculation.task
+
+    def _cancel(self, source: str) -> None:
+        speculation = self._runs.pop(source, None)
+        if speculation is not None:
+            speculation.task.cancel()
+            metrics.inc("speculative.misses")
+
+    @staticmethod
+    async def _answer(question: str) -> Tuple[str, str]:
+        with deadline.budget(MBB_REQUEST_BUDGET):
+            return await answer_question(question)
+
+
+# Общий спекулятивный исполнитель (включается MBB_SPECULATIVE вместе со стабилизацией)
+if MBB_SPECULATIVE and MBB_STABILIZER_QUIET_MS <= 0:
+    log.warning(
+        "MBB_SPECULATIVE не действует без стабилизации (MBB_STABILIZER_QUIET_MS > 0)"
+    )
+speculator = Speculator(
+    MBB_SPECULATIVE and MBB_STABILIZER_QUIET_MS > 0,
+    MBB_SPECULATIVE_SIMILARITY,
+    MBB_SPECULATIVE_MAX_RUNS,
+)
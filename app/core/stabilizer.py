@@ -0,0 +1,134 @@
+"""
+Стабилизация промежуточных расшифровок STT.
+
+Движки STT присылают растущие промежуточные варианты фразы ("сова сколько",
+"сова сколько время", ...). Стабилизатор держит последний вариант каждого
+источника, пока тот не перестанет меняться в течение тихого периода (или
+не придёт вариант с флагом final), и пропускает дальше только его.
+Промежуточные варианты, поглощённые более длинными, до агента не доходят.
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from app.config.config import MBB_STABILIZER_MAX_WAIT_MS, MBB_STABILIZER_QUIET_MS
+from app.core.metrics import metrics
+from app.utils.basic_text_utils import normalize_question
+
+
+def is_growth(previous: str, current: str) -> bool:
+    """
+    Является ли current продолжением previous.
+
+    Последнее слово previous могло быть распознано не до конца
+    ("сова скольк" → "сова сколько время"), поэтому сравниваются
+    все слова, кроме него.
+
+    Args:
+        previous: Предыдущий вариант фразы.
+        current: Новый вариант фразы.
+
+    Returns:
+        True, если это та же фраза, распознанная дальше.
+    """
+    old_words: List[str] = normalize_question(previous).split()
+    new_words: List[str] = normalize_question(current).split()
+    stable = old_words[:-1]
+    return new_words[: len(stable)] == stable
+
+
+class _Pending:
+    """Последний промежуточный вариант фразы источника."""
+
+    def __init__(self, text: str, first_at: float):
+        self.text = text
+        self.first_at = first_at
+        self.future: "asyncio.Future[Optional[str]]" = (
+            asyncio.get_running_loop().create_future()
+        )
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class UtteranceStabilizer:
+    """
+    Пропускает фразу источника дальше, только когда она перестала меняться.
+    """
+
+    def __init__(self, quiet_ms: float = 0, max_wait_ms: float = 3000):
+        """
+        Args:
+            quiet_ms: Сколько миллисекунд фраза не должна меняться
+                (0 — стабилизация выключена).
+            max_wait_ms: Максимальное ожидание с первого варианта фразы, миллисекунды.
+        """
+        self.quiet = quiet_ms / 1000
+        self.max_wait = max_wait_ms / 1000
+        self._pending: Dict[str, _Pending] = {}
+
+    async def settle(
+        self, source: str, text: str, final: bool = False
+    ) -> Optional[str]:
+        """
+        Дожидается стабилизации фразы источника.
+
+        Args:
+            source: Источник (устройство/пользователь).
+            text: Очередной вариант фразы.
+            final: STT пометил вариант как окончательный.
+
+        Returns:
+            Текст для обработки или None, если вариант поглощён более новым.
+        """
+        if self.quiet <= 0:
+            return text
+
+        now = time.monotonic()
+        first_at = now
+        previous = self._pending.pop(source, None)
+        if previous is not None:
+            previous.timer.cancel()
+            if is_growth(previous.text, text):
+                # Более полный вариант заменяет предыдущий: один вызов LLM сэкономлен
+                first_at = previous.first_at
+                previous.future.set_result(None)
+                metrics.inc("stabilizer.merged")
+            else:
+                # Началась другая фраза: предыдущая уже сказана до конца
+                metrics.inc("stabilizer.settled")
+                previous.future.set_result(previous.text)
+
+        if final:
+            metrics.inc("stabilizer.final")
+            metrics.observe("stabilizer.wait_ms", (now - first_at) * 1000)
+            return text
+
+        pending = _Pending(text, first_at)
+        delay = max(0.0, min(self.quiet, first_at + self.max_wait - now))
+        pending.timer = asyncio.get_running_loop().call_later(
+            delay, self._fire, source, pending
+        )
+        self._pending[source] = pending
+        try:
+            settled = await pending.future
+        except asyncio.CancelledError:
+            # Клиент ушёл, не дождавшись: вариант больше никто не ждёт
+            pending.timer.cancel()
+            if self._pending.get(source) is pending:
+                del self._pending[source]
+            raise
+        if settled is not None:
+            metrics.observe("stabilizer.wait_ms", (time.monotonic() - first_at) * 1000)
+        return settled
+
+    def _fire(self, source: str, pending: _Pending) -> None:
+        """Тихий период истёк: вариант считается окончательным."""
+        if self._pending.get(source) is pending:
+            del self._pending[source]
+        if not pending.future.done():
+            metrics.inc("stabilizer.settled")
+            pending.future.set_result(pending.text)
+
+
+# Общий стабилизатор фраз
+stabilizer = UtteranceStabilizer(MBB_STABILIZER_QUIET_MS, MBB_STABILIZER_MAX_WAIT_MS)
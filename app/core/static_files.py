@@ -0,0 +1,354 @@
+"""
+Раздача статических файлов из памяти.
+
+Содержимое MBB_DOC_ROOT загружается в память при старте (крупные файлы
+отображаются через mmap), сжатые варианты gzip/brotli считаются заранее,
+а ответы несут сильный ETag и Cache-Control, поэтому повторный запрос
+браузера обходится ответом 304 без обращения к диску.
+"""
+
+import asyncio
+import contextlib
+import gzip
+import hashlib
+import mimetypes
+import mmap
+import os
+import threading
+from email.utils import formatdate
+from typing import Dict, List, Optional, Tuple, Union
+
+from app.core.logger import get_logger
+from app.core.metrics import metrics
+
+try:
+    import brotli  # необязательная зависимость
+except ImportError:
+    brotli = None
+
+log = get_logger(__name__)
+
+# Типы, которые имеет смысл сжимать
+_COMPRESSIBLE_PREFIXES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+    "application/xml",
+    "application/manifest+json",
+)
+
+# Размер куска при отправке файла, отображённого в память
+_CHUNK_SIZE = 256 * 1024
+
+
+class _Asset:
+    """Файл, подготовленный к отдаче."""
+
+    def __init__(self, path: str, body: Union[bytes, mmap.mmap], stat: os.stat_result):
+        self.path = path
+        self.body = body
+        self.size = stat.st_size
+        self.signature = (stat.st_mtime_ns, stat.st_size)
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if self.content_type.startswith("text/") or self.content_type in (
+            "application/javascript",
+            "application/json",
+        ):
+            self.content_type += "; charset=utf-8"
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        digest = hashlib.sha1(body).hexdigest()[:20]
+        self.etag = f'"{digest}"'
+        # Сжатые варианты: кодировка → (тело, ETag)
+        self.encoded: Dict[str, Tuple[bytes, str]] = {}
+        # Отображение в память закрывается, когда файл заменён и его никто не отдаёт
+        self._lock = threading.Lock()
+        self._readers = 0
+        self._retired = False
+
+    def acquire(self) -> bool:
+        """Начинает отдачу файла; False, если он уже заменён и закрыт."""
+        with self._lock:
+            if self._retired:
+                return False
+            self._readers += 1
+            return True
+
+    def release(self) -> None:
+        """Заканчивает отдачу файла."""
+        with self._lock:
+            self._readers -= 1
+            if self._retired and not self._readers:
+                self._close()
+
+    def retire(self) -> None:
+        """Помечает файл заменённым; отображение закрывается после последней отдачи."""
+        with self._lock:
+            self._retired = True
+            if not self._readers:
+                self._close()
+
+    def _close(self) -> None:
+        if isinstance(self.body, mmap.mmap):
+            self.body.close()
+
+
+class InMemoryStaticFiles:
+    """
+    ASGI-приложение для раздачи статических файлов из памяти.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_age: int = 0,
+        immutable: bool = False,
+        mmap_threshold: int = 1024 * 1024,
+        compress_min_size: int = 512,
+        watch_interval: float = 0,
+    ):
+        """
+        Args:
+            directory: Каталог со статическими файлами.
+            max_age: Время кэширования в браузере, секунды
+                (0 — браузер каждый раз сверяет ETag и получает 304).
+            immutable: Добавлять "immutable" в Cache-Control.
+            mmap_threshold: Файлы крупнее этого размера отображаются через mmap
+                и не сжимаются.
+            compress_min_size: Минимальный размер файла для сжатия.
+            watch_interval: Интервал проверки изменений на диске, секунды
+                (0 — не следить).
+        """
+        if not os.path.isdir(directory):
+            raise RuntimeError(f"Каталог '{directory}' не существует")
+        self.directory = os.path.abspath(directory)
+        self.mmap_threshold = mmap_threshold
+        self.compress_min_size = compress_min_size
+        self.watch_interval = watch_interval
+        if max_age > 0:
+            self.cache_control = f"public, max-age={max_age}" + (
+                ", immutable" if immutable else ""
+            )
+        else:
+            self.cache_control = "no-cache"
+        self._assets: Dict[str, _Asset] = {}
+        self._watch_task: Optional["asyncio.Task"] = None
+        self.reload()
+
+    # --- Загрузка -------------------------------------------------------------
+    def _load_asset(self, full_path: str, stat: os.stat_result) -> _Asset:
+        """Читает файл и готовит сжатые варианты."""
+        with open(full_path, "rb") as f:
+            if stat.st_size >= self.mmap_threshold:
+                body: Union[bytes, mmap.mmap] = mmap.mmap(
+                    f.fileno(), 0, access=mmap.ACCESS_READ
+                )
+            else:
+                body = f.read()
+        asset = _Asset(full_path, body, stat)
+        if (
+            isinstance(body, bytes)
+            and len(body) >= self.compress_min_size
+            and asset.content_type.startswith(_COMPRESSIBLE_PREFIXES)
+        ):
+            digest = asset.etag.strip('"')
+            gz = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(gz) < len(body):
+                asset.encoded["gzip"] = (gz, f'"{digest}-gz"')
+            if brotli is not None:
+                br = brotli.compress(body, quality=11)
+                if len(br) < len(body):
+                    asset.encoded["br"] = (br, f'"{digest}-br"')
+        return asset
+
+    def _scan(self) -> Dict[str, Tuple[str, os.stat_result]]:
+        """Список файлов каталога: относительный путь → (полный путь, stat)."""
+        files = {}
+        for root, _dirs, names in os.walk(self.directory):
+            for name in names:
+                full_path = os.path.join(root, name)
+                relative = os.path.relpath(full_path, self.directory).replace(
+                    os.sep, "/"
+                )
+                files[relative] = (full_path, os.stat(full_path))
+        return files
+
+    def reload(self) -> List[str]:
+        """
+        Перечитывает изменившиеся файлы каталога.
+
+        Returns:
+            Список относительных путей, которые были загружены или удалены.
+        """
+        changed = []
+        retired = []
+        assets = dict(self._assets)
+        files = self._scan()
+        for relative in list(assets):
+            if relative not in files:
+                retired.append(assets.pop(relative))
+                changed.append(relative)
+        for relative, (full_path, stat) in files.items():
+            current = assets.get(relative)
+            if current is None or current.signature != (stat.st_mtime_ns, stat.st_size):
+                assets[relative] = self._load_asset(full_path, stat)
+                changed.append(relative)
+                if current is not None:
+                    retired.append(current)
+        self._assets = assets
+        for asset in retired:
+            asset.retire()
+        if changed:
+            total = sum(a.size for a in assets.values())
+            log.info(
+                f"Статические файлы загружены в память: {len(assets)} шт., {total} байт"
+            )
+        return changed
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.reload)
+            except Exception as e:
+                log.error(f"Ошибка перечитывания статических файлов: {e!r}")
+
+    def start(self) -> None:
+        """Запускает слежение за изменениями (если задан watch_interval)."""
+        if self.watch_interval > 0 and self._watch_task is None:
+            self._watch_task = asyncio.ensure_future(self._watch())
+
+    async def stop(self) -> None:
+        """Останавливает слежение за изменениями."""
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._watch_task
+            self._watch_task = None
+
+    # --- Раздача --------------------------------------------------------------
+    def _lookup(self, scope: dict) -> Optional[_Asset]:
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path) :]
+        relative = path.lstrip("/")
+        if not relative or relative.endswith("/"):
+            relative += "index.html"
+        return self._assets.get(relative)
+
+    @staticmethod
+    def _accepted_encodings(headers: Dict[bytes, bytes]) -> List[str]:
+        accept = headers.get(b"accept-encoding", b"").decode("latin-1")
+        accepted = []
+        for item in accept.split(","):
+            name, _, params = item.strip().partition(";")
+            if params.replace(" ", "") in ("q=0", "q=0.0"):
+                continue
+            accepted.append(name.strip().lower())
+        return accepted
+
+    @staticmethod
+    def _etag_matches(headers: Dict[bytes, bytes], etag: str) -> bool:
+        if_none_match = headers.get(b"if-none-match", b"").decode("latin-1")
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            # Для If-None-Match сравнение слабое: W/"x" совпадает с "x"
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag == etag:
+                return True
+        return False
+
+    async def __call__(self, scope: dict, receive, send) -> None:
+        """Точка входа ASGI."""
+        if scope["type"] != "http":
+            return
+        if scope["method"] not in ("GET", "HEAD"):
+            await self._send(
+                send, 405, [(b"allow", b"GET, HEAD")], b"Method Not Allowed"
+            )
+            return
+
+        asset = self._lookup(scope)
+        # Файл могли заменить между поиском и началом отдачи — берём новый
+        while asset is not None and not asset.acquire():
+            asset = self._lookup(scope)
+        if asset is None:
+            metrics.inc("static.not_found")
+            await self._send(send, 404, [], b"Not Found")
+            return
+        try:
+            await self._serve(scope, send, asset)
+        finally:
+            asset.release()
+
+    async def _serve(self, scope: dict, send, asset: _Asset) -> None:
+        """Отдаёт найденный файл (или 304)."""
+        headers = dict(scope["headers"])
+        body: Union[bytes, mmap.mmap] = asset.body
+        etag = asset.etag
+        encoding = None
+        accepted = self._accepted_encodings(headers) if asset.encoded else []
+        for candidate in ("br", "gzip"):
+            if candidate in asset.encoded and candidate in accepted:
+                encoding = candidate
+                body, etag = asset.encoded[candidate]
+                break
+
+        response_headers = [
+            (b"etag", etag.encode()),
+            (b"last-modified", asset.last_modified.encode()),
+            (b"cache-control", self.cache_control.encode()),
+        ]
+        if asset.encoded:
+            response_headers.append((b"vary", b"Accept-Encoding"))
+
+        if self._etag_matches(headers, etag):
+            metrics.inc("static.not_modified")
+            await self._send(send, 304, response_headers, b"")
+            return
+
+        response_headers += [
+            (b"content-type", asset.content_type.encode()),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        if encoding:
+            response_headers.append((b"content-encoding", encoding.encode()))
+        metrics.inc("static.served")
+        if scope["method"] == "HEAD":
+            await self._send(send, 200, response_headers, b"")
+        elif isinstance(body, bytes):
+            await self._send(send, 200, response_headers, body)
+        else:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": response_headers,
+                }
+            )
+            for offset in range(0, len(body), _CHUNK_SIZE):
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": body[offset : offset + _CHUNK_SIZE],
+                        "more_body": offset + _CHUNK_SIZE < len(body),
+                    }
+                )
+
+    @staticmethod
+    async def _send(send, status: int, headers: list, body: bytes) -> None:
+        if status >= 400:
+            headers = headers + [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+            ]
+        await send(
+            {"type": "http.response.start", "status": status, "headers": headers}
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,102 @@
+"""
+Выполнение синхронных инструментов агента вне цикла событий.
+
+Когда модель вызывает несколько инструментов за один шаг, AgentExecutor
+запускает их асинхронные версии одновременно (asyncio.gather сохраняет
+порядок результатов). Здесь синхронная работа инструментов уходит в пул
+потоков или процессов с таймаутом на каждый вызов, поэтому многоцелевой
+вопрос ждёт только самый медленный инструмент.
+"""
+
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.config.config import MBB_TOOL_EXECUTOR, MBB_TOOL_TIMEOUT, MBB_TOOL_WORKERS
+from app.core import deadline
+from app.core.logger import get_logger
+from app.core.metrics import metrics
+
+log = get_logger(__name__)
+
+# Ответ инструмента, не уложившегося в таймаут (его видит модель)
+TOOL_TIMEOUT_MESSAGE = "Инструмент не ответил вовремя"
+
+_io_executor: Optional[Executor] = None
+_cpu_executor: Optional[Executor] = None
+
+
+def get_executor(cpu_bound: bool) -> Executor:
+    """
+    Возвращает пул для инструментов.
+
+    Инструменты с вводом-выводом (SQLite и т.п.) всегда идут в пул потоков.
+    Вычислительные (sympy держит GIL) — в пул процессов,
+    если MBB_TOOL_EXECUTOR=process, иначе тоже в пул потоков.
+
+    Args:
+        cpu_bound: Инструмент нагружает процессор.
+
+    Returns:
+        Пул исполнителей.
+    """
+    global _io_executor, _cpu_executor
+    if cpu_bound and MBB_TOOL_EXECUTOR == "process":
+        if _cpu_executor is None:
+            _cpu_executor = ProcessPoolExecutor(
+                max_workers=MBB_TOOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _cpu_executor
+    if _io_executor is None:
+        _io_executor = ThreadPoolExecutor(
+            max_workers=MBB_TOOL_WORKERS, thread_name_prefix="mbb-tool"
+        )
+    return _io_executor
+
+
+async def run_sync_tool(
+    name: str,
+    func: Callable[..., Any],
+    *args: Any,
+    cpu_bound: bool = False,
+    timeout: Optional[float] = MBB_TOOL_TIMEOUT,
+) -> Any:
+    """
+    Выполняет синхронную функцию инструмента в пуле с таймаутом.
+
+    Args:
+        name: Имя инструмента (для логов и метрик).
+        func: Синхронная функция (для пула процессов — импортируемая из модуля).
+        *args: Аргументы функции.
+        cpu_bound: Инструмент нагружает процессор.
+        timeout: Таймаут в секундах (None — без ограничения); урезается
+            до оставшегося бюджета фразы.
+
+    Returns:
+        Результат функции или TOOL_TIMEOUT_MESSAGE по таймауту.
+    """
+    timeout = deadline.clamp(timeout)
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(
+        get_executor(cpu_bound), functools.partial(func, *args)
+    )
+    with metrics.timer(f"tools.{name}_ms"):
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            # Поток или процесс нельзя прервать: результат просто не ждём
+            metrics.inc("tools.timeouts")
+            log.warning(f"Инструмент {name} не уложился в {timeout:.1f} с")
+            return TOOL_TIMEOUT_MESSAGE
+
+
+def shutdown_executors() -> None:
+    """Останавливает пулы инструментов, не дожидаясь зависших задач."""
+    global _io_executor, _cpu_executor
+    for executor in (_io_executor, _cpu_executor):
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    _io_executor = _cpu_executor = None
@@ -0,0 +1,440 @@
+"""
+Запись и воспроизведение трасс реальных фраз.
+
+Если задан MBB_TRACE_FILE, каждая фраза из POST /json записывается одной
+строкой JSON в конец файла: исходный текст, выделенный вопрос, решение
+проверки эха, сообщения LLM и вызовы инструментов, тайминги этапов
+(все наблюдения metrics во время обработки) и итоговый ответ.
+
+Проигрыватель прогоняет трассу через тот же конвейер с настоящей моделью
+или с заглушкой, повторяющей записанные ответы агента, и сравнивает
+тайминги и ответы.
+
+Использование:
+    python -m app.core.trace replay trace.jsonl [--stub [--stub-latency]]
+        [--realtime] [--tts]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+from app.config.config import MBB_TRACE_FILE
+from app.core.logger import get_logger
+from app.core.metrics import metrics
+
+log = get_logger(__name__)
+
+# Трасса обрабатываемой фразы; дочерние задачи asyncio видят ту же запись
+_current: ContextVar[Optional[Dict[str, Any]]] = ContextVar("mbb_trace", default=None)
+
+
+def note(key: str, value: Any) -> None:
+    """Записывает поле в трассу текущей фразы (если трасса пишется)."""
+    record = _current.get()
+    if record is not None:
+        record[key] = value
+
+
+def callbacks() -> List[BaseCallbackHandler]:
+    """Callback-и LangChain для записи сообщений LLM и вызовов инструментов."""
+    record = _current.get()
+    return [TraceCallback(record)] if record is not None else []
+
+
+def _on_observe(name: str, value: float) -> None:
+    record = _current.get()
+    if record is not None:
+        record["stages"][name] = round(value, 2)
+
+
+metrics.add_observer(_on_observe)
+
+
+class TraceRecorder:
+    """
+    Запись трасс фраз в файл JSON Lines и/или другие приёмники.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Файл трассы (None — запись выключена).
+        """
+        self._sinks: List[Callable[[Dict[str, Any]], None]] = []
+        self._fd: Optional[int] = None
+        self._lock = threading.Lock()
+        if path:
+            self.open(path)
+
+    def open(self, path: str) -> None:
+        """
+        Начинает дописывать трассы в файл.
+
+        Каждая запись — одна строка, записанная одним вызовом write в режиме
+        O_APPEND, поэтому несколько рабочих процессов могут писать в один файл.
+        """
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._sinks.append(self._write)
+        log.info(f"Запись трасс фраз: {path}")
+
+    def add_sink(self, sink: Callable[[Dict[str, Any]], None]) -> None:
+        """Добавляет приёмник готовых записей."""
+        self._sinks.append(sink)
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        line = (
+            json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str)
+            + "\n"
+        )
+        with self._lock:
+            if self._fd is not None:
+                os.write(self._fd, line.encode("utf-8"))
+
+    @contextmanager
+    def record(
+        self, text: str, owner: Optional[str]
+    ) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        Контекст записи трассы одной фразы.
+
+        Args:
+            text: Текст от STT.
+            owner: Источник фразы.
+
+        Yields:
+            Запись трассы или None, если запись выключена.
+        """
+        if not self._sinks:
+            yield None
+            return
+        record: Dict[str, Any] = {
+            "ts": round(time.time(), 3),
+            "input": text,
+            "owner": owner,
+            "stages": {},
+            "llm": [],
+            "tools": [],
+        }
+        token = _current.set(record)
+        started = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record.setdefault("status", "error")
+            record["error"] = repr(e)
+            raise
+        finally:
+            record["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            _current.reset(token)
+            for sink in self._sinks:
+                try:
+                    sink(record)
+                except Exception as e:
+                    log.error(f"Ошибка записи трассы: {e!r}")
+
+    def close(self) -> None:
+        """Закрывает файл трассы."""
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+class TraceCallback(BaseCallbackHandler):
+    """
+    Callback LangChain, дописывающий в трассу сообщения LLM и вызовы инструментов.
+
+    Агент на каждом шаге отправляет всю историю заново, поэтому в трассу
+    попадают только новые сообщения, а системный промпт — в виде хэша.
+    """
+
+    run_inline = True
+
+    def __init__(self, record: Dict[str, Any]):
+        self._record = record
+        self._seen = 0
+        self._started: Dict[UUID, float] = {}
+        self._entries: Dict[UUID, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _message(message: BaseMessage) -> Dict[str, Any]:
+        if message.type == "system":
+            return {
+                "role": "system",
+                "sha1": hashlib.sha1(str(message.content).encode()).hexdigest()[:12],
+            }
+        role = "ai" if message.type == "AIMessageChunk" else message.type
+        item: Dict[str, Any] = {"role": role, "content": message.content}
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            item["tool_calls"] = [
+                {"name": c["name"], "args": c["args"]} for c in tool_calls
+            ]
+        return item
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[BaseMessage]],
+        *,
+        run_id: UUID,
+        **kwargs: Any,
+    ) -> None:
+        history = messages[0] if messages else []
+        entry = {
+            "model": (kwargs.get("metadata") or {}).get("ls_model_name"),
+            "offset": self._seen,
+            "messages": [self._message(m) for m in history[self._seen :]],
+        }
+        self._seen = len(history)
+        self._started[run_id] = time.perf_counter()
+        self._entries[run_id] = entry
+        self._record["llm"].append(entry)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        entry = self._entries.pop(run_id, None)
+        if entry is None:
+            return
+        entry["ms"] = round((time.perf_counter() - self._started.pop(run_id)) * 1000, 2)
+        generation = (
+            response.generations[0][0]
+            if response.generations and response.generations[0]
+            else None
+        )
+        message = getattr(generation, "message", None)
+        if message is not None:
+            entry["output"] = self._message(message)
+            self._seen += 1
+
+    def on_tool_start(
+        self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        entry = {
+            "name": serialized.get("name"),
+            "input": kwargs.get("inputs") or input_str,
+        }
+        self._started[run_id] = time.perf_counter()
+        self._entries[run_id] = entry
+        self._record["tools"].append(entry)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        entry = self._entries.pop(run_id, None)
+        if entry is not None:
+            entry["output"] = getattr(output, "content", output)
+            entry["ms"] = round(
+                (time.perf_counter() - self._started.pop(run_id)) * 1000, 2
+            )
+
+    def on_tool_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        entry = self._entries.pop(run_id, None)
+        if entry is not None:
+            entry["error"] = repr(error)
+            entry["ms"] = round(
+                (time.perf_counter() - self._started.pop(run_id)) * 1000, 2
+            )
+
+
+# Общий регистратор трасс
+tracer = TraceRecorder(MBB_TRACE_FILE)
+
+
+# --- Воспроизведение ------------------------------------------------------------
+def read_trace(path: str) -> Iterator[Dict[str, Any]]:
+    """Читает записи трассы."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def _stub_cascade(current: Dict[str, Any], with_latency: bool) -> Callable:
+    """Заглушка каскада моделей, возвращающая записанный ответ агента."""
+    from langchain_core.agents import AgentAction
+
+    async def run_cascade(user_message: str, callbacks: Any) -> dict:
+        record = current["record"]
+        if with_latency:
+            await asyncio.sleep(record["stages"].get("llm.agent_ms", 0) / 1000)
+        steps = [
+            (
+                AgentAction(tool["name"], tool.get("input", ""), ""),
+                tool.get("output", ""),
+            )
+            for tool in record.get("tools", [])
+        ]
+        return {"output": record.get("agent_output", ""), "intermediate_steps": steps}
+
+    return run_cascade
+
+
+async def replay(
+    path: str,
+    stub: bool = False,
+    stub_latency: bool = False,
+    realtime: bool = False,
+    tts: bool = False,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Прогоняет трассу через конвейер и печатает сравнение.
+
+    Args:
+        path: Файл трассы.
+        stub: Вместо модели возвращать записанные ответы агента.
+        stub_latency: Заглушка выдерживает записанное время агента.
+        realtime: Соблюдать записанные интервалы между фразами
+            (иначе фразы идут подряд, а кэш ответов отключается).
+        tts: Отправлять ответы в настоящий TTS.
+        limit: Сколько записей воспроизвести.
+
+    Returns:
+        Список пар записей {"recorded": ..., "replayed": ...}.
+    """
+    from app.core import llm
+    from app.core.outbox import tts_outbox
+    from app.core.pipeline import handle_utterance
+    from app.core.shared_state import shared_state
+    from app.core.tool_runner import shutdown_executors
+
+    current: Dict[str, Any] = {}
+    if stub:
+        llm.run_cascade = _stub_cascade(current, stub_latency)
+    if not tts:
+        # Ответы воспроизведения не озвучиваются
+        tts_outbox.enqueue = lambda session, payload: True
+    if not realtime:
+        # Фразы идут подряд: повтор через минуту не должен стать попаданием в кэш
+        shared_state.answer_ttl = 0
+
+    replayed: List[Dict[str, Any]] = []
+    tracer.add_sink(replayed.append)
+    results = []
+    previous_ts = None
+    # Читаем заранее: при заданном MBB_TRACE_FILE воспроизведение тоже пишется в трассу
+    records = list(read_trace(path))[:limit]
+    for index, record in enumerate(records):
+        if realtime and previous_ts is not None:
+            await asyncio.sleep(max(0.0, record["ts"] - previous_ts))
+        previous_ts = record["ts"]
+        current["record"] = record
+        try:
+            await handle_utterance(
+                record["input"], record.get("owner"), record.get("final", False)
+            )
+        except Exception as e:
+            log.error(f"Ошибка воспроизведения записи {index}: {e!r}")
+        results.append({"recorded": record, "replayed": replayed[-1]})
+
+    await tts_outbox.close()
+    shutdown_executors()
+    _print_report(results)
+    return results
+
+
+def _print_report(results: List[Dict[str, Any]]) -> None:
+    """Печатает сравнение записанных и воспроизведённых фраз."""
+    print(f"🧪 Воспроизведено фраз: {len(results)}\n")
+    decisions = 0
+    answers = 0
+    for index, pair in enumerate(results):
+        recorded, replayed = pair["recorded"], pair["replayed"]
+        same_decision = all(
+            recorded.get(k) == replayed.get(k) for k in ("question", "echo", "status")
+        )
+        same_answer = recorded.get("answer") == replayed.get("answer")
+        decisions += same_decision
+        answers += same_answer
+        mark = "✅" if same_decision and same_answer else "❌"
+        print(
+            f"{mark} {index:4d} {recorded['input'][:40]!r:44} "
+            f"{recorded['total_ms']:9.1f} мс → {replayed['total_ms']:9.1f} мс"
+        )
+        if not same_answer:
+            print(f"        было: {recorded.get('answer')!r}")
+            print(f"        стало: {replayed.get('answer')!r}")
+
+    print(f"\nРешения (вопрос, эхо, статус) совпали: {decisions}/{len(results)}")
+    print(f"Ответы совпали: {answers}/{len(results)}\n")
+    stages = sorted(
+        {name for pair in results for r in pair.values() for name in r["stages"]}
+        | {"total_ms"}
+    )
+    print(f"{'этап':>40} {'было p50':>10} {'p95':>10} {'стало p50':>10} {'p95':>10}")
+    for name in stages:
+        columns = []
+        for side in ("recorded", "replayed"):
+            values = [
+                (
+                    pair[side]["total_ms"]
+                    if name == "total_ms"
+                    else pair[side]["stages"][name]
+                )
+                for pair in results
+                if name == "total_ms" or name in pair[side]["stages"]
+            ]
+            columns += [_percentile(values, 0.5), _percentile(values, 0.95)]
+        print(f"{name:>40} " + " ".join(f"{value:10.1f}" for value in columns))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Воспроизведение трасс фраз")
+    commands = parser.add_subparsers(dest="command", required=True)
+    play = commands.add_parser("replay", help="прогнать трассу через конвейер")
+    play.add_argument("trace", help="файл трассы (MBB_TRACE_FILE)")
+    play.add_argument(
+        "--stub", action="store_true", help="вместо модели — записанные ответы агента"
+    )
+    play.add_argument(
+        "--stub-latency",
+        action="store_true",
+        help="заглушка выдерживает записанное время агента",
+    )
+    play.add_argument(
+        "--realtime",
+        action="store_true",
+        help="соблюдать записанные интервалы между фразами",
+    )
+    play.add_argument("--tts", action="store_true", help="отправлять ответы в TTS")
+    play.add_argument("--limit", type=int, help="сколько записей воспроизвести")
+    args = parser.parse_args()
+
+    # При запуске через -m этот файл — модуль __main__, а конвейер пишет трассы
+    # через app.core.trace: воспроизводим через него
+    from app.core.trace import replay as run_replay
+
+    asyncio.run(
+        run_replay(
+            args.trace,
+            args.stub,
+            args.stub_latency,
+            args.realtime,
+            args.tts,
+            args.limit,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Замер задержки одного перехода (POST через PostClient) по loopback TCP и по Unix-сокету.
+
+Использование:
+    python -m app.core.transport_bench [--requests N]
+    python -m app.core.transport_bench --tcp-url http://127.0.0.1:8082/api/tts/json \\
+        --unix-url http+unix://%2Frun%2Ftts.sock/api/tts/json
+
+Без адресов поднимается встроенный сервер, отвечающий 200 на любой POST,
+одновременно на 127.0.0.1 и на временном сокете; так измеряется только
+транспорт и разбор HTTP. С адресами замеряются уже запущенные серверы.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+from aiohttp import web
+
+from app.core.client import UNIX_SCHEME, PostClient
+
+
+async def _measure(url: str, requests: int, warmup: int = 20) -> List[float]:
+    """Задержки POST-запросов на адрес, миллисекунды (первые warmup не учитываются)."""
+    latencies: List[float] = []
+    async with PostClient(url) as client:
+        for i in range(warmup + requests):
+            started = time.perf_counter()
+            if not await client.post("Проверка задержки транспорта."):
+                raise RuntimeError(f"Сервер {url} не принял запрос")
+            if i >= warmup:
+                latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def _summary(latencies: List[float]) -> Tuple[float, float, float]:
+    ordered = sorted(latencies)
+    return (
+        statistics.median(ordered),
+        ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        statistics.fmean(ordered),
+    )
+
+
+async def _start_echo_server(socket_path: str) -> Tuple[web.AppRunner, str, str]:
+    """Встроенный сервер на loopback TCP и Unix-сокете; возвращает адреса обоих."""
+
+    async def handle(request: web.Request) -> web.Response:
+        await request.read()
+        return web.json_response({"status": "ok"})
+
+    app = web.Application()
+    app.router.add_post("/api/tts/json", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    tcp_site = web.TCPSite(runner, "127.0.0.1", 0)
+    await tcp_site.start()
+    await web.UnixSite(runner, socket_path).start()
+    port = tcp_site._server.sockets[0].getsockname()[1]
+    return (
+        runner,
+        f"http://127.0.0.1:{port}/api/tts/json",
+        f"{UNIX_SCHEME}://{quote(socket_path, safe='')}/api/tts/json",
+    )
+
+
+async def run(requests: int, tcp_url: Optional[str], unix_url: Optional[str]) -> None:
+    runner = None
+    if not (tcp_url and unix_url):
+        socket_path = os.path.join(tempfile.mkdtemp(prefix="mbb-bench-"), "echo.sock")
+        runner, tcp_url, unix_url = await _start_echo_server(socket_path)
+    try:
+        results = {}
+        for name, url in (("tcp", tcp_url), ("unix", unix_url)):
+            results[name] = _summary(await _measure(url, requests))
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+
+    print(f"{'транспорт':<10} {'p50, мс':>9} {'p95, мс':>9} {'среднее':>9}")
+    for name, (p50, p95, mean) in results.items():
+        print(f"{name:<10} {p50:>9.3f} {p95:>9.3f} {mean:>9.3f}")
+    saved = results["tcp"][0] - results["unix"][0]
+    print(
+        f"Экономия на переходе (p50): {saved:.3f} мс ({saved / results['tcp'][0]:.0%})"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Задержка перехода: loopback TCP против Unix-сокета"
+    )
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=2000,
+        help="сколько запросов на каждый транспорт",
+    )
+    parser.add_argument("--tcp-url", help="адрес запущенного сервера по TCP")
+    parser.add_argument(
+        "--unix-url", help="адрес того же сервера по Unix-сокету (http+unix://...)"
+    )
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.tcp_url, args.unix_url))
+
+
+if __name__ == "__main__":
+    main()
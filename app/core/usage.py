@@ -0,0 +1,85 @@
+"""
+Учёт размера промпта и времени его обработки моделью Ollama.
+"""
+
+from typing import Any, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from app.core.logger import get_logger
+from app.core.metrics import metrics
+
+log = get_logger(__name__)
+
+
+class PromptUsageCallback(BaseCallbackHandler):
+    """
+    Callback LangChain, собирающий статистику промпта за один запрос.
+
+    Ollama возвращает в generation_info поля prompt_eval_count
+    (сколько токенов промпта пришлось вычислить) и prompt_eval_duration (нс).
+    При повторном использовании кэша префикса оба значения заметно падают.
+    """
+
+    run_inline = True
+
+    def __init__(self, budget: Optional[int] = None):
+        """
+        Args:
+            budget: Допустимое число токенов промпта на один вызов LLM
+                (None или 0 — без ограничения).
+        """
+        self.budget = budget or None
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.prompt_eval_ms = 0.0
+        self.max_prompt_tokens = 0
+        self.over_budget = False
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        """Суммирует статистику каждого вызова модели."""
+        for generations in response.generations:
+            for generation in generations:
+                info = generation.generation_info or {}
+                usage = (
+                    getattr(
+                        getattr(generation, "message", None), "usage_metadata", None
+                    )
+                    or {}
+                )
+                prompt_tokens = (
+                    info.get("prompt_eval_count") or usage.get("input_tokens") or 0
+                )
+                completion_tokens = (
+                    info.get("eval_count") or usage.get("output_tokens") or 0
+                )
+                prompt_eval_ms = (info.get("prompt_eval_duration") or 0) / 1_000_000
+
+                self.llm_calls += 1
+                self.prompt_tokens += prompt_tokens
+                self.completion_tokens += completion_tokens
+                self.prompt_eval_ms += prompt_eval_ms
+                self.max_prompt_tokens = max(self.max_prompt_tokens, prompt_tokens)
+
+                metrics.inc("llm.calls")
+                metrics.observe("llm.prompt_tokens", prompt_tokens)
+                metrics.observe("llm.prompt_eval_ms", prompt_eval_ms)
+
+                if self.budget and prompt_tokens > self.budget:
+                    self.over_budget = True
+                    metrics.inc("llm.prompt_budget_exceeded")
+                    log.warning(
+                        f"Промпт превысил бюджет: "
+                        f"{prompt_tokens} > {self.budget} токенов"
+                    )
+
+    def report(self) -> str:
+        """Краткая строка со статистикой для лога."""
+        return (
+            f"вызовов LLM: {self.llm_calls}, "
+            f"токенов промпта: {self.prompt_tokens} (макс. {self.max_prompt_tokens}), "
+            f"токенов ответа: {self.completion_tokens}, "
+            f"обработка промпта: {self.prompt_eval_ms:.1f} мс"
+        )
@@ -0,0 +1,87 @@
+"""
+Фильтр фраз перед вызовом LLM.
+
+Фразы с низкой оценкой качества (app.utils.utterance_quality) до агента не
+доходят: мусор STT отбрасывается, а оборванная на полуслове фраза
+("расскажи про", "два плюс") откладывается и приклеивается к началу
+следующей фразы того же источника, если та придёт в течение defer_ms
+и сама по себе фильтр не проходит.
+"""
+
+import time
+from typing import Dict, Tuple
+
+from app.config.config import MBB_UTTERANCE_DEFER_MS, MBB_UTTERANCE_MIN_QUALITY
+from app.core.logger import get_logger
+from app.core.metrics import metrics
+from app.utils.basic_text_utils import normalize_question
+from app.utils.utterance_quality import is_dangling, score_utterance
+
+log = get_logger(__name__)
+
+# Решения фильтра (они же статусы ответа POST /json)
+PASSED = "passed"
+DROPPED = "dropped"
+DEFERRED = "deferred"
+
+
+class UtteranceGate:
+    """
+    Отбрасывает или откладывает фразы, не стоящие вызова LLM.
+    """
+
+    def __init__(self, min_quality: float = 0.0, defer_ms: float = 5000):
+        """
+        Args:
+            min_quality: Минимальная оценка качества фразы (0 — фильтр выключен).
+            defer_ms: Сколько миллисекунд отложенный обрывок ждёт продолжения.
+        """
+        self.min_quality = min_quality
+        self.defer = defer_ms / 1000
+        self._deferred: Dict[str, Tuple[str, float]] = {}
+
+    def check(self, source: str, question: str) -> Tuple[str, str]:
+        """
+        Решает, передавать ли вопрос агенту.
+
+        Args:
+            source: Источник фразы.
+            question: Вопрос после обрезки по слову-активатору.
+
+        Returns:
+            Кортеж (вопрос, к которому, если он сам не проходит фильтр, приклеен
+            отложенный обрывок; решение PASSED/DROPPED/DEFERRED).
+        """
+        if self.min_quality <= 0:
+            return question, PASSED
+
+        now = time.monotonic()
+        deferred = self._deferred.pop(source, None)
+        score = score_utterance(question)
+        if (
+            score < self.min_quality
+            and deferred is not None
+            and now - deferred[1] <= self.defer
+        ):
+            fragment = normalize_question(deferred[0]).split()
+            # Фразу целиком, начиная с обрывка, STT мог прислать и сам
+            if normalize_question(question).split()[: len(fragment)] != fragment:
+                question = f"{deferred[0]} {question}"
+                score = score_utterance(question)
+                metrics.inc("utterance.joined")
+        if score >= self.min_quality:
+            return question, PASSED
+        if is_dangling(question):
+            self._deferred[source] = (question, now)
+            metrics.inc("utterance.deferred")
+            log.info(
+                f"Фраза '{question}' оборвана (качество {score:.2f}), ждём продолжения"
+            )
+            return question, DEFERRED
+        metrics.inc("utterance.dropped")
+        log.info(f"Фраза '{question}' отброшена (качество {score:.2f})")
+        return question, DROPPED
+
+
+# Общий фильтр фраз
+utterance_gate = UtteranceGate(MBB_UTTERANCE_MIN_QUALITY, MBB_UTTERANCE_DEFER_MS)
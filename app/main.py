@@ -1,24 +1,87 @@
 """
 Точка входа в приложение STT (Speech-to-Text).
 Запускает сервер и фоновое прослушивание микрофона.
+
+Использование:
+    python -m app.main [--workers N] [--loop auto|asyncio|uvloop]
+                       [--http auto|h11|httptools] [--uds /run/mbb.sock]
+
+При --workers > 1 процессы делят общее состояние через файл SQLite
+(MBB_SHARED_STATE_DB, по умолчанию создаётся во временном каталоге), а лимиты
+параллелизма LLM и очереди допуска делятся между процессами поровну.
+По SIGINT/SIGTERM сервер перестаёт принимать соединения, дожидается начатых
+запросов (не дольше MBB_GRACEFUL_TIMEOUT) и отправляет очередь TTS.
+
+С --uds (MBB_UDS) сервер слушает Unix-сокет вместо MBB_HOST:MBB_PORT:
+STT на той же машине обходится без TCP-стека на каждом запросе.
 """
 
-import asyncio
-from asyncio import set_event_loop
+import argparse
+import os
+import stat
+import tempfile
 
 import uvicorn
 
-from app.config.config import MBB_HOST, MBB_PORT, MBB_LOG_LEVEL
-from app.core.httpd import app
+from app.config.config import (
+    MBB_GRACEFUL_TIMEOUT,
+    MBB_HOST,
+    MBB_HTTP,
+    MBB_LOG_LEVEL,
+    MBB_LOOP,
+    MBB_PORT,
+    MBB_SHARED_STATE_DB,
+    MBB_UDS,
+    MBB_WORKERS,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Сервер мозга киберсовы")
+    parser.add_argument("--workers", type=int, default=MBB_WORKERS,
+                        help="число рабочих процессов")
+    parser.add_argument("--loop", default=MBB_LOOP,
+                        choices=["auto", "asyncio", "uvloop"],
+                        help="реализация цикла событий")
+    parser.add_argument("--http", default=MBB_HTTP,
+                        choices=["auto", "h11", "httptools"],
+                        help="реализация протокола HTTP")
+    parser.add_argument("--graceful-timeout", type=int, default=MBB_GRACEFUL_TIMEOUT,
+                        help="сколько секунд ждать начатых запросов при остановке")
+    parser.add_argument("--uds", default=MBB_UDS,
+                        help="путь к Unix-сокету вместо MBB_HOST:MBB_PORT")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    # Устанавливаем цикл событий
-    # (иначе будут проблемы при запуске асинхронки в потоках)
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    set_event_loop(loop)
-
-    # Запускаем сервер
-    config = uvicorn.Config(app=app, host=MBB_HOST, port=MBB_PORT, log_level=MBB_LOG_LEVEL, loop=loop)
-    server = uvicorn.Server(config)
-    loop.run_until_complete(server.serve())
\ No newline at end of file
+    args = parse_args()
+
+    # Рабочие процессы делят между собой лимиты LLM и допуска (см. per_worker)
+    os.environ["MBB_WORKERS"] = str(args.workers)
+
+    if args.workers > 1 and not MBB_SHARED_STATE_DB:
+        # Рабочие процессы импортируют приложение заново и читают путь из окружения
+        os.environ["MBB_SHARED_STATE_DB"] = os.path.join(
+            tempfile.gettempdir(), f"mbb-shared-state-{MBB_PORT}.sqlite"
+        )
+
+    if (
+        args.uds
+        and os.path.exists(args.uds)
+        and stat.S_ISSOCK(os.stat(args.uds).st_mode)
+    ):
+        # Сокет, оставшийся от прошлого запуска, не даст привязаться заново
+        os.unlink(args.uds)
+
+    # Приложение передаётся строкой импорта: так его загружает каждый рабочий процесс
+    uvicorn.run(
+        "app.core.httpd:app",
+        host=MBB_HOST,
+        port=MBB_PORT,
+        uds=args.uds,
+        log_level=MBB_LOG_LEVEL,
+        workers=args.workers,
+        loop=args.loop,
+        http=args.http,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
@@ -0,0 +1,320 @@
+"""
+Локальная база знаний: полнотекстовый индекс SQLite FTS5 по офлайн-дампу.
+
+Индекс строится заранее из локального дампа (например, вывода WikiExtractor
+в формате JSON Lines или каталога текстовых файлов) и открывается только
+на чтение, поэтому поиск не ходит в сеть и занимает единицы миллисекунд.
+
+Использование:
+    python -m app.tools.knowledge build <дамп.jsonl | каталог> [--db путь]
+    python -m app.tools.knowledge search "что такое магнетар" [--db путь]
+    python -m app.tools.knowledge bench [--db путь] [--rounds N] [запросы...]
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from app.core.logger import get_logger
+
+log = get_logger(__name__)
+
+# Максимальная длина одного фрагмента статьи в символах
+PASSAGE_MAX_CHARS = 600
+
+_WORD_RE = re.compile(r"\w+")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n+")
+
+# Слова, которые не помогают поиску
+_STOP_WORDS = {
+    "что",
+    "такое",
+    "кто",
+    "такой",
+    "такая",
+    "это",
+    "как",
+    "где",
+    "когда",
+    "почему",
+    "зачем",
+    "какой",
+    "какая",
+    "какое",
+    "расскажи",
+    "скажи",
+    "про",
+    "для",
+    "или",
+    "сова",
+    "мне",
+    "нам",
+    "есть",
+    "был",
+    "была",
+    "было",
+}
+
+
+def _normalize(text: str) -> str:
+    """FTS5 не приравнивает "ё" к "е", поэтому делаем это сами."""
+    return text.replace("ё", "е").replace("Ё", "Е")
+
+
+def build_fts_query(question: str) -> str:
+    """
+    Строит запрос FTS5 из вопроса на естественном языке.
+
+    Стоп-слова отбрасываются, от слов остаётся основа с префиксным поиском
+    (грубая замена морфологии: "магнетара" → "магнета*").
+
+    Args:
+        question: Вопрос пользователя.
+
+    Returns:
+        Выражение MATCH для FTS5 или пустая строка.
+    """
+    terms = []
+    for word in _WORD_RE.findall(_normalize(question.lower())):
+        if len(word) < 3 or word in _STOP_WORDS:
+            continue
+        stem = word[: max(4, len(word) - 2)] if len(word) > 5 else word
+        terms.append(f'"{stem}"*')
+    return " OR ".join(dict.fromkeys(terms))
+
+
+def _split_passages(text: str) -> Iterator[str]:
+    """Делит текст статьи на фрагменты не длиннее PASSAGE_MAX_CHARS."""
+    buffer = ""
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if buffer and len(buffer) + len(paragraph) + 1 > PASSAGE_MAX_CHARS:
+            yield buffer
+            buffer = ""
+        while len(paragraph) > PASSAGE_MAX_CHARS:
+            cut = paragraph.rfind(" ", 0, PASSAGE_MAX_CHARS)
+            cut = cut if cut > 0 else PASSAGE_MAX_CHARS
+            yield paragraph[:cut]
+            paragraph = paragraph[cut:].strip()
+        buffer = f"{buffer} {paragraph}".strip()
+    if buffer:
+        yield buffer
+
+
+def read_documents(source: str) -> Iterator[Tuple[str, str]]:
+    """
+    Читает документы из локального дампа.
+
+    Args:
+        source: Файл JSON Lines с полями title и text или каталог с файлами .txt
+            (заголовок — имя файла).
+
+    Yields:
+        Пары (заголовок, текст).
+    """
+    if os.path.isdir(source):
+        for root, _dirs, files in os.walk(source):
+            for name in sorted(files):
+                if name.endswith(".txt"):
+                    with open(os.path.join(root, name), encoding="utf-8") as f:
+                        yield os.path.splitext(name)[0], f.read()
+        return
+
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            document = json.loads(line)
+            title, text = document.get("title", ""), document.get("text", "")
+            if text:
+                yield title, text
+
+
+def build_index(documents: Iterable[Tuple[str, str]], db_path: str) -> int:
+    """
+    Строит индекс FTS5 с нуля.
+
+    Args:
+        documents: Пары (заголовок, текст).
+        db_path: Путь к файлу индекса.
+
+    Returns:
+        Число проиндексированных фрагментов.
+    """
+    tmp_path = f"{db_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    db = sqlite3.connect(tmp_path)
+    try:
+        db.execute("PRAGMA journal_mode=OFF")
+        db.execute("PRAGMA synchronous=OFF")
+        db.execute(
+            "CREATE VIRTUAL TABLE passages USING fts5("
+            "title, body, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+        def rows() -> Iterator[Tuple[str, str]]:
+            for title, text in documents:
+                for passage in _split_passages(text):
+                    yield _normalize(title), _normalize(passage)
+
+        with db:
+            db.executemany("INSERT INTO passages(title, body) VALUES (?, ?)", rows())
+        count = db.execute("SELECT count(*) FROM passages").fetchone()[0]
+        db.execute("INSERT INTO passages(passages) VALUES ('optimize')")
+        db.commit()
+        db.execute("VACUUM")
+    finally:
+        db.close()
+    os.replace(tmp_path, db_path)
+    return count
+
+
+class KnowledgeIndex:
+    """
+    Поиск по готовому индексу (только чтение, файл отображается в память).
+    """
+
+    def __init__(self, db_path: str, mmap_size: int = 256 * 1024 * 1024):
+        """
+        Args:
+            db_path: Путь к файлу индекса.
+            mmap_size: Сколько байт индекса SQLite читает через mmap.
+        """
+        self.db_path = db_path
+        self._db = sqlite3.connect(
+            f"file:{db_path}?mode=ro", uri=True, check_same_thread=False
+        )
+        self._db.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        # Инструменты агента выполняются в пуле потоков
+        self._lock = threading.Lock()
+
+    def search(self, question: str, k: int = 3) -> List[Tuple[str, str]]:
+        """
+        Находит k наиболее релевантных фрагментов.
+
+        Args:
+            question: Вопрос на естественном языке.
+            k: Сколько фрагментов вернуть.
+
+        Returns:
+            Список пар (заголовок, фрагмент текста).
+        """
+        query = build_fts_query(question)
+        if not query:
+            return []
+        with self._lock:
+            return self._db.execute(
+                "SELECT title, snippet(passages, 1, '', '', '…', 48) FROM passages "
+                "WHERE passages MATCH ? ORDER BY bm25(passages, 5.0, 1.0) LIMIT ?",
+                (query, k),
+            ).fetchall()
+
+    def close(self) -> None:
+        """Закрывает индекс."""
+        self._db.close()
+
+
+def format_snippets(snippets: List[Tuple[str, str]]) -> str:
+    """
+    Форматирует найденные фрагменты для промпта агента.
+
+    Args:
+        snippets: Пары (заголовок, фрагмент).
+
+    Returns:
+        Текст справки или пустая строка.
+    """
+    return "\n".join(f"- {title}: {snippet}" for title, snippet in snippets)
+
+
+def open_index(db_path: Optional[str]) -> Optional[KnowledgeIndex]:
+    """
+    Открывает индекс, если он настроен и существует.
+
+    Args:
+        db_path: Путь к файлу индекса (MBB_KNOWLEDGE_DB).
+
+    Returns:
+        KnowledgeIndex или None.
+    """
+    if not db_path:
+        return None
+    if not os.path.exists(db_path):
+        log.warning(f"Индекс базы знаний не найден: {db_path}")
+        return None
+    index = KnowledgeIndex(db_path)
+    log.info(f"Индекс базы знаний открыт: {db_path}")
+    return index
+
+
+def _bench(index: KnowledgeIndex, queries: List[str], rounds: int) -> None:
+    """Печатает время поиска по каждому запросу."""
+    print(f"🧪 Поиск по {index.db_path}, {rounds} повторов:\n")
+    for query in queries:
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            hits = index.search(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        print(
+            f"{query!r:>40}: найдено {len(hits)}, "
+            f"среднее {sum(timings) / len(timings):.2f} мс, "
+            f"p95 {timings[int(len(timings) * 0.95) - 1]:.2f} мс"
+        )
+
+
+def main() -> None:
+    from app.config.config import MBB_KNOWLEDGE_DB
+
+    parser = argparse.ArgumentParser(description="Локальная база знаний СОВЫ")
+    parser.add_argument("--db", default=MBB_KNOWLEDGE_DB, help="путь к файлу индекса")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="построить индекс из локального дампа")
+    build.add_argument("source", help="файл JSON Lines (title, text) или каталог .txt")
+    search = commands.add_parser("search", help="найти фрагменты по вопросу")
+    search.add_argument("question")
+    search.add_argument("-k", type=int, default=3)
+    bench = commands.add_parser("bench", help="замерить скорость поиска")
+    bench.add_argument("--rounds", type=int, default=200)
+    bench.add_argument("queries", nargs="*")
+    args = parser.parse_args()
+
+    if not args.db:
+        parser.error("укажите --db или MBB_KNOWLEDGE_DB")
+    if args.command == "bench" and args.rounds < 1:
+        parser.error("--rounds должно быть не меньше 1")
+
+    if args.command == "build":
+        started = time.perf_counter()
+        count = build_index(read_documents(args.source), args.db)
+        elapsed = time.perf_counter() - started
+        print(f"✅ Проиндексировано фрагментов: {count} за {elapsed:.1f} с")
+        return
+
+    index = KnowledgeIndex(args.db)
+    if args.command == "search":
+        print(
+            format_snippets(index.search(args.question, args.k)) or "Ничего не найдено"
+        )
+    else:
+        queries = args.queries or [
+            "что такое магнетар",
+            "расскажи о париже",
+            "кто такой гагарин",
+        ]
+        _bench(index, queries, args.rounds)
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
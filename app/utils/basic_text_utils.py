@@ -104,6 +104,25 @@ def wrap_answer_with_ssml(msg: str) -> dict:
     return rs_ssml_text
 
 
+_NON_WORD_RE = re.compile(r"[^\w]+")
+
+
+def normalize_question(text: str) -> str:
+    """
+    Приводит вопрос к каноничному виду для сравнения дубликатов.
+
+    Нижний регистр, "ё" → "е", без знаков препинания и лишних пробелов.
+
+    Args:
+        text: Вопрос после обрезки по ключевому слову.
+
+    Returns:
+        Нормализованная строка.
+    """
+    text = text.lower().replace("ё", "е")
+    return _NON_WORD_RE.sub(" ", text).strip()
+
+
 def fuzzy_find_fw(keyword: str,
                   phrase: str,
                   threshold: int = 80):
@@ -0,0 +1,66 @@
+"""
+Дешёвый классификатор вопросов на регулярных выражениях.
+Определяет, нужен ли вопросу инструмент (время, математика),
+короткий фактический ответ или развёрнутый ответ большой модели.
+"""
+
+import re
+
+# Виды вопросов
+TIME = "time"
+MATH = "math"
+SHORT = "short"
+OPEN = "open"
+
+# Вопросы длиннее этого числа слов считаются развёрнутыми
+OPEN_QUESTION_MIN_WORDS = 12
+
+_TIME_RE = re.compile(
+    r"\b(котор\w*\s+(сейчас\s+)?час|сколько\s+(сейчас\s+)?врем|скока\s+ща|какое\s+(сейчас\s+)?время)",
+    re.IGNORECASE,
+)
+_MATH_RE = re.compile(
+    r"(\d\s*[-+*/^]\s*\d|\b(плюс|минус|умнож\w*|подел\w*|делить|корень|корня|синус\w*|"
+    r"косинус\w*|тангенс\w*|котангенс\w*|квадрат\w*|куб\w*|степен\w*|посчитай|вычисли|"
+    r"сколько\s+будет|чему\s+равн\w*)\b)",
+    re.IGNORECASE,
+)
+_OPEN_RE = re.compile(
+    r"\b(расскажи|почему|объясни|что\s+такое|кто\s+так\w+|как\s+работает|опиши|зачем|"
+    r"сравни|придумай|сочини|что\s+думаешь|поговори|посоветуй)\b",
+    re.IGNORECASE,
+)
+
+
+def classify_question(text: str) -> str:
+    """
+    Определяет вид вопроса.
+
+    Args:
+        text: Вопрос после обрезки по ключевому слову.
+
+    Returns:
+        Один из видов: TIME, MATH, OPEN, SHORT.
+    """
+    if _TIME_RE.search(text):
+        return TIME
+    if _MATH_RE.search(text):
+        return MATH
+    if _OPEN_RE.search(text) or len(text.split()) >= OPEN_QUESTION_MIN_WORDS:
+        return OPEN
+    return SHORT
+
+
+if __name__ == "__main__":
+    examples = [
+        "сколько время",
+        "который сейчас час",
+        "косинус пи пополам",
+        "пять плюс три в квадрате",
+        "расскажи о париже",
+        "что такое магнетар",
+        "столица франции",
+    ]
+    print("🧪 Классификация вопросов:\n")
+    for example in examples:
+        print(f"{example!r:>30} → {classify_question(example)}")
@@ -1,6 +1,8 @@
 """
 Утилиты для преобразования чисел в текст на русском языке.
 """
+from functools import lru_cache
+
 from app.core.logger import get_logger
 
 log = get_logger(__name__)
@@ -105,6 +107,218 @@ def float_to_text_russian(value: str) -> str:
     return f"{sign}{integer_text} {integer_unit} {fractional_text} {fractional_unit}"
 
 
+# --- Целые числа, дроби и порядковые числительные ---------------------------
+_UNITS_M = ["", "один", "два", "три", "четыре",
+            "пять", "шесть", "семь", "восемь", "девять"]
+_UNITS_F = ["", "одна", "две", "три", "четыре",
+            "пять", "шесть", "семь", "восемь", "девять"]
+_TEENS = ["десять", "одиннадцать", "двенадцать", "тринадцать", "четырнадцать",
+          "пятнадцать", "шестнадцать", "семнадцать", "восемнадцать", "девятнадцать"]
+_TENS = ["", "", "двадцать", "тридцать", "сорок", "пятьдесят",
+         "шестьдесят", "семьдесят", "восемьдесят", "девяносто"]
+_HUNDREDS = ["", "сто", "двести", "триста", "четыреста", "пятьсот",
+             "шестьсот", "семьсот", "восемьсот", "девятьсот"]
+
+# (формы "один/два/пять", женский род) для разрядов: тысячи, миллионы, миллиарды
+_SCALES = [
+    (("тысяча", "тысячи", "тысяч"), True),
+    (("миллион", "миллиона", "миллионов"), False),
+    (("миллиард", "миллиарда", "миллиардов"), False),
+]
+
+# Основы порядковых числительных и окончания по падежам
+_ORDINAL_UNITS = ["", "перв", "втор", "трет", "четвёрт",
+                  "пят", "шест", "седьм", "восьм", "девят"]
+_ORDINAL_TEENS = ["десят", "одиннадцат", "двенадцат", "тринадцат", "четырнадцат",
+                  "пятнадцат", "шестнадцат", "семнадцат", "восемнадцат", "девятнадцат"]
+_ORDINAL_TENS = ["", "", "двадцат", "тридцат", "сороков", "пятидесят",
+                 "шестидесят", "семидесят", "восьмидесят", "девяност"]
+_ORDINAL_HUNDREDS = ["", "сот", "двухсот", "трёхсот", "четырёхсот", "пятисот",
+                     "шестисот", "семисот", "восьмисот", "девятисот"]
+_ORDINAL_THOUSANDS = ["", "", "двух", "трёх", "четырёх", "пяти",
+                      "шести", "семи", "восьми", "девяти"]
+# Основы с ударным окончанием: "второй", а не "вторый"
+_STRESSED_ORDINALS = {"втор", "шест", "седьм", "восьм", "сороков"}
+
+# Падежи порядковых числительных
+NOMINATIVE = "nom"       # третий (век)
+NOMINATIVE_NEUTER = "nom_n"  # третье (апреля)
+GENITIVE = "gen"         # третьего (года)
+DATIVE = "dat"           # (к) третьему (веку)
+PREPOSITIONAL = "prep"   # (в) третьем (веке)
+
+_ORDINAL_ENDINGS = {
+    NOMINATIVE: ("ый", "ой", "ий"),
+    NOMINATIVE_NEUTER: ("ое", "ое", "ье"),
+    GENITIVE: ("ого", "ого", "ьего"),
+    DATIVE: ("ому", "ому", "ьему"),
+    PREPOSITIONAL: ("ом", "ом", "ьем"),
+}
+
+_FRACTION_UNITS = [
+    ("десятая", "десятых"),
+    ("сотая", "сотых"),
+    ("тысячная", "тысячных"),
+    ("десятитысячная", "десятитысячных"),
+]
+
+
+def _plural_form(n: int, forms: tuple) -> str:
+    """Выбирает форму слова для числа: (один, два, пять)."""
+    if 11 <= n % 100 <= 14:
+        return forms[2]
+    if n % 10 == 1:
+        return forms[0]
+    if 2 <= n % 10 <= 4:
+        return forms[1]
+    return forms[2]
+
+
+def _triple_to_words(n: int, feminine: bool) -> list:
+    """Число 0‥999 → список слов."""
+    words = []
+    h, rest = divmod(n, 100)
+    if h:
+        words.append(_HUNDREDS[h])
+    if 10 <= rest < 20:
+        words.append(_TEENS[rest - 10])
+    else:
+        t, o = divmod(rest, 10)
+        if t:
+            words.append(_TENS[t])
+        if o:
+            words.append((_UNITS_F if feminine else _UNITS_M)[o])
+    return words
+
+
+@lru_cache(maxsize=4096)
+def int_to_text_russian(n: int, feminine: bool = False) -> str:
+    """
+    Преобразует целое число в текст на русском языке.
+
+    Примеры:
+        21   → "двадцать один"
+        2001 → "две тысячи один"
+        -5   → "минус пять"
+
+    Args:
+        n: Целое число (по модулю меньше триллиона).
+        feminine: Женский род для последнего разряда ("одна", "две").
+
+    Returns:
+        Текстовое представление числа.
+    """
+    if n == 0:
+        return "ноль"
+    if n < 0:
+        return f"минус {int_to_text_russian(-n, feminine)}"
+    if n >= 10 ** 12:
+        return " ".join(int_to_text_russian(int(d)) for d in str(n))
+
+    words = []
+    rest, triple = divmod(n, 1000)
+    low = _triple_to_words(triple, feminine)
+    for forms, scale_feminine in _SCALES:
+        if not rest:
+            break
+        rest, triple = divmod(rest, 1000)
+        if triple == 1 and scale_feminine:
+            # "тысяча девятьсот", а не "одна тысяча девятьсот"
+            words = [forms[0]] + words
+        elif triple:
+            scale = _plural_form(triple, forms)
+            words = _triple_to_words(triple, scale_feminine) + [scale] + words
+    return " ".join(words + low)
+
+
+@lru_cache(maxsize=4096)
+def ordinal_to_text_russian(n: int, case: str = NOMINATIVE) -> str:
+    """
+    Преобразует число в порядковое числительное мужского/среднего рода.
+
+    Примеры:
+        3, NOMINATIVE        → "третий"
+        12, NOMINATIVE_NEUTER → "двенадцатое"
+        1961, GENITIVE       → "тысяча девятьсот шестьдесят первого"
+
+    Args:
+        n: Натуральное число меньше миллиона.
+        case: Падеж: NOMINATIVE, NOMINATIVE_NEUTER, GENITIVE, DATIVE, PREPOSITIONAL.
+
+    Returns:
+        Текстовое представление порядкового числительного.
+    """
+    if n <= 0 or n >= 10 ** 6:
+        return int_to_text_russian(n)
+
+    if n % 1000 == 0:
+        thousands = n // 1000
+        head = 0
+        if thousands < 10:
+            stem = f"{_ORDINAL_THOUSANDS[thousands]}тысячн"
+        else:
+            stem = f"{int_to_text_russian(thousands)} тысячн"
+    elif 10 <= n % 100 < 20:
+        head, stem = n - n % 100, _ORDINAL_TEENS[n % 100 - 10]
+    elif n % 10:
+        head, stem = n - n % 10, _ORDINAL_UNITS[n % 10]
+    elif n % 100:
+        head, stem = n - n % 100, _ORDINAL_TENS[n % 100 // 10]
+    else:
+        head, stem = n - n % 1000, _ORDINAL_HUNDREDS[n % 1000 // 100]
+
+    regular, stressed, soft = _ORDINAL_ENDINGS[case]
+    if stem == "трет":
+        ending = soft
+    elif stem in _STRESSED_ORDINALS:
+        ending = stressed
+    else:
+        ending = regular
+    word = f"{stem}{ending}"
+    return f"{int_to_text_russian(head)} {word}" if head else word
+
+
+@lru_cache(maxsize=4096)
+def decimal_to_text_russian(integer_part: str, fractional_part: str = "") -> str:
+    """
+    Преобразует десятичную дробь, заданную строками цифр, в текст.
+
+    Дробная часть округляется до 4 знаков, нули в конце отбрасываются.
+
+    Примеры:
+        ("3", "5")     → "три целых пять десятых"
+        ("0", "7071")  → "ноль целых семь тысяч семьдесят одна десятитысячная"
+        ("4", "0000")  → "четыре"
+
+    Args:
+        integer_part: Цифры целой части.
+        fractional_part: Цифры дробной части.
+
+    Returns:
+        Текстовое представление числа.
+    """
+    integer = int(integer_part)
+    fraction = fractional_part[:5]
+    if len(fraction) > 4:
+        rounded = round(int(fraction) / 10)
+        if rounded == 10 ** 4:
+            integer, rounded = integer + 1, 0
+        fraction = f"{rounded:04d}"
+    fraction = fraction.rstrip("0")
+    if not fraction:
+        return int_to_text_russian(integer)
+
+    numerator = int(fraction)
+    whole = int_to_text_russian(integer, feminine=True)
+    whole_unit = "целая" if integer % 10 == 1 and integer % 100 != 11 else "целых"
+    singular, plural = _FRACTION_UNITS[len(fraction) - 1]
+    fraction_unit = (
+        singular if numerator % 10 == 1 and numerator % 100 != 11 else plural
+    )
+    numerator_text = int_to_text_russian(numerator, feminine=True)
+    return f"{whole} {whole_unit} {numerator_text} {fraction_unit}"
+
+
 if __name__ == "__main__":
     # Тесты для демонстрации работы функции
     test_cases = [
@@ -123,4 +337,15 @@ if __name__ == "__main__":
     print("🧪 Тесты функции float_to_text_russian:\n")
     for num in test_cases:
         text = float_to_text_russian(num)
-        print(f"{num:>10} → {text}")
\ No newline at end of file
+        print(f"{num:>10} → {text}")
+
+    print("\n🧪 Целые, порядковые и десятичные:\n")
+    for num in [0, 1, 11, 21, 101, 1000, 2001, 1_000_000, 1_234_567, -42]:
+        print(f"{num:>10} → {int_to_text_russian(num)}")
+    for num, case in [(3, NOMINATIVE), (12, NOMINATIVE_NEUTER), (1961, GENITIVE),
+                      (2000, GENITIVE), (2024, PREPOSITIONAL), (40, NOMINATIVE),
+                      (300, GENITIVE)]:
+        print(f"{num:>10} → {ordinal_to_text_russian(num, case)}")
+    for whole, frac in [("3", "5"), ("0", "7071"), ("4", "0000"),
+                        ("1", "01"), ("2", "99999")]:
+        print(f"{whole + '.' + frac:>10} → {decimal_to_text_russian(whole, frac)}")
\ No newline at end of file
@@ -0,0 +1,266 @@
+"""
+Нормализация ответа для синтеза речи за один проход.
+
+Одно заранее скомпилированное регулярное выражение находит в ответе даты,
+время, числа перед "год"/"век", целые (в том числе с разделителями разрядов)
+и десятичные числа и служебные символы XML. Каждое совпадение сразу
+превращается в русскую пропись, а ответ одновременно собирается в виде
+текста и SSML.
+
+Число перед "год"/"век" читается порядковым только в контексте даты:
+после предлога, согласованного с формой слова ("в 1961 году", "с 3 века",
+"к 2030 году"), перед сокращением "г."/"в." и для четырёхзначного года
+("1961 год"). В остальных случаях это количество: "3 года назад" → "три
+года назад", "ему 21 год" → "двадцать один год".
+"""
+
+import contextlib
+import re
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from app.utils.number_to_words_ru import (
+    DATIVE,
+    GENITIVE,
+    NOMINATIVE,
+    NOMINATIVE_NEUTER,
+    PREPOSITIONAL,
+    decimal_to_text_russian,
+    int_to_text_russian,
+    ordinal_to_text_russian,
+)
+from app.utils.time_to_words import time_to_text
+
+_MONTHS_GENITIVE = [
+    "",
+    "января",
+    "февраля",
+    "марта",
+    "апреля",
+    "мая",
+    "июня",
+    "июля",
+    "августа",
+    "сентября",
+    "октября",
+    "ноября",
+    "декабря",
+]
+
+_XML_ESCAPES = {"&": "&amp;", "<": "&lt;", ">": "&gt;"}
+
+# Порядок альтернатив важен: сначала более длинные и специфичные шаблоны.
+# Опережающая проверка первого символа позволяет быстро пропускать обычный текст.
+_SPEECH_RE = re.compile(
+    r"(?=[-\d&<>])"
+    r"(?:(?P<date>\b(?P<day>\d{1,2})\.(?P<month>\d{1,2})\.(?P<year>\d{4})\b)"
+    r"|(?P<time>\b(?P<hour>[01]?\d|2[0-3]):(?P<minute>[0-5]\d)\b)"
+    r"|(?P<ordinal>\b(?P<ordinal_n>\d{1,4})(?=\s*(?P<unit>год[а-я]*|г\.|век[а-я]*|в\.)))"
+    r"|(?P<grouped>\b\d{1,3}"
+    r"(?:(?:[ \u00a0\u202f]\d{3})+|(?:,\d{3}){2,}|(?:\.\d{3}){2,})(?![\d,.]\d))"
+    r"|(?P<number>(?P<sign>(?<![\w)])-)?\b(?P<int>\d+)(?:[.,](?P<frac>\d+))?\b)"
+    r"|(?P<xml>[&<>]))"
+)
+
+# Падеж порядкового числительного после предлога: в 1961 году, с 1961 года, к 1961 году
+_PREPOSITION_CASES = {
+    "в": PREPOSITIONAL,
+    "во": PREPOSITIONAL,
+    "на": PREPOSITIONAL,
+    "о": PREPOSITIONAL,
+    "об": PREPOSITIONAL,
+    "при": PREPOSITIONAL,
+    "с": GENITIVE,
+    "со": GENITIVE,
+    "до": GENITIVE,
+    "от": GENITIVE,
+    "из": GENITIVE,
+    "после": GENITIVE,
+    "около": GENITIVE,
+    "начала": GENITIVE,
+    "конца": GENITIVE,
+    "середины": GENITIVE,
+    "к": DATIVE,
+    "ко": DATIVE,
+    "по": NOMINATIVE,
+}
+
+# Падежи, с которыми согласуется форма слова "год"/"век" (по окончанию)
+_UNIT_CASES = {
+    "": (NOMINATIVE,),
+    "а": (GENITIVE,),
+    "у": (PREPOSITIONAL, DATIVE),
+    "е": (PREPOSITIONAL,),
+}
+
+# Слово непосредственно перед числом
+_PRECEDING_WORD_RE = re.compile(r"(?:^|[^\w-])([а-яё]+)\s+$", re.IGNORECASE)
+
+SSML_TEMPLATE = (
+    "<speak>\n" '  <prosody pitch="low">\n' "  {}\n" "  </prosody>\n" "</speak>"
+)
+
+
+@lru_cache(maxsize=1440)
+def _time_to_text(hour: int, minute: int) -> str:
+    """Время прописью (кэшируется: в сутках всего 1440 минут)."""
+    return time_to_text((hour, minute))
+
+
+def _preceding_word(match: "re.Match") -> str:
+    """Слово перед совпадением в нижнем регистре или пустая строка."""
+    start = match.start()
+    found = _PRECEDING_WORD_RE.search(match.string, max(0, start - 16), start)
+    return found.group(1).lower() if found else ""
+
+
+def _ordinal_case(preposition: str, unit: str, digits: int) -> Optional[str]:
+    """
+    Падеж порядкового числительного перед "год"/"век" или None, если это количество.
+
+    Args:
+        preposition: Слово перед числом.
+        unit: Слово после числа: "году", "века", "г." и т. п.
+        digits: Сколько цифр в числе.
+    """
+    case = _PREPOSITION_CASES.get(preposition)
+    if unit in ("г.", "в."):
+        return case or GENITIVE
+    cases = _UNIT_CASES.get(unit[3:], ())
+    if case in cases:
+        return case
+    if digits == 4 and unit.startswith("год") and case is None and cases:
+        # Год без предлога: "1961 год", "весной 1961 года"
+        return cases[0]
+    return None
+
+
+def _year_case(match: "re.Match") -> Optional[str]:
+    """
+    Падеж четырёхзначного года без слова "год" или None, если это не год.
+
+    Годом считается число после "в" в конце фразы ("в 1961.") и начало
+    промежутка ("с 1961 по 1965 год").
+    """
+    if (
+        match.group("sign")
+        or match.group("frac") is not None
+        or len(match.group("int")) != 4
+    ):
+        return None
+    preposition = _preceding_word(match)
+    rest = match.string[match.end() :]
+    if preposition in ("в", "во") and not re.match(r"\s*[\w(]", rest):
+        return PREPOSITIONAL
+    if preposition in ("с", "со", "от") and re.match(r"\s+(?:по|до)\s+\d", rest):
+        return GENITIVE
+    return None
+
+
+def _verbalize(match: "re.Match") -> str:
+    """Превращает одно совпадение в пропись."""
+    if match.group("number") is not None:
+        case = _year_case(match)
+        if case is not None:
+            return ordinal_to_text_russian(int(match.group("int")), case)
+        words = decimal_to_text_russian(match.group("int"), match.group("frac") or "")
+        return f"минус {words}" if match.group("sign") else words
+    if match.group("grouped") is not None:
+        return int_to_text_russian(int(re.sub(r"\D", "", match.group("grouped"))))
+    if match.group("time") is not None:
+        return _time_to_text(int(match.group("hour")), int(match.group("minute")))
+    if match.group("date") is not None:
+        day, month = int(match.group("day")), int(match.group("month"))
+        if not (1 <= day <= 31 and 1 <= month <= 12):
+            return match.group(0)
+        year = ordinal_to_text_russian(int(match.group("year")), GENITIVE)
+        day_text = ordinal_to_text_russian(day, NOMINATIVE_NEUTER)
+        return f"{day_text} {_MONTHS_GENITIVE[month]} {year} года"
+    if match.group("ordinal") is not None:
+        digits = match.group("ordinal_n")
+        case = _ordinal_case(
+            _preceding_word(match), match.group("unit").lower(), len(digits)
+        )
+        if case is None:
+            return int_to_text_russian(int(digits))
+        return ordinal_to_text_russian(int(digits), case)
+    return match.group(0)
+
+
+def normalize_for_speech(text: str) -> Tuple[str, str]:
+    """
+    Готовит ответ к озвучиванию за один проход по тексту.
+
+    Числа, время и даты в любом месте ответа заменяются русской прописью
+    ("в 15:30" → "в пятн+адцать час+ов тридцать мин+ут",
+    "в 3 веке" → "в третьем веке", "3 года назад" → "три года назад",
+    "1 000 000" → "один миллион"), а символы &, <, > экранируются в SSML.
+
+    Args:
+        text: Ответ агента.
+
+    Returns:
+        Кортеж (текст для логов и сравнения, SSML для TTS).
+    """
+    plain: List[str] = []
+    ssml: List[str] = []
+    position = 0
+    for match in _SPEECH_RE.finditer(text):
+        literal = text[position : match.start()]
+        plain.append(literal)
+        ssml.append(literal)
+        xml = match.group("xml")
+        if xml is not None:
+            plain.append(xml)
+            ssml.append(_XML_ESCAPES[xml])
+        else:
+            words = _verbalize(match)
+            plain.append(words)
+            ssml.append(words)
+        position = match.end()
+    tail = text[position:]
+    plain.append(tail)
+    ssml.append(tail)
+    return "".join(plain).strip(), SSML_TEMPLATE.format("".join(ssml).strip())
+
+
+if __name__ == "__main__":
+    import timeit
+
+    from app.utils.basic_text_utils import process_time_answers, wrap_answer_with_ssml
+    from app.utils.number_to_words_ru import float_to_text_russian
+
+    examples = [
+        "Париж основан в 3 веке до нашей эры.",
+        "Это было 3 года назад, с 1961 года по 1965 год.",
+        "Население — 2 100 000 человек, бюджет 1,000,000.",
+        "Гагарин полетел в космос 12.04.1961.",
+        "Сейчас 15:42.",
+        "0.7071",
+        "Результат равен -12,5, а 2 < 3.",
+        "Столица Франции — Париж.",
+    ]
+    print("🧪 Нормализация ответа:\n")
+    for example in examples:
+        spoken, _ = normalize_for_speech(example)
+        print(f"{example!r}\n  → {spoken}\n")
+
+    def old_pipeline(answer: str) -> str:
+        """Прежняя цепочка: отдельные проходы с ветками по флагам инструментов."""
+        res = answer
+        with contextlib.suppress(ValueError):
+            res = float_to_text_russian(float(res))
+        time_text = process_time_answers(res)
+        if time_text:
+            res = time_text
+        return str(wrap_answer_with_ssml(res))
+
+    rounds = 20000
+    for name, func in (
+        ("старая цепочка", old_pipeline),
+        ("normalize_for_speech", normalize_for_speech),
+    ):
+        seconds = timeit.timeit(
+            lambda func=func: [func(e) for e in examples], number=rounds
+        )
+        print(f"{name:>22}: {rounds * len(examples) / seconds:,.0f} ответов/с")
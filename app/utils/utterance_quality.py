@@ -0,0 +1,152 @@
+"""
+Дешёвая оценка качества фразы перед вызовом LLM.
+
+После обрезки по слову-активатору от фразы часто остаётся мусор STT:
+междометия ("э-э", "ну"), обрывки в один слог, повторы или половина фразы,
+обрезанная микрофоном. Оценка складывается из длины, доли слов-паразитов,
+повторов и доли знакомых слов; вопросы о времени и вычислениях считаются
+качественными всегда.
+"""
+
+import re
+from typing import List
+
+from app.utils.intent_classifier import MATH, TIME, classify_question
+
+# Слова-паразиты и междометия (в том числе растянутые: "ээ", "ммм")
+_FILLER_RE = re.compile(
+    r"^(э+|а+|м+|хм+|ну|вот|типа|короче|значит|ой|ах|ох|угу|ага|блин|слушай)$"
+)
+
+# Сочетания-паразиты, убираемые до разбиения на слова
+_FILLER_PHRASES_RE = re.compile(r"\b(как бы|так сказать|в общем|это самое|то есть)\b")
+
+# Слова, после которых фраза явно продолжится ("сколько будет два плюс ..."):
+# предлоги, союзы и операции. Вопросительные слова и местоимения сюда не входят —
+# ими короткий вопрос может и заканчиваться ("ты кто", "это что")
+# fmt: off
+DANGLING_WORDS = frozenset({
+    "и", "а", "но", "или", "в", "во", "на", "о", "об", "про", "с", "со", "к", "ко",
+    "по", "за", "из", "от", "до", "у", "для", "без", "под", "над", "при",
+    "плюс", "минус", "умножить", "разделить", "делить", "поделить", "корень", "синус",
+    "косинус", "тангенс", "котангенс", "степени", "квадрат",
+})
+# fmt: on
+
+# Частые слова вопросов к сове; слово считается знакомым по первым четырём буквам
+# fmt: off
+_LEXICON = frozenset({
+    "а", "без", "бы", "был", "быть", "в", "вас", "во", "вот", "все", "всё", "вы", "где",
+    "да", "даже", "для", "до", "его", "ее", "её", "если", "есть", "еще", "ещё", "же",
+    "за", "зачем", "и", "из", "или", "им", "их", "к", "как", "какой", "когда", "кто",
+    "куда", "ли", "меня", "мне", "мой", "мы", "на", "над", "не", "нет", "ни", "но",
+    "ну", "о", "об", "он", "она", "они", "оно", "от", "по", "под", "почему", "при",
+    "про", "с", "со", "так", "там", "то", "тоже", "ты", "у", "уже", "хорошо", "что",
+    "чтобы", "это", "я",
+    "скажи", "расскажи", "объясни", "опиши", "посчитай", "вычисли", "придумай",
+    "сочини", "сравни", "посоветуй", "подскажи", "назови",
+    "сколько", "который", "сейчас", "время", "час", "минута", "секунда", "сегодня",
+    "завтра", "вчера", "день", "неделя", "месяц", "год",
+    "число", "цифра", "плюс", "минус", "умножить", "делить", "разделить", "корень",
+    "квадрат", "куб", "степень", "синус", "косинус", "тангенс", "котангенс", "градус",
+    "половина", "треть", "четверть", "ноль", "один", "два", "три", "четыре", "пять",
+    "шесть", "семь", "восемь", "девять", "десять", "двадцать", "сто", "тысяча",
+    "миллион",
+    "погода", "город", "страна", "столица", "мир", "земля", "солнце", "луна", "звезда",
+    "планета", "космос", "человек", "люди", "животное", "кошка", "собака", "птица",
+    "сова", "дерево", "вода", "море", "река", "гора", "история", "книга", "фильм",
+    "песня", "музыка", "сказка", "стих", "шутка", "анекдот", "загадка", "слово", "язык",
+    "русский", "английский", "перевод", "значит", "значение", "такое", "такой",
+    "правда", "интересно", "привет", "пока", "спасибо", "пожалуйста", "здравствуй",
+    "доброе", "утро", "вечер", "ночь",
+})
+# fmt: on
+_LEXICON_STEMS = frozenset(word[:4] for word in _LEXICON)
+
+# Столько букв содержательных слов достаточно, чтобы длина не снижала оценку
+_FULL_LENGTH_LETTERS = 8
+
+# Во сколько раз снижается оценка фразы, оборванной на полуслове
+_DANGLING_PENALTY = 0.3
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[а-яё]+", _FILLER_PHRASES_RE.sub(" ", text.lower()))
+
+
+def looks_complete(question: str) -> bool:
+    """
+    Похож ли вопрос на законченный.
+
+    Args:
+        question: Вопрос без слова-активатора.
+
+    Returns:
+        True, если в вопросе не меньше двух слов и он не обрывается
+        на предлоге, союзе или операции.
+    """
+    words = _words(question)
+    return len(words) >= 2 and words[-1] not in DANGLING_WORDS
+
+
+def is_dangling(question: str) -> bool:
+    """Обрывается ли вопрос на слове, после которого фраза должна продолжиться."""
+    words = _words(question)
+    return bool(words) and words[-1] in DANGLING_WORDS
+
+
+def _is_known(word: str) -> bool:
+    return word in _LEXICON or (len(word) >= 4 and word[:4] in _LEXICON_STEMS)
+
+
+def score_utterance(text: str) -> float:
+    """
+    Оценивает, стоит ли фраза вызова LLM.
+
+    Args:
+        text: Вопрос после обрезки по слову-активатору.
+
+    Returns:
+        Оценка от 0.0 (мусор) до 1.0 (осмысленный вопрос).
+    """
+    if classify_question(text) in (TIME, MATH):
+        return 1.0
+    words = _words(text)
+    content = [word for word in words if not _FILLER_RE.match(word)]
+    if not content:
+        return 0.0
+    # Знакомое слово осмысленно и само по себе ("да", "нет");
+    # длина штрафует только незнакомые
+    letters = sum(
+        _FULL_LENGTH_LETTERS if _is_known(word) else len(word) for word in content
+    )
+    length = min(1.0, letters / _FULL_LENGTH_LETTERS)
+    filler_ratio = 1 - len(content) / len(words)
+    repetition = 1 - len(set(content)) / len(content)
+    known = sum(map(_is_known, content)) / len(content)
+    # Незнакомые слова (имена, термины) снижают оценку, но не обнуляют её
+    score = length * (1 - filler_ratio) * (1 - repetition) * (0.4 + 0.6 * known)
+    if words[-1] in DANGLING_WORDS:
+        score *= _DANGLING_PENALTY
+    return round(score, 3)
+
+
+if __name__ == "__main__":
+    examples = [
+        "сколько время",
+        "пять плюс три в квадрате",
+        "расскажи о париже",
+        "кто такой гагарин",
+        "ты кто",
+        "да",
+        "магнетар",
+        "э-э ну",
+        "ну как бы",
+        "при",
+        "сколько",
+        "расскажи про",
+        "бла бла бла",
+        "фыв",
+    ]
+    for example in examples:
+        print(f"{score_utterance(example):.3f}  {example}")
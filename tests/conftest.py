@@ -0,0 +1,15 @@
+"""
+Общие настройки тестов: обязательные переменные окружения задаются до импорта app.
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault("MBB_USE_TORCH_MODEL_MANAGER_STR", "false")
+os.environ.setdefault("MBB_PORT", "8090")
+os.environ.setdefault("MBB_HOST", "127.0.0.1")
+os.environ.setdefault("MBB_LOG_LEVEL", "warning")
+os.environ.setdefault("TTS_URL", "http://127.0.0.1:8082/api/tts/json")
+os.environ.setdefault(
+    "MBB_LOGS_DIR", os.path.join(tempfile.gettempdir(), "mbb-test-logs")
+)
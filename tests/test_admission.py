@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+
+from app.core.admission import CHAT, FAST, AdmissionController, AdmissionRejectedError
+
+
+async def _hold(admission, release: asyncio.Event):
+    async with admission.admit("holder"):
+        await release.wait()
+
+
+async def _admitted(admission, order, owner, priority=FAST, name=None):
+    async with admission.admit(owner, priority):
+        order.append(name or owner)
+
+
+async def _queue(admission, requests):
+    """Занимает единственный слот, ставит requests в очередь и отпускает слот."""
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(admission, release))
+    await asyncio.sleep(0)
+    tasks = []
+    for request in requests:
+        tasks.append(asyncio.create_task(request))
+        await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holder, *tasks)
+
+
+@pytest.mark.asyncio
+async def test_fifo_within_source():
+    admission = AdmissionController(max_in_flight=1)
+    order = []
+    await _queue(
+        admission, [_admitted(admission, order, "mic", name=str(i)) for i in range(3)]
+    )
+    assert order == ["0", "1", "2"]
+
+
+@pytest.mark.asyncio
+async def test_fast_questions_before_chat():
+    admission = AdmissionController(max_in_flight=1)
+    order = []
+    await _queue(
+        admission,
+        [
+            _admitted(admission, order, "mic", CHAT, "chat"),
+            _admitted(admission, order, "owl", FAST, "fast"),
+        ],
+    )
+    assert order == ["fast", "chat"]
+
+
+@pytest.mark.asyncio
+async def test_sources_take_turns():
+    admission = AdmissionController(max_in_flight=1)
+    order = []
+    await _queue(
+        admission,
+        [
+            _admitted(admission, order, "mic", name="mic1"),
+            _admitted(admission, order, "mic", name="mic2"),
+            _admitted(admission, order, "owl", name="owl1"),
+        ],
+    )
+    assert order == ["mic1", "owl1", "mic2"]
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_rejected_with_retry_after():
+    admission = AdmissionController(max_in_flight=1, max_queue=1)
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(admission, release))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(_admitted(admission, [], "mic"))
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejectedError) as rejected:
+        async with admission.admit("owl"):
+            pass
+    assert rejected.value.retry_after >= 1
+
+    release.set()
+    await asyncio.gather(holder, waiter)
+
+
+@pytest.mark.asyncio
+async def test_late_answer_is_rejected_with_retry_after():
+    admission = AdmissionController(
+        max_in_flight=1, latency_target_ms=1000, initial_service_ms=3000
+    )
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(admission, release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejectedError) as rejected:
+        async with admission.admit("mic"):
+            pass
+    # Ожидание ~3000 мс при цели 1000 мс: повтор через 2 с
+    assert rejected.value.retry_after == 2
+
+    release.set()
+    await holder
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_queue():
+    admission = AdmissionController(max_in_flight=1)
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(admission, release))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(_admitted(admission, [], "mic"))
+    await asyncio.sleep(0)
+    assert admission.queued == 1
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert admission.queued == 0
+
+    release.set()
+    await holder
+    assert admission.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_slot_handed_to_cancelled_waiter_is_released():
+    admission = AdmissionController(max_in_flight=1)
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(admission, release))
+    await asyncio.sleep(0)
+    order = []
+    cancelled = asyncio.create_task(_admitted(admission, order, "mic"))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(_admitted(admission, order, "owl"))
+    await asyncio.sleep(0)
+
+    # Слот передаётся первому ожидающему, но тот отменяется, не успев его занять
+    release.set()
+    await asyncio.sleep(0)
+    assert admission.queued == 1
+    cancelled.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+    await asyncio.gather(holder, waiter)
+
+    assert order == ["owl"]
+    assert admission.in_flight == 0
+    assert admission.queued == 0
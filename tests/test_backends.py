@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import pytest
+
+from app.config.config import MBB_FALLBACK_ANSWER
+from app.core import deadline, llm
+from app.core.backends import BackendUnavailableError, OllamaBackendPool
+from app.core.deadline import DeadlineExceededError
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture
+def pool():
+    return OllamaBackendPool(["http://a", "http://b"])
+
+
+@pytest.mark.asyncio
+async def test_application_error_propagates_without_failover(pool):
+    calls = []
+
+    async def call(backend):
+        calls.append(backend.url)
+        raise ValueError("не удалось разобрать ответ модели")
+
+    with pytest.raises(ValueError):
+        await pool.run(call, timeout=1)
+    assert len(calls) == 1
+    assert all(backend.healthy for backend in pool.backends)
+    assert all(backend.outstanding == 0 for backend in pool.backends)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error", [ConnectionError("refused"), _StatusError(503)])
+async def test_backend_failure_fails_over(pool, error):
+    async def call(backend):
+        if backend.url == "http://a":
+            raise error
+        return backend.url
+
+    pool.backends[1].served = 1  # первым выбирается http://a
+    assert await pool.run(call, timeout=1) == "http://b"
+    assert not pool.backends[0].healthy
+    assert pool.backends[1].healthy
+
+
+@pytest.mark.asyncio
+async def test_client_error_status_is_not_a_backend_failure(pool):
+    async def call(backend):
+        raise _StatusError(400)
+
+    with pytest.raises(_StatusError):
+        await pool.run(call, timeout=1)
+    assert all(backend.healthy for backend in pool.backends)
+
+
+@pytest.mark.asyncio
+async def test_timeout_without_limit_fails_over(pool):
+    async def call(backend):
+        raise asyncio.TimeoutError()
+
+    with pytest.raises(BackendUnavailableError):
+        await pool.run(call, timeout=None)
+    assert not any(backend.healthy for backend in pool.backends)
+
+
+@pytest.mark.asyncio
+async def test_unavailable_backends_answer_with_fallback(monkeypatch):
+    sent = []
+
+    async def answer_question(_question):
+        raise BackendUnavailableError("Нет доступных бэкендов Ollama")
+
+    monkeypatch.setattr(llm, "answer_question", answer_question)
+    monkeypatch.setattr(
+        llm.tts_outbox, "enqueue", lambda session, ssml: sent.append(ssml)
+    )
+    assert (
+        await llm.process_request_with_llm("расскажи о париже") == MBB_FALLBACK_ANSWER
+    )
+    assert len(sent) == 1
+
+
+@pytest.mark.asyncio
+async def test_waiting_for_busy_backend_respects_deadline():
+    pool = OllamaBackendPool(["http://a"], max_concurrency=1)
+    release = asyncio.Event()
+
+    async def busy(backend):
+        await release.wait()
+        return backend.url
+
+    holder = asyncio.create_task(pool.run(busy, timeout=5))
+    await asyncio.sleep(0)
+    started = time.monotonic()
+    with deadline.budget(0.1), pytest.raises(DeadlineExceededError):
+        await pool.run(busy, timeout=5)
+    assert time.monotonic() - started < 1
+    release.set()
+    assert await holder == "http://a"
+    assert pool.backends[0].outstanding == 0
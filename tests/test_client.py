@@ -0,0 +1,64 @@
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from app.core.client import PostClient, split_unix_url
+
+
+def test_split_unix_url():
+    assert split_unix_url("http+unix://%2Frun%2Ftts.sock/api/tts/json?v=1") == (
+        "/run/tts.sock",
+        "http://localhost/api/tts/json?v=1",
+    )
+
+
+def test_split_plain_url_passes_through():
+    url = "http://127.0.0.1:8082/api/tts/json"
+    assert split_unix_url(url) == (None, url)
+
+
+@pytest_asyncio.fixture
+async def unix_server(tmp_path):
+    """Сервер на Unix-сокете, запоминающий присланные тексты."""
+    received = []
+
+    async def tts(request):
+        received.append((await request.json())["text"])
+        return web.json_response({"ok": True})
+
+    async def broken(request):
+        return web.Response(status=500)
+
+    app = web.Application()
+    app.router.add_post("/api/tts/json", tts)
+    app.router.add_post("/api/broken", broken)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    path = str(tmp_path / "tts.sock")
+    await web.UnixSite(runner, path).start()
+    yield path.replace("/", "%2F"), received
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_post_over_unix_socket(unix_server):
+    socket, received = unix_server
+    async with PostClient(f"http+unix://{socket}/api/tts/json") as client:
+        assert await client.post("первый")
+        assert await client.post("второй")
+    assert received == ["первый", "второй"]
+
+
+@pytest.mark.asyncio
+async def test_post_over_unix_socket_reports_http_error(unix_server):
+    socket, received = unix_server
+    async with PostClient(f"http+unix://{socket}/api/broken", timeout=5) as client:
+        assert not await client.post("текст")
+    assert received == []
+
+
+@pytest.mark.asyncio
+async def test_post_to_missing_socket_fails(tmp_path):
+    socket = str(tmp_path / "missing.sock").replace("/", "%2F")
+    async with PostClient(f"http+unix://{socket}/api/tts/json") as client:
+        assert not await client.post("текст")
@@ -0,0 +1,80 @@
+import asyncio
+import time
+from uuid import uuid4
+
+import pytest
+from langchain_core.agents import AgentAction
+
+from app.config.config import MBB_FALLBACK_ANSWER
+from app.core import deadline, llm
+from app.core.deadline import ToolResultsCallback
+from app.core.tool_runner import TOOL_TIMEOUT_MESSAGE
+
+
+def test_no_budget_means_no_limit():
+    assert deadline.remaining() is None
+    assert not deadline.expired()
+    assert deadline.clamp(5) == 5
+    with deadline.budget(0):
+        assert deadline.remaining() is None
+
+
+def test_budget_expires():
+    with deadline.budget(0.05):
+        assert 0 < deadline.remaining() <= 0.05
+        assert not deadline.expired()
+        time.sleep(0.06)
+        assert deadline.expired()
+        assert deadline.remaining() == 0
+    assert deadline.remaining() is None
+
+
+def test_nested_budget_cannot_extend_outer():
+    with deadline.budget(0.1):
+        with deadline.budget(10):
+            assert deadline.remaining() <= 0.1
+        with deadline.budget(0.01):
+            assert deadline.remaining() <= 0.01
+
+
+@pytest.mark.parametrize("timeout", [None, 0.5, 30])
+def test_clamp_to_remaining_budget(timeout):
+    with deadline.budget(1):
+        clamped = deadline.clamp(timeout)
+    assert clamped <= 1
+    if timeout is not None:
+        assert clamped <= timeout
+
+
+@pytest.mark.asyncio
+async def test_budget_is_visible_in_child_tasks():
+    async def child():
+        return deadline.remaining()
+
+    with deadline.budget(1):
+        assert await asyncio.ensure_future(child()) is not None
+    assert await asyncio.ensure_future(child()) is None
+
+
+def test_tool_results_are_collected():
+    callback = ToolResultsCallback()
+    run_id = uuid4()
+    callback.on_tool_start({"name": "get_current_time"}, "", run_id=run_id)
+    callback.on_tool_end("12:30", run_id=run_id)
+    [(action, observation)] = callback.steps
+    assert action.tool == "get_current_time"
+    assert observation == "12:30"
+
+
+def _step(observation):
+    return AgentAction("get_current_time", "", ""), observation
+
+
+def test_degraded_answer_uses_last_tool_result():
+    steps = [_step("12:30"), _step(TOOL_TIMEOUT_MESSAGE), _step("  ")]
+    assert llm.degraded_answer(steps) == "12:30"
+
+
+def test_degraded_answer_without_results_is_fallback():
+    assert llm.degraded_answer([]) == MBB_FALLBACK_ANSWER
+    assert llm.degraded_answer([_step(TOOL_TIMEOUT_MESSAGE)]) == MBB_FALLBACK_ANSWER
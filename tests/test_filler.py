@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from app.core.admission import AdmissionController
+from app.core.filler import FillerMasker
+from app.core.metrics import metrics
+
+
+class _Outbox:
+    def __init__(self, accept: bool):
+        self.accept = accept
+        self.sent = []
+
+    def enqueue(self, session, payload):
+        self.sent.append((session, payload))
+        return self.accept
+
+
+@pytest.fixture
+def observed(monkeypatch):
+    values = {}
+    monkeypatch.setattr(
+        metrics,
+        "_observers",
+        [lambda name, value: values.setdefault(name, []).append(value)],
+    )
+    return values
+
+
+@pytest.mark.asyncio
+async def test_filler_masks_admission_queue_wait(observed):
+    outbox = _Outbox(accept=True)
+    masker = FillerMasker(outbox, ["Сейчас подумаю."], delay_ms=20)
+    admission = AdmissionController(max_in_flight=1)
+
+    async def busy():
+        async with admission.admit("owl"):
+            await asyncio.sleep(0.1)
+
+    holder = asyncio.create_task(busy())
+    await asyncio.sleep(0)
+    async with masker.mask("mic"), admission.admit("mic"):
+        pass
+    await holder
+
+    assert [session for session, _ in outbox.sent] == ["mic"]
+    assert observed["filler.perceived_ms"] == [20]
+    assert observed["filler.answer_ms"][0] >= 80
+
+
+@pytest.mark.asyncio
+async def test_shed_filler_does_not_shorten_perceived_latency(observed):
+    masker = FillerMasker(_Outbox(accept=False), ["Сейчас подумаю."], delay_ms=20)
+    async with masker.mask("mic"):
+        await asyncio.sleep(0.06)
+    assert observed["filler.perceived_ms"] == observed["filler.answer_ms"]
+    assert observed["filler.perceived_ms"][0] >= 50
+
+
+@pytest.mark.asyncio
+async def test_fast_answer_skips_filler(observed):
+    outbox = _Outbox(accept=True)
+    masker = FillerMasker(outbox, ["Сейчас подумаю."], delay_ms=200)
+    async with masker.mask("mic"):
+        pass
+    await asyncio.sleep(0)
+    assert outbox.sent == []
+    assert observed["filler.perceived_ms"] == observed["filler.answer_ms"]
+
+
+@pytest.mark.asyncio
+async def test_failed_answer_is_not_measured(observed):
+    outbox = _Outbox(accept=True)
+    masker = FillerMasker(outbox, ["Сейчас подумаю."], delay_ms=200)
+    with pytest.raises(RuntimeError):
+        async with masker.mask("mic"):
+            raise RuntimeError("отклонён")
+    await asyncio.sleep(0)
+    assert outbox.sent == []
+    assert "filler.perceived_ms" not in observed
+
+
+@pytest.mark.asyncio
+async def test_empty_phrases_disable_filler(observed):
+    outbox = _Outbox(accept=True)
+    masker = FillerMasker(outbox, [], delay_ms=20)
+    assert not await masker._send_after_delay("mic")
+    async with masker.mask("mic"):
+        await asyncio.sleep(0.05)
+    assert outbox.sent == []
+    assert "filler.perceived_ms" not in observed
@@ -0,0 +1,82 @@
+import pytest
+
+from app.tools import knowledge
+from app.tools.knowledge import (
+    KnowledgeIndex,
+    _split_passages,
+    build_fts_query,
+    build_index,
+    format_snippets,
+    open_index,
+)
+
+
+@pytest.mark.parametrize(
+    "question, query",
+    [
+        ("Что такое магнетар?", '"магнет"*'),
+        ("Кто такой Гагарин", '"гагар"*'),
+        ("Расскажи про ёжика", '"ежика"*'),
+        ("сова, что такое это", ""),
+        ("Париж и париж", '"париж"*'),
+        ("кошки и собаки", '"кошки"* OR "соба"*'),
+    ],
+)
+def test_build_fts_query(question, query):
+    assert build_fts_query(question) == query
+
+
+def test_split_passages_respects_max_length(monkeypatch):
+    monkeypatch.setattr(knowledge, "PASSAGE_MAX_CHARS", 20)
+    text = "Первый абзац.\n\nВторой.\n\n" + "слово " * 10
+    passages = list(_split_passages(text))
+    assert all(len(passage) <= 20 for passage in passages)
+    assert " ".join(passages).split() == text.split()
+
+
+def test_short_paragraphs_are_joined():
+    assert list(_split_passages("Один.\n\n\nДва.\n  \nТри.")) == ["Один. Два. Три."]
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = str(tmp_path / "knowledge.sqlite")
+    documents = [
+        ("Магнетар", "Магнетар — нейтронная звезда с очень сильным магнитным полем."),
+        ("Париж", "Париж — столица Франции.\n\nГород стоит на Сене."),
+        ("Гагарин", "Юрий Гагарин — первый человек в космосе, полёт 12 апреля 1961."),
+    ]
+    assert build_index(documents, path) == 3
+    index = KnowledgeIndex(path)
+    yield index
+    index.close()
+
+
+def test_index_round_trip(index):
+    hits = index.search("что такое магнетары", k=3)
+    assert [title for title, _ in hits] == ["Магнетар"]
+    assert "нейтронная звезда" in hits[0][1]
+    assert format_snippets(hits).startswith("- Магнетар: ")
+
+
+def test_search_normalizes_yo(index):
+    assert [title for title, _ in index.search("полет гагарина")] == ["Гагарин"]
+
+
+def test_search_without_terms_finds_nothing(index):
+    assert index.search("что это") == []
+    assert index.search("квазар") == []
+
+
+def test_rebuild_replaces_index(tmp_path):
+    path = str(tmp_path / "knowledge.sqlite")
+    build_index([("Париж", "Столица Франции.")], path)
+    assert build_index([("Берлин", "Столица Германии.")], path) == 1
+    index = KnowledgeIndex(path)
+    assert [title for title, _ in index.search("столица")] == ["Берлин"]
+    index.close()
+
+
+def test_open_index_without_file(tmp_path):
+    assert open_index(None) is None
+    assert open_index(str(tmp_path / "нет.sqlite")) is None
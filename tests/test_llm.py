@@ -0,0 +1,132 @@
+import pytest
+from langchain_core.agents import AgentAction
+
+from app.core import llm
+from app.core.tool_runner import TOOL_TIMEOUT_MESSAGE
+from app.core.usage import PromptUsageCallback
+
+
+@pytest.fixture
+def full_tools(monkeypatch):
+    monkeypatch.setattr(
+        llm, "tools", [llm.get_current_time, llm.calculate_math_expression]
+    )
+    monkeypatch.setattr(llm, "_agent_executors", {"кэш": object()})
+
+
+def test_prompt_prefix_is_stable_across_calls(full_tools):
+    assert llm.prompt_prefix_fingerprint() == llm.prompt_prefix_fingerprint()
+
+
+def test_compact_tool_keeps_name_and_arguments():
+    compact = llm.compact_tool(llm.calculate_math_expression)
+    assert compact.name == llm.calculate_math_expression.name
+    assert compact.args == llm.calculate_math_expression.args
+    assert compact.description == llm.COMPACT_TOOL_DESCRIPTIONS[compact.name]
+    assert len(compact.description) < len(llm.calculate_math_expression.description)
+
+
+def test_prompt_within_budget_keeps_prefix(full_tools):
+    fingerprint = llm.prompt_prefix_fingerprint()
+    assert not llm.enforce_prompt_budget(PromptUsageCallback(budget=1000))
+    assert llm.prompt_prefix_fingerprint() == fingerprint
+    assert llm._agent_executors
+
+
+def test_prompt_over_budget_compacts_prefix_once(full_tools):
+    usage = PromptUsageCallback(budget=1000)
+    usage.over_budget = True
+    fingerprint = llm.prompt_prefix_fingerprint()
+
+    assert llm.enforce_prompt_budget(usage)
+    compacted = llm.prompt_prefix_fingerprint()
+    assert compacted != fingerprint
+    assert not llm._agent_executors
+
+    # Дальше префикс снова неизменен
+    assert not llm.enforce_prompt_budget(usage)
+    assert llm.prompt_prefix_fingerprint() == compacted
+
+
+@pytest.fixture
+def cascade(monkeypatch):
+    """Малая и большая модели, отвечающие заданными фразами."""
+    monkeypatch.setattr(llm, "MBB_OLLAMA_SMALL_MODEL_NAME", "small")
+    monkeypatch.setattr(llm, "MBB_OLLAMA_MODEL_NAME", "big")
+    answers = {"small": "Четырнадцать.", "big": "Большой ответ."}
+    calls = []
+
+    async def run_agent(user_message, model, callbacks):
+        calls.append(model)
+        return {"output": answers[model], "intermediate_steps": []}
+
+    monkeypatch.setattr(llm, "run_agent", run_agent)
+    return answers, calls
+
+
+@pytest.mark.asyncio
+async def test_cascade_answers_short_question_with_small_model(cascade):
+    _, calls = cascade
+    response = await llm.run_cascade("сколько будет семь плюс семь", [])
+    assert response["output"] == "Четырнадцать."
+    assert calls == ["small"]
+
+
+@pytest.mark.asyncio
+async def test_cascade_escalates_low_confidence_answer(cascade):
+    answers, calls = cascade
+    answers["small"] = "Без малейшего понятия."
+    response = await llm.run_cascade("сколько будет семь плюс семь", [])
+    assert response["output"] == "Большой ответ."
+    assert calls == ["small", "big"]
+
+
+@pytest.mark.asyncio
+async def test_cascade_sends_open_question_to_big_model(cascade):
+    _, calls = cascade
+    await llm.run_cascade("расскажи о париже", [])
+    assert calls == ["big"]
+
+
+@pytest.mark.parametrize(
+    "answer, low", [("", True), ("Я не знаю.", True), ("Четырнадцать.", False)]
+)
+def test_is_low_confidence(answer, low):
+    assert llm.is_low_confidence(answer) is low
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    """Исполнитель агента с прямыми ответами инструментов."""
+    monkeypatch.setattr(llm, "DIRECT_TOOLS", set(llm.DIRECT_ANSWER_PATTERNS))
+    monkeypatch.setattr(llm, "_agent_executors", {})
+    return llm.get_agent_executor("http://127.0.0.1:9", "big")
+
+
+def tool_return(executor, tool, observation):
+    action = AgentAction(tool=tool, tool_input={}, log="")
+    return executor._get_tool_return((action, observation))
+
+
+def test_time_result_is_direct_answer(executor):
+    finish = tool_return(executor, "get_current_time", "15:42")
+    assert finish.return_values == {"output": "15:42"}
+
+
+def test_tool_timeout_goes_back_to_model(executor):
+    assert tool_return(executor, "get_current_time", TOOL_TIMEOUT_MESSAGE) is None
+
+
+def test_math_result_is_direct_answer(executor):
+    finish = tool_return(executor, "calculate_math_expression", "Result: 14 ~ 14.0000")
+    assert finish.return_values == {"output": "Result: 14 ~ 14.0000"}
+
+
+@pytest.mark.parametrize("observation", ["error", "Result: zoo ~ infinity"])
+def test_math_error_goes_back_to_model(executor, observation):
+    assert tool_return(executor, "calculate_math_expression", observation) is None
+
+
+def test_direct_answers_disabled(executor, monkeypatch):
+    monkeypatch.setattr(llm, "DIRECT_TOOLS", set())
+    assert tool_return(executor, "get_current_time", "15:42") is None
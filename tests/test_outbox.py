@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from app.core.outbox import CircuitBreaker, TTSOutbox, TTSRouter
+
+
+def _open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    return breaker
+
+
+def test_half_open_allows_single_probe():
+    breaker = _open_breaker()
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens():
+    breaker = _open_breaker()
+    breaker.reset_timeout = 60
+    breaker.opened_at = 0
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.rejects()
+    assert not breaker.allow()
+
+
+def test_released_probe_can_be_retried():
+    breaker = _open_breaker()
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_rejects_does_not_take_probe():
+    breaker = _open_breaker()
+    assert not breaker.rejects()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow()
+
+
+class _SlowClient:
+    def __init__(self):
+        self.posts = 0
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def post(self, text):
+        self.posts += 1
+        await asyncio.sleep(0.05)
+        return True
+
+
+@pytest.mark.asyncio
+async def test_concurrent_deliveries_send_one_probe():
+    outbox = TTSOutbox("http://tts", breaker=_open_breaker(), max_attempts=1)
+    client = outbox._client = _SlowClient()
+    for session in ("mic", "owl1", "owl2"):
+        assert outbox.enqueue(session, "<speak/>")
+    await outbox.close()
+    assert client.posts == 1
+    assert outbox.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_router_names_targets_by_full_url():
+    router = TTSRouter(
+        "http://tts:8082/api/tts/json",
+        {
+            "kitchen": ["http://tts:8082/api/kitchen/json@2.5"],
+            "hall": [
+                "http://tts:8082/api/tts/json",
+                "http://tts:8082/api/kitchen/json",
+            ],
+        },
+    )
+    (kitchen,) = router.targets("kitchen")
+    assert kitchen.name == kitchen.breaker.name == "http://tts:8082/api/kitchen/json"
+    assert router.targets("hall") == [router.targets("guest")[0], kitchen]
+    assert router.targets("guest")[0].name == "http://tts:8082/api/tts/json"
+
+
+def test_single_target_is_unnamed():
+    router = TTSRouter("http://tts:8082/api/tts/json", {})
+    (outbox,) = router.targets("guest")
+    assert outbox.name is None
@@ -0,0 +1,138 @@
+"""
+Тесты обработки фразы: схлопывание дубликатов и вытеснение устаревших вопросов.
+"""
+
+import asyncio
+
+import pytest
+
+from app.core import pipeline
+from app.core.outbox import TTSRouter
+from app.core.shared_state import SharedState
+
+
+@pytest.fixture
+def answers(monkeypatch):
+    """Подменяет вычисление ответа: ответ готов через 50 мс, вызовы запоминаются."""
+    state = SharedState(answer_ttl=0)
+    monkeypatch.setattr(pipeline, "shared_state", state)
+    calls = []
+
+    async def compute(question, speculation=None):
+        calls.append(question)
+        await asyncio.sleep(0.05)
+        return f"ответ на '{question}'", f"<speak>ответ на '{question}'</speak>"
+
+    monkeypatch.setattr(pipeline, "compute_answer", compute)
+    yield calls
+    state.close()
+
+
+@pytest.fixture
+def spoken(monkeypatch):
+    """Перехватывает отправку ответов в TTS."""
+    sent = []
+    monkeypatch.setattr(
+        pipeline.tts_outbox,
+        "enqueue",
+        lambda session, ssml: sent.append((session, ssml)),
+    )
+    return sent
+
+
+@pytest.mark.asyncio
+async def test_same_session_duplicates_share_one_answer(answers, spoken):
+    results = await asyncio.gather(
+        pipeline.handle_utterance("сова сколько время"),
+        pipeline.handle_utterance("сова сколько время"),
+    )
+    assert [r["status"] for r in results] == ["success", "success"]
+    assert answers == ["сколько время"]
+    assert [session for session, _ in spoken] == ["default"]
+
+
+@pytest.mark.asyncio
+async def test_different_sessions_share_one_answer(answers, spoken):
+    results = await asyncio.gather(
+        pipeline.handle_utterance("сова сколько время", owner="a"),
+        pipeline.handle_utterance("сова сколько время", owner="b"),
+    )
+    assert [r["status"] for r in results] == ["success", "success"]
+    assert len(answers) == 1
+    assert len(spoken) == 1
+
+
+@pytest.mark.asyncio
+async def test_newer_question_supersedes_older_in_same_session(answers, spoken):
+    async def later():
+        await asyncio.sleep(0.01)
+        return await pipeline.handle_utterance("сова расскажи о париже")
+
+    results = await asyncio.gather(
+        pipeline.handle_utterance("сова сколько время"), later()
+    )
+    assert [r["status"] for r in results] == ["superseded", "success"]
+
+
+@pytest.mark.asyncio
+async def test_duplicates_on_different_tts_routes_are_answered_separately(
+    answers, monkeypatch
+):
+    router = TTSRouter(
+        "http://127.0.0.1:8082/api/tts/json",
+        {
+            "owl1": ["http://127.0.0.1:9101/api/tts/json"],
+            "owl2": ["http://127.0.0.1:9102/api/tts/json"],
+        },
+    )
+    monkeypatch.setattr(pipeline, "tts_outbox", router)
+    spoken = []
+    monkeypatch.setattr(router, "enqueue", lambda session, ssml: spoken.append(session))
+    results = await asyncio.gather(
+        pipeline.handle_utterance("сова сколько время", owner="owl1"),
+        pipeline.handle_utterance("сова сколько время", owner="owl2"),
+        pipeline.handle_utterance("сова сколько время", owner="mic"),
+    )
+    assert [r["status"] for r in results] == ["success"] * 3
+    # owl1 и owl2 озвучиваются разными TTS, mic — через TTS по умолчанию
+    assert len(answers) == 3
+    assert sorted(spoken) == ["mic", "owl1", "owl2"]
+
+
+@pytest.mark.asyncio
+async def test_barge_in_does_not_cancel_another_sessions_shared_answer(answers, spoken):
+    async def barge_in():
+        await asyncio.sleep(0.01)
+        return await pipeline.handle_utterance("сова расскажи о париже", owner="a")
+
+    results = await asyncio.gather(
+        pipeline.handle_utterance("сова сколько время", owner="a"),
+        pipeline.handle_utterance("сова сколько время", owner="b"),
+        barge_in(),
+    )
+    assert [r["status"] for r in results] == ["superseded", "success", "success"]
+    # Перебитый вопрос сессии a не отменил общий ответ: его озвучивает b
+    assert answers == ["сколько время", "расскажи о париже"]
+    assert sorted(session for session, _ in spoken) == ["a", "b"]
+    assert ("b", "<speak>ответ на 'сколько время'</speak>") in spoken
+
+
+@pytest.mark.asyncio
+async def test_repeat_answered_from_cache_is_spoken(spoken, monkeypatch):
+    state = SharedState(answer_ttl=5)
+    monkeypatch.setattr(pipeline, "shared_state", state)
+    calls = []
+
+    async def compute(question, speculation=None):
+        calls.append(question)
+        return "Двенадцать часов.", "<speak>Двенадцать часов.</speak>"
+
+    monkeypatch.setattr(pipeline, "compute_answer", compute)
+    first = await pipeline.handle_utterance("сова сколько время")
+    second = await pipeline.handle_utterance("сова сколько время")
+    state.close()
+    assert [first["status"], second["status"]] == ["success", "success"]
+    assert calls == ["сколько время"]
+    # Ответ из кэша озвучивается повторно
+    assert [session for session, _ in spoken] == ["default", "default"]
+    assert "Двенадцать часов." in spoken[1][1]
@@ -0,0 +1,64 @@
+import json
+import os
+import time
+
+import pytest
+
+from app.core.metrics import metrics
+from app.core.profiler import SamplingProfiler
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "_observers", [])
+    return SamplingProfiler(str(tmp_path), interval_ms=1)
+
+
+def _busy(seconds: float) -> None:
+    until = time.perf_counter() + seconds
+    while time.perf_counter() < until:
+        pass
+
+
+def _written(profiler):
+    return sorted(os.listdir(profiler.out_dir))
+
+
+def test_unarmed_request_is_not_profiled(profiler):
+    with profiler.profile("mic") as profile:
+        assert profile is None
+    assert _written(profiler) == []
+
+
+def test_unavailable_without_directory(monkeypatch):
+    monkeypatch.setattr(metrics, "_observers", [])
+    profiler = SamplingProfiler(None)
+    assert not profiler.available
+    assert profiler.arm(3) == 0
+    with profiler.profile("mic", force=True) as profile:
+        assert profile is None
+
+
+def test_arm_profiles_next_requests(profiler):
+    assert profiler.arm(2) == 2
+    for _ in range(3):
+        with profiler.profile("mic"):
+            pass
+    # Третий запрос уже не профилируется
+    assert len(_written(profiler)) == 4
+    assert profiler.arm(0) == 0
+
+
+def test_forced_profile_writes_stacks_and_stages(profiler):
+    with profiler.profile("mic/1", force=True) as profile:
+        metrics.observe("llm.agent_ms", 12.345)
+        _busy(0.05)
+    folded = os.path.join(profiler.out_dir, f"{profile.name}.folded")
+    with open(folded, encoding="utf-8") as f:
+        stacks = f.read()
+    assert "_busy" in stacks
+    with open(os.path.join(profiler.out_dir, f"{profile.name}.json")) as f:
+        report = json.load(f)
+    assert report["stages"] == {"llm.agent_ms": 12.35}
+    assert report["samples"] > 0
+    assert profile.name.endswith("mic_1")
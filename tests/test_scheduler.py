@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from app.core.scheduler import LatestWinsScheduler, RequestSupersededError
+
+
+async def _answer(text: str, delay: float = 0.05) -> str:
+    await asyncio.sleep(delay)
+    return text
+
+
+@pytest.mark.asyncio
+async def test_newer_request_supersedes_older():
+    scheduler = LatestWinsScheduler()
+    older = asyncio.create_task(scheduler.run("mic", lambda: _answer("старый")))
+    await asyncio.sleep(0)
+    newer = asyncio.create_task(scheduler.run("mic", lambda: _answer("новый")))
+
+    with pytest.raises(RequestSupersededError):
+        await older
+    assert await newer == "новый"
+
+
+@pytest.mark.asyncio
+async def test_sessions_do_not_supersede_each_other():
+    scheduler = LatestWinsScheduler()
+    results = await asyncio.gather(
+        scheduler.run("mic", lambda: _answer("mic")),
+        scheduler.run("owl", lambda: _answer("owl")),
+    )
+    assert results == ["mic", "owl"]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_cancels_its_task():
+    scheduler = LatestWinsScheduler()
+    finished = []
+
+    async def work():
+        await asyncio.sleep(0.05)
+        finished.append(True)
+
+    caller = asyncio.create_task(scheduler.run("mic", work))
+    await asyncio.sleep(0)
+    caller.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await caller
+    await asyncio.sleep(0.1)
+    assert finished == []
+    assert not scheduler.cancel("mic")
+
+
+@pytest.mark.asyncio
+async def test_finished_request_is_forgotten():
+    scheduler = LatestWinsScheduler()
+    assert await scheduler.run("mic", lambda: _answer("ответ", 0)) == "ответ"
+    assert not scheduler.cancel("mic")
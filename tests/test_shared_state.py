@@ -0,0 +1,116 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from app.config import config
+from app.core import deadline
+from app.core.deadline import DeadlineExceededError
+from app.core.shared_state import SharedState
+
+
+def _dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def _insert_claim(state: SharedState, key: str, owner: int) -> None:
+    state._db.execute(
+        "INSERT INTO answers(key, answer, updated_at, owner) VALUES (?, NULL, ?, ?)",
+        (key, time.time(), owner),
+    )
+
+
+async def _compute():
+    return "ответ"
+
+
+@pytest.mark.asyncio
+async def test_claim_of_crashed_worker_is_taken_over(tmp_path):
+    state = SharedState(str(tmp_path / "state.sqlite"), answer_ttl=5, claim_timeout=120)
+    _insert_claim(state, "вопрос", _dead_pid())
+    started = time.monotonic()
+    assert await state.answer_once("вопрос", _compute) == ("ответ", False)
+    assert time.monotonic() - started < 1
+
+
+def test_claims_of_crashed_worker_are_released_at_startup(tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    state = SharedState(path)
+    _insert_claim(state, "упавший", _dead_pid())
+    _insert_claim(state, "живой", os.getppid())
+    state.close()
+
+    state = SharedState(path)
+    keys = [row[0] for row in state._db.execute("SELECT key FROM answers")]
+    assert keys == ["живой"]
+
+
+@pytest.mark.asyncio
+async def test_waiting_for_other_worker_respects_deadline(tmp_path):
+    state = SharedState(str(tmp_path / "state.sqlite"), answer_ttl=5, claim_timeout=120)
+    _insert_claim(state, "вопрос", os.getppid())
+    started = time.monotonic()
+    with deadline.budget(0.2), pytest.raises(DeadlineExceededError):
+        await state.answer_once("вопрос", _compute)
+    assert time.monotonic() - started < 1
+
+
+@pytest.mark.asyncio
+async def test_answer_of_other_worker_is_awaited_without_cache(tmp_path):
+    state = SharedState(str(tmp_path / "state.sqlite"), answer_ttl=0, claim_timeout=120)
+    _insert_claim(state, "вопрос", os.getppid())
+
+    async def other_worker():
+        await asyncio.sleep(0.1)
+        state._complete("вопрос", "ответ другого процесса")
+
+    async def compute():
+        raise AssertionError("дубликат не должен вычисляться заново")
+
+    asyncio.get_running_loop().create_task(other_worker())
+    assert await state.answer_once("вопрос", compute) == (
+        "ответ другого процесса",
+        True,
+    )
+
+
+@pytest.mark.asyncio
+async def test_finished_answer_is_recomputed_without_cache(tmp_path):
+    state = SharedState(str(tmp_path / "state.sqlite"), answer_ttl=0)
+    calls = []
+
+    async def compute():
+        calls.append(True)
+        return "ответ"
+
+    assert await state.answer_once("вопрос", compute) == ("ответ", False)
+    assert await state.answer_once("вопрос", compute) == ("ответ", False)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_repeat_is_answered_from_cache(tmp_path):
+    state = SharedState(str(tmp_path / "state.sqlite"), answer_ttl=5)
+    calls = []
+
+    async def compute():
+        calls.append(True)
+        return "ответ"
+
+    assert await state.answer_once("вопрос", compute) == ("ответ", False)
+    # Ответ из кэша не озвучивался: его озвучит получивший запрос
+    assert await state.answer_once("вопрос", compute) == ("ответ", False)
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize(
+    "workers, limit, share", [(1, 4, 4), (2, 4, 2), (3, 4, 1), (4, 1, 1), (2, 0, 0)]
+)
+def test_per_worker(monkeypatch, workers, limit, share):
+    monkeypatch.setattr(config, "MBB_WORKERS", workers)
+    assert config.per_worker(limit) == share
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_duplicates_share_one_computation():
+    group = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(True)
+        await asyncio.sleep(0.05)
+        return "ответ"
+
+    results = await asyncio.gather(*(group.do("вопрос", compute) for _ in range(3)))
+    assert results == ["ответ"] * 3
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_failure_reaches_every_waiter_and_is_forgotten():
+    group = SingleFlight()
+    calls = []
+
+    async def fail():
+        calls.append(True)
+        await asyncio.sleep(0.05)
+        raise RuntimeError("модель недоступна")
+
+    results = await asyncio.gather(
+        *(group.do("вопрос", fail) for _ in range(3)), return_exceptions=True
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(calls) == 1
+
+    # Ошибка не кэшируется: следующий запрос вычисляет заново
+    async def compute():
+        return "ответ"
+
+    assert await group.do("вопрос", compute) == "ответ"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_duplicate_does_not_cancel_computation():
+    group = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "ответ"
+
+    first = asyncio.create_task(group.do("вопрос", compute))
+    second = asyncio.create_task(group.do("вопрос", compute))
+    await asyncio.sleep(0)
+    second.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await second
+    assert await first == "ответ"
+
+
+@pytest.mark.asyncio
+async def test_last_waiter_cancellation_cancels_computation():
+    group = SingleFlight()
+    finished = []
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        finished.append(True)
+
+    waiter = asyncio.create_task(group.do("вопрос", compute))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    await asyncio.sleep(0.1)
+    assert finished == []
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from app.core import speculation
+from app.core.admission import AdmissionController
+from app.core.metrics import metrics
+from app.core.speculation import Speculator
+
+
+def _counter(name: str) -> float:
+    return metrics.snapshot()["counters"].get(name, 0)
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    controller = AdmissionController(max_in_flight=1)
+    monkeypatch.setattr(speculation, "admission", controller)
+    return controller
+
+
+@pytest.fixture
+def speculator(monkeypatch, admission):
+    async def answer(question):
+        await asyncio.sleep(0.01)
+        return question, "ответ"
+
+    monkeypatch.setattr(Speculator, "_answer", staticmethod(answer))
+    return Speculator(enabled=True)
+
+
+@pytest.mark.asyncio
+async def test_take_by_originating_request_is_not_a_hit(speculator):
+    hits, own = _counter("speculative.hits"), _counter("speculative.own")
+    speculator.consider("mic", "сова расскажи о париже")
+    task = speculator.take("mic", "расскажи о париже")
+    assert await task == ("расскажи о париже", "ответ")
+    assert _counter("speculative.hits") == hits
+    assert _counter("speculative.own") == own + 1
+
+
+@pytest.mark.asyncio
+async def test_take_by_later_request_is_a_hit(speculator):
+    hits = _counter("speculative.hits")
+    await asyncio.create_task(_consider(speculator, "сова расскажи о париже"))
+    task = speculator.take("mic", "расскажи о париже")
+    assert await task == ("расскажи о париже", "ответ")
+    assert _counter("speculative.hits") == hits + 1
+
+
+@pytest.mark.asyncio
+async def test_different_question_cancels_speculation(speculator):
+    await asyncio.create_task(_consider(speculator, "сова расскажи о париже"))
+    assert speculator.take("mic", "который час") is None
+    assert speculator.running == 0
+
+
+@pytest.mark.asyncio
+async def test_speculation_holds_admission_slot(speculator, admission):
+    await asyncio.create_task(_consider(speculator, "сова расскажи о париже"))
+    assert admission.in_flight == 1
+    await speculator.take("mic", "расскажи о париже")
+    await asyncio.sleep(0)
+    assert admission.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_speculation_releases_slot(speculator, admission):
+    await asyncio.create_task(_consider(speculator, "сова расскажи о париже"))
+    assert speculator.take("mic", "который час") is None
+    await asyncio.sleep(0.005)  # меньше, чем идёт сам ответ
+    assert admission.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_no_speculation_without_free_slot(speculator, admission):
+    skipped = _counter("speculative.skipped")
+    async with admission.admit("mic"):
+        await asyncio.create_task(_consider(speculator, "сова расскажи о париже"))
+        assert speculator.running == 0
+        assert admission.in_flight == 1
+    assert _counter("speculative.skipped") == skipped + 1
+    assert admission.in_flight == 0
+
+
+async def _consider(speculator, text):
+    speculator.consider("mic", text)
@@ -0,0 +1,50 @@
+import pytest
+
+from app.utils.speech_normalizer import normalize_for_speech
+
+
+@pytest.mark.parametrize(
+    "text, spoken",
+    [
+        # Количество: число перед "год"/"век" вне даты
+        ("3 года назад", "три года назад"),
+        ("Война длилась 4 года.", "Война длилась четыре года."),
+        ("Прошло 2 века", "Прошло два века"),
+        ("Ему 21 год", "Ему двадцать один год"),
+        ("100 годами позже", "сто годами позже"),
+        ("в 2 года", "в два года"),
+        ("на 2 года", "на два года"),
+        # Дата: предлог, согласованный с формой слова, сокращение или четыре цифры
+        ("в 3 веке", "в третьем веке"),
+        ("с 3 века", "с третьего века"),
+        ("с 1961 года", "с тысяча девятьсот шестьдесят первого года"),
+        ("в 1961 году", "в тысяча девятьсот шестьдесят первом году"),
+        ("к 2030 году", "к две тысячи тридцатому году"),
+        ("1961 г.", "тысяча девятьсот шестьдесят первого г."),
+        ("1961 год", "тысяча девятьсот шестьдесят первый год"),
+        (
+            "с 1961 по 1965 год",
+            "с тысяча девятьсот шестьдесят первого "
+            "по тысяча девятьсот шестьдесят пятый год",
+        ),
+        ("Это было в 1961.", "Это было в тысяча девятьсот шестьдесят первом."),
+        # Разделители разрядов
+        ("1,000,000", "один миллион"),
+        ("1.000.000", "один миллион"),
+        ("1 000 000 человек", "один миллион человек"),
+        ("2 500", "две тысячи пятьсот"),
+        ("12,5", "двенадцать целых пять десятых"),
+        # Даты, время, знаки
+        ("12.04.1961", "двенадцатое апреля тысяча девятьсот шестьдесят первого года"),
+        ("в 15:30", "в пятн+адцать час+ов три+дцать мин+ут"),
+        ("-5 и 2 < 3", "минус пять и два < три"),
+        ("XV век", "XV век"),
+    ],
+)
+def test_normalize_for_speech(text, spoken):
+    assert normalize_for_speech(text)[0] == spoken
+
+
+def test_ssml_escapes_xml():
+    _, ssml = normalize_for_speech("2 < 3 & 4 > 1")
+    assert "два &lt; три &amp; четыре &gt; один" in ssml
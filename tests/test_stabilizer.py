@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.stabilizer import UtteranceStabilizer, is_growth
+
+
+@pytest.mark.parametrize(
+    "previous, current, growth",
+    [
+        ("сова сколько", "сова сколько время", True),
+        ("сова скольк", "сова сколько время", True),
+        ("сова сколько время", "сова расскажи о париже", False),
+    ],
+)
+def test_is_growth(previous, current, growth):
+    assert is_growth(previous, current) is growth
+
+
+@pytest.mark.asyncio
+async def test_growing_partials_merge_into_last():
+    stabilizer = UtteranceStabilizer(quiet_ms=50)
+    first = asyncio.create_task(stabilizer.settle("mic", "сова сколько"))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(stabilizer.settle("mic", "сова сколько время"))
+    assert await first is None
+    assert await second == "сова сколько время"
+
+
+@pytest.mark.asyncio
+async def test_new_phrase_settles_previous_immediately():
+    stabilizer = UtteranceStabilizer(quiet_ms=1000)
+    first = asyncio.create_task(stabilizer.settle("mic", "сова сколько время"))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(
+        stabilizer.settle("mic", "расскажи о париже", final=True)
+    )
+    assert await asyncio.wait_for(first, 0.5) == "сова сколько время"
+    assert await second == "расскажи о париже"
+
+
+@pytest.mark.asyncio
+async def test_final_skips_quiet_window():
+    stabilizer = UtteranceStabilizer(quiet_ms=1000)
+    first = asyncio.create_task(stabilizer.settle("mic", "сова сколько"))
+    await asyncio.sleep(0.01)
+    started = time.monotonic()
+    assert (
+        await stabilizer.settle("mic", "сова сколько время", final=True)
+        == "сова сколько время"
+    )
+    assert await first is None
+    assert time.monotonic() - started < 0.5
+
+
+@pytest.mark.asyncio
+async def test_sources_settle_independently():
+    stabilizer = UtteranceStabilizer(quiet_ms=30)
+    results = await asyncio.gather(
+        stabilizer.settle("mic", "сова сколько"),
+        stabilizer.settle("owl", "сова сколько время"),
+    )
+    assert results == ["сова сколько", "сова сколько время"]
+
+
+@pytest.mark.asyncio
+async def test_max_wait_bounds_growing_phrase():
+    stabilizer = UtteranceStabilizer(quiet_ms=100, max_wait_ms=150)
+    started = time.monotonic()
+    words = ["сова", "расскажи", "мне", "пожалуйста", "что", "нибудь", "интересное"]
+    tasks = []
+    for count in range(2, len(words) + 1):
+        tasks.append(
+            asyncio.create_task(stabilizer.settle("mic", " ".join(words[:count])))
+        )
+        await asyncio.sleep(0.04)
+    results = await asyncio.gather(*tasks)
+    settled = [result for result in results if result is not None]
+    # Фраза выпущена по max_wait, хотя продолжала расти
+    assert settled[0] != " ".join(words)
+    assert time.monotonic() - started < 1
+
+
+@pytest.mark.asyncio
+async def test_disabled_stabilizer_passes_through():
+    assert (
+        await UtteranceStabilizer(quiet_ms=0).settle("mic", "сова сколько")
+        == "сова сколько"
+    )
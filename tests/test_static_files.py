@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from app.core.static_files import InMemoryStaticFiles
+
+
+def _write(path, data: bytes, mtime: int):
+    with open(path, "wb") as f:
+        f.write(data)
+    os.utime(path, ns=(mtime, mtime))
+
+
+async def _get(app, path: str):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": []}
+    await app(scope, receive, send)
+    return messages
+
+
+def test_reload_closes_replaced_mmap(tmp_path):
+    path = tmp_path / "big.bin"
+    _write(path, b"a" * 64, 1_000_000_000)
+    static = InMemoryStaticFiles(str(tmp_path), mmap_threshold=16)
+    old = static._assets["big.bin"]
+    assert not old.body.closed
+
+    _write(path, b"b" * 64, 2_000_000_000)
+    assert static.reload() == ["big.bin"]
+    assert old.body.closed
+    assert not static._assets["big.bin"].body.closed
+
+    os.remove(path)
+    new = static._assets["big.bin"]
+    assert static.reload() == ["big.bin"]
+    assert new.body.closed
+
+
+def test_mmap_stays_open_while_served(tmp_path):
+    path = tmp_path / "big.bin"
+    _write(path, b"a" * 64, 1_000_000_000)
+    static = InMemoryStaticFiles(str(tmp_path), mmap_threshold=16)
+    asset = static._assets["big.bin"]
+
+    assert asset.acquire()
+    _write(path, b"b" * 64, 2_000_000_000)
+    static.reload()
+    assert not asset.body.closed
+    assert not asset.acquire()
+    asset.release()
+    assert asset.body.closed
+
+
+@pytest.mark.asyncio
+async def test_serves_replaced_file(tmp_path):
+    path = tmp_path / "big.bin"
+    _write(path, b"a" * 64, 1_000_000_000)
+    static = InMemoryStaticFiles(str(tmp_path), mmap_threshold=16)
+    _write(path, b"b" * 64, 2_000_000_000)
+    static.reload()
+
+    messages = await _get(static, "/big.bin")
+    assert messages[0]["status"] == 200
+    assert b"".join(m.get("body", b"") for m in messages[1:]) == b"b" * 64
@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core import deadline
+from app.core.tool_runner import TOOL_TIMEOUT_MESSAGE, run_sync_tool
+
+
+def _slow(seconds: float, result: str) -> str:
+    time.sleep(seconds)
+    return result
+
+
+@pytest.mark.asyncio
+async def test_tool_result_is_returned():
+    assert await run_sync_tool("echo", _slow, 0, "ответ") == "ответ"
+
+
+@pytest.mark.asyncio
+async def test_slow_tool_times_out():
+    started = time.monotonic()
+    result = await run_sync_tool("slow", _slow, 0.5, "поздно", timeout=0.05)
+    assert result == TOOL_TIMEOUT_MESSAGE
+    assert time.monotonic() - started < 0.3
+
+
+@pytest.mark.asyncio
+async def test_tool_timeout_is_clamped_to_deadline():
+    started = time.monotonic()
+    with deadline.budget(0.05):
+        result = await run_sync_tool("slow", _slow, 0.5, "поздно", timeout=5)
+    assert result == TOOL_TIMEOUT_MESSAGE
+    assert time.monotonic() - started < 0.3
+
+
+@pytest.mark.asyncio
+async def test_tools_of_one_step_run_concurrently():
+    started = time.monotonic()
+    results = await asyncio.gather(
+        run_sync_tool("first", _slow, 0.2, "первый"),
+        run_sync_tool("second", _slow, 0.2, "второй"),
+    )
+    # Порядок результатов сохраняется, а ждём только самый медленный
+    assert results == ["первый", "второй"]
+    assert time.monotonic() - started < 0.35
+
+
+@pytest.mark.asyncio
+async def test_failing_tool_raises():
+    def fail() -> None:
+        raise ValueError("ошибка инструмента")
+
+    with pytest.raises(ValueError):
+        await run_sync_tool("fail", fail)
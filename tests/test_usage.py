@@ -0,0 +1,42 @@
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from app.core.usage import PromptUsageCallback
+
+
+def _result(prompt_tokens: int) -> LLMResult:
+    generation = ChatGeneration(
+        message=AIMessage(content="ответ"),
+        generation_info={
+            "prompt_eval_count": prompt_tokens,
+            "eval_count": 3,
+            "prompt_eval_duration": 2_000_000,
+        },
+    )
+    return LLMResult(generations=[[generation]])
+
+
+def test_usage_is_summed_over_calls():
+    usage = PromptUsageCallback()
+    usage.on_llm_end(_result(100))
+    usage.on_llm_end(_result(40))
+    assert usage.llm_calls == 2
+    assert usage.prompt_tokens == 140
+    assert usage.max_prompt_tokens == 100
+    assert usage.completion_tokens == 6
+    assert usage.prompt_eval_ms == 4.0
+    assert not usage.over_budget
+
+
+def test_prompt_over_budget_is_flagged():
+    usage = PromptUsageCallback(budget=100)
+    usage.on_llm_end(_result(100))
+    assert not usage.over_budget
+    usage.on_llm_end(_result(101))
+    assert usage.over_budget
+
+
+def test_zero_budget_means_unlimited():
+    usage = PromptUsageCallback(budget=0)
+    usage.on_llm_end(_result(100_000))
+    assert not usage.over_budget
@@ -0,0 +1,56 @@
+import pytest
+
+from app.core.utterance_gate import DEFERRED, DROPPED, PASSED, UtteranceGate
+from app.utils.utterance_quality import is_dangling, score_utterance
+
+
+@pytest.mark.parametrize(
+    "text", ["ты кто", "это что", "да", "нет", "расскажи о париже"]
+)
+def test_short_questions_pass(text):
+    assert not is_dangling(text)
+    assert score_utterance(text) >= 0.35
+
+
+@pytest.mark.parametrize("text", ["расскажи про", "сравни кошку и", "при"])
+def test_dangling_fragments(text):
+    assert is_dangling(text)
+    assert score_utterance(text) < 0.35
+
+
+def test_gate_is_off_by_default():
+    assert UtteranceGate().check("mic", "э-э ну") == ("э-э ну", PASSED)
+
+
+def test_gate_drops_noise():
+    gate = UtteranceGate(min_quality=0.35)
+    assert gate.check("mic", "э-э ну") == ("э-э ну", DROPPED)
+
+
+def test_deferred_fragment_is_joined_to_continuation():
+    gate = UtteranceGate(min_quality=0.35)
+    assert gate.check("mic", "расскажи про") == ("расскажи про", DEFERRED)
+    assert gate.check("mic", "орков") == ("расскажи про орков", PASSED)
+
+
+def test_deferred_fragment_is_not_glued_to_passing_phrase():
+    gate = UtteranceGate(min_quality=0.35)
+    assert gate.check("mic", "расскажи про") == ("расскажи про", DEFERRED)
+    assert gate.check("mic", "ты кто") == ("ты кто", PASSED)
+    # Обрывок забыт и к следующей фразе не приклеивается
+    assert gate.check("mic", "орков") == ("орков", DROPPED)
+
+
+def test_repeated_phrase_with_fragment_is_not_duplicated():
+    gate = UtteranceGate(min_quality=0.35)
+    gate.check("mic", "расскажи про")
+    assert gate.check("mic", "расскажи про гагарина") == (
+        "расскажи про гагарина",
+        PASSED,
+    )
+
+
+def test_fragment_of_other_source_is_not_joined():
+    gate = UtteranceGate(min_quality=0.35)
+    gate.check("mic", "расскажи про")
+    assert gate.check("owl", "фыв") == ("фыв", DROPPED)